@@ -0,0 +1,40 @@
+"""
+All changes to Person.due go through this module. Each one is written to the
+DueMovement ledger and applied with an F() increment in the same transaction,
+so concurrent completions and payouts can't overwrite each other's updates and
+Person.due is always the running total of a person's movements.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from .models import DueMovement, Person
+
+
+@transaction.atomic(savepoint=False)
+def post_dues(entries, repair=None, payout=None):
+    """
+    Record `(person_id, amount, reason)` entries against the given repair or
+    payout transaction and add each person's net amount to Person.due.
+    Zero amounts are skipped.
+    """
+    movements = [
+        DueMovement(person_id=person_id, amount=amount, reason=reason, repair=repair, transaction=payout)
+        for person_id, amount, reason in entries
+        if person_id and amount
+    ]
+    DueMovement.objects.bulk_create(movements)
+
+    totals = defaultdict(int)
+    for movement in movements:
+        totals[movement.person_id] += movement.amount
+    for person_id, total in totals.items():
+        if total:
+            Person.objects.filter(pk=person_id).update(due=Coalesce(F('due'), 0) + total)
+    return movements
+
+
+def post_due(person_id, amount, reason, repair=None, payout=None):
+    return post_dues([(person_id, amount, reason)], repair=repair, payout=payout)
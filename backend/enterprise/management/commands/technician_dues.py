@@ -0,0 +1,31 @@
+from django.db.models import Sum
+
+from enterprise.models import DueMovement, Person
+from repair.management.rollup import RollupCommand
+
+
+def ledger_balances():
+    rows = DueMovement.objects.values_list('person_id').annotate(total=Sum('amount')).order_by()
+    return dict(rows)
+
+
+class Command(RollupCommand):
+    help = "Reset each Person.due to the total of their due ledger, or only report differences with --verify."
+    noun = 'due'
+    source = 'the due ledger'
+
+    def expected(self):
+        return ledger_balances()
+
+    def stored(self):
+        return {person_id: due or 0 for person_id, due in Person.objects.values_list('pk', 'due').iterator()}
+
+    def describe(self, key, have, want):
+        return f"person {key}: due {have}, ledger {want}"
+
+    def write(self, expected):
+        # Only people whose due has drifted are touched
+        mismatches = self.mismatches(expected)
+        for person_id, have, want in mismatches:
+            Person.objects.filter(pk=person_id).update(due=want)
+        return len(mismatches)
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enterprise', '0003_alter_person_technician_profit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enterprise',
+            name='catalog_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
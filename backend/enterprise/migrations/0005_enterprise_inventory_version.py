@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enterprise', '0004_enterprise_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enterprise',
+            name='inventory_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_due_ledger(apps, schema_editor):
+    Person = apps.get_model('enterprise', 'Person')
+    DueMovement = apps.get_model('enterprise', 'DueMovement')
+    DueMovement.objects.bulk_create(
+        (
+            DueMovement(person_id=person_id, amount=due, reason='opening')
+            for person_id, due in Person.objects.exclude(due=0).exclude(due__isnull=True).values_list('pk', 'due').iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enterprise', '0005_enterprise_inventory_version'),
+        ('repair', '0010_daily_profit'),
+        ('transactions', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DueMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField()),
+                ('reason', models.CharField(choices=[('opening', 'Opening balance'), ('repair_share', 'Share of a settled repair'), ('reversal', 'Repair share reversed'), ('payout', 'Payout')], max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='due_movements', to='enterprise.person')),
+                ('repair', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='due_movements', to='repair.repair')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='due_movements', to='transactions.transaction')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['person', 'created_at', 'id'], name='due_move_person_created_idx')],
+            },
+        ),
+        migrations.RunPython(open_due_ledger, migrations.RunPython.noop),
+    ]
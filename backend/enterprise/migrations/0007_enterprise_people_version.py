@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enterprise', '0006_due_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enterprise',
+            name='people_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,7 +1,9 @@
 from django.db import models
+from django.db.models import F
 # from repair.models import Repair
 # from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.utils import timezone
 
 # Create your models here.
 
@@ -10,9 +12,20 @@ from django.conf import settings
 class Enterprise(models.Model):
     name = models.CharField(max_length=40)
     repairs = models.ManyToManyField('repair.Repair', related_name="enterprise_repairs", blank=True)#related name uta reverse relation query ma pani use hunxa 
+    # Bumped whenever item or category names change, so cached catalogs know they are stale
+    catalog_version = models.PositiveIntegerField(default=0)
+    # Bumped by every item, category or stock change; drives ETags on inventory reads
+    inventory_version = models.PositiveIntegerField(default=0)
+    # Bumped when people join, leave, are renamed or re-rated; part of the analytics cache version
+    people_version = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def bump_versions(cls, enterprise_id, *fields):
+        cls.objects.filter(pk=enterprise_id).update(**{field: F(field) + 1 for field in fields})
+
 
 class Outside(models.Model):
     name = models.CharField(max_length=30)
@@ -34,8 +47,46 @@ class Person(models.Model):
     due = models.IntegerField(null=True, blank=True)
     technician_profit = models.IntegerField(null=True, blank=True)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        Enterprise.bump_versions(self.enterprise_id, 'people_version')
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        Enterprise.bump_versions(self.enterprise_id, 'people_version')
+        return result
+
     def __str__(self):
         return f"{self.user.name} - {self.role} at {self.enterprise.name}"
     
 
-      
\ No newline at end of file
+      
+
+
+class DueMovement(models.Model):
+    """
+    Append-only record of every change to a person's due. Person.due is a
+    cached running total of these rows; see enterprise.dues and the
+    `technician_dues` management command.
+    """
+    reason_choices = [
+        ("opening", "Opening balance"),
+        ("repair_share", "Share of a settled repair"),
+        ("reversal", "Repair share reversed"),
+        ("payout", "Payout"),
+    ]
+
+    person = models.ForeignKey(Person, on_delete=models.CASCADE, related_name='due_movements')
+    amount = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=reason_choices)
+    repair = models.ForeignKey('repair.Repair', on_delete=models.SET_NULL, null=True, blank=True, related_name='due_movements')
+    transaction = models.ForeignKey('transactions.Transaction', on_delete=models.SET_NULL, null=True, blank=True, related_name='due_movements')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['person', 'created_at', 'id'], name='due_move_person_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.person_id} {self.amount:+d} ({self.reason})"
@@ -1,3 +1,39 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from repair.models import Repair
+from userauth.models import User
+
+from .models import Enterprise, Person
+
+
+class EnterpriseProfitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.enterprise = Enterprise.objects.create(name='Shop')
+        cls.admin_user = User.objects.create_user('admin@example.com', 'Admin', 'pw')
+        Person.objects.create(user=cls.admin_user, enterprise=cls.enterprise, role='Admin', due=0, technician_profit=0)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin_user)
+
+    def completed_repair(self):
+        repair = Repair(
+            customer_name='Ram Bahadur', customer_phone_number='9800000000', phone_model='iPhone 12',
+            repair_problem='Screen', total_amount=100, advance_paid=10, due=90, received_by='Counter',
+            enterprise=self.enterprise, repair_status='Completed', amount_paid=90, repair_cost_price=20,
+        )
+        repair.save()
+        return repair
+
+    def test_repairs_without_delivery_date_stay_out_of_the_pages(self):
+        dated = self.completed_repair()
+        undated = self.completed_repair()
+        Repair.objects.filter(pk=undated.pk).update(delivery_date=None)
+
+        # Unparseable dates skip the range filter, so every completed repair is a candidate
+        response = self.client.get('/enterprise/profit/', {'start_date': 'x', 'end_date': 'x', 'page_size': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['repair_id'] for row in response.data['data']], [dated.repair_id])
+        self.assertIsNone(response.data['next'])
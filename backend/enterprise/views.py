@@ -2,25 +2,47 @@ from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from repair.models import Repair
-from repair.permissions import check_status
+from rest_framework import status
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from repair.models import DailyProfit, Repair
 from django.utils.dateparse import parse_date
 from datetime import datetime, date
 from .serializers import AdminProfitSerializer,TechnicianProfitSerializer,OutsideRepairSerializer,PersonSerializer
 from .models import Person,Outside
+from repair.pagination import KeysetPagination
 
 class EnterpriseProfit(APIView):
+    """
+    Profit totals for completed repairs delivered in a date range (this month
+    by default), with the repairs behind them a page at a time. ?group_by=
+    technician or ?group_by=day adds the totals broken down that way. Totals
+    and breakdowns are read from the DailyProfit rollup, a row per day.
+    """
     permission_classes = [IsAuthenticated]
+    page_size = 50
+    admin_totals = ('repair_profit', 'technician_profit', 'my_profit', 'admin_only_profit')
+    technician_totals = ('repair_profit', 'technician_profit')
+    group_by_fields = {
+        'technician': {'key': F('technician_id'), 'name': F('technician__user__name')},
+        'day': {'key': F('day')},
+    }
 
     def get(self, request):
-        user = request.user
-        enterprise = user.person.enterprise
-        repairs = Repair.objects.filter(enterprise_repairs__name=enterprise,repair_status="Completed").order_by('-updated_at')
+        # Keyset pages need a delivery date on every row
+        repairs = Repair.objects.filter(enterprise_id=request.tenant.enterprise_id,repair_status="Completed",delivery_date__isnull=False)
+        rollup = DailyProfit.objects.filter(enterprise_id=request.tenant.enterprise_id, repair_status="Completed")
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
-        technician = request.GET.get('tech')
-        status = check_status(user)
+        technician = request.GET.get('tech') or request.GET.get('technician')
+        group_by = request.GET.get('group_by')
+        role = request.tenant.role
 
+        if group_by and group_by not in self.group_by_fields:
+            return Response(
+                {'error': f"group_by must be one of: {', '.join(self.group_by_fields)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         # If start_date or end_date is not provided, use the start of the current month
         if not start_date or not end_date:
@@ -35,56 +57,57 @@ class EnterpriseProfit(APIView):
         # Filter repairs by the date range
         if start_date and end_date:
             repairs = repairs.filter(delivery_date__range=(start_date, end_date))
+            rollup = rollup.filter(day__range=(start_date, end_date))
 
         if technician:
             repairs = repairs.filter(repaired_by = technician)
+            rollup = rollup.filter(technician=technician)
 
         # Return the profits based on user status
-        if status == "Admin":
-             # Initialize total profits
-            total_profit = 0
-            technician_profit = 0
-            my_profit = 0
-            admin_only_profit = 0
-
-            for repair in repairs:
-                if repair.repair_profit:
-                    total_profit += repair.repair_profit
-                if repair.technician_profit:
-                    technician_profit += repair.technician_profit
-                if repair.my_profit:
-                    my_profit += repair.my_profit
-                if repair.admin_only_profit:
-                    admin_only_profit += repair.admin_only_profit
-            profit = AdminProfitSerializer(repairs,many=True)
-
-            return Response({"total_profit": total_profit, "technician_profit": technician_profit, "my_profit": my_profit,"admin_only_profit":admin_only_profit,"data":profit.data})
-
-
-        elif status == "Technician":
-            user=user.id
-            total_profit = 0
-            technician_profit = 0
-            # if (technician != user.person):
-            #     return Response("UNAUTHORIZED")
-            repairs = repairs.filter(repaired_by=user)
-            for repair in repairs:
-                total_profit += repair.repair_profit
-                technician_profit += repair.technician_profit
-            profit = TechnicianProfitSerializer(repairs,many=True)
-
-            return Response({"total_profit": total_profit, "technician_profit": technician_profit,"data":profit.data})
-
+        if role == "Admin":
+            fields = self.admin_totals
+            serializer_class = AdminProfitSerializer
+        elif role == "Technician":
+            fields = self.technician_totals
+            serializer_class = TechnicianProfitSerializer
+            repairs = repairs.filter(repaired_by_id=request.user.id)
+            rollup = rollup.filter(technician_id=request.user.id)
         else:
             return Response({"message": "No profit data available for your role"}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Totals in one query over the rollup
+        sums = {field: Coalesce(Sum(field), 0.0) for field in fields}
+        data = rollup.aggregate(**{
+            ('total_profit' if field == 'repair_profit' else field): total
+            for field, total in sums.items()
+        })
+
+        if group_by:
+            groups = (
+                rollup
+                .values(**self.group_by_fields[group_by])
+                .annotate(repairs=Sum('repairs'), **sums)
+                .order_by('key' if group_by == 'day' else '-repair_profit')
+            )
+            data['group_by'] = group_by
+            data['groups'] = list(groups)
+
+        # Detail rows, latest deliveries first, one page at a time
+        repairs = repairs.select_related('repaired_by__user')
+        paginator = KeysetPagination(ordering=('-delivery_date', '-id'), page_size=self.page_size)
+        page = paginator.paginate_queryset(repairs, request, view=self)
+        data['data'] = serializer_class(page, many=True).data
+        data['next'] = paginator.get_next_link()
+        data['previous'] = paginator.get_previous_link()
+        return Response(data)
+
 
 class TechniciansView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self,request):
         user= request.user
-        enterprise = user.person.enterprise
+        enterprise = request.tenant.enterprise
         #return resposne of every technicians and admins name and user id
         persons = Person.objects.filter(enterprise=enterprise, role__in=['Technician', 'Admin']).values('user__id', 'user__name', 'role','due')
         response_data = [
@@ -106,8 +129,8 @@ class OutsideView(APIView):
 
     def get(self,request):
         user = request.user
-        enterprise = user.person.enterprise
-        status = check_status(user)
+        enterprise = request.tenant.enterprise
+        status = request.tenant.role
         if (status == "Admin" or status == "Technician"):
             outsides = Outside.objects.filter(enterprise=enterprise)
             serializer = OutsideRepairSerializer(outsides,many=True)
@@ -116,8 +139,8 @@ class OutsideView(APIView):
 
     def post(self,request):
         user = request.user
-        enterprise = user.person.enterprise
-        status = check_status(user)
+        enterprise = request.tenant.enterprise
+        status = request.tenant.role
         if status == "Admin":
             data = request.data
             data["enterprise"]=enterprise.id
@@ -131,7 +154,7 @@ class PersonView(APIView):
 
     def get(self,request):
         user= request.user
-        enterprise = user.person.enterprise
+        enterprise = request.tenant.enterprise
         persons = Person.objects.filter(enterprise=enterprise)
         serializer = PersonSerializer(persons,many=True)
         return Response(serializer.data)
@@ -139,9 +162,9 @@ class PersonView(APIView):
     def post(self,request):
         user = request.user
         data = request.data
-        status = check_status(user)
+        status = request.tenant.role
         if status == "Admin":
-            enterprise = user.person.enterprise.id
+            enterprise = request.tenant.enterprise_id
             data["enterprise"] = enterprise
             serializer = PersonSerializer(data=data)
             if serializer.is_valid(raise_exception=True):
@@ -155,8 +178,8 @@ class PersonView(APIView):
         data = request.data
         id = data.get('id',None)
         if id:
-            if check_status(user)=="Admin":
-                person = Person.objects.get(user = id,enterprise = user.person.enterprise)
+            if request.tenant.role=="Admin":
+                person = Person.objects.get(user = id,enterprise = request.tenant.enterprise)
                 if person:
                     serializer = PersonSerializer(person,data=data,partial=True)
                     if serializer.is_valid(raise_exception=True):
@@ -0,0 +1,91 @@
+"""
+In-process part catalog for autocomplete.
+
+Each enterprise's catalog holds the lower-cased word suffixes of every "name
+category" label in one sorted array per word position, so any word prefix is
+a bisect plus a scan. Scanning the arrays in position order visits matches in
+rank order, so a search stops as soon as it has `limit` results and never
+drops a better match. Catalogs are cached per process and keyed by
+Enterprise.catalog_version, which Item and Category writes bump, so a stale
+catalog is rebuilt on next use.
+"""
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+from .models import Item
+
+MAX_CACHED_CATALOGS = 64
+
+
+class Catalog:
+    def __init__(self, version, rows):
+        self.version = version
+        self.labels = {}
+        self.words = {}
+        by_position = []
+        for item_id, name, category in rows:
+            label = f"{name} {category}" if category else name
+            self.labels[item_id] = label
+            words = label.lower().split()
+            self.words[item_id] = words
+            for position in range(len(words)):
+                if position == len(by_position):
+                    by_position.append([])
+                by_position[position].append((' '.join(words[position:]), item_id))
+        self.indexes = []
+        for entries in by_position:
+            entries.sort()
+            self.indexes.append(([key for key, _ in entries], [item_id for _, item_id in entries]))
+
+    def search(self, query, limit):
+        """
+        Items whose label contains every word of `query` as a word prefix.
+        Labels that start with the query come first, then those where it
+        starts at the second word, and so on; alphabetical order within each.
+        """
+        terms = query.lower().split()
+        if not terms:
+            return []
+        prefix = ' '.join(terms)
+        rest = terms[1:]
+
+        matches = {}
+        for keys, item_ids in self.indexes:
+            index = bisect_left(keys, terms[0])
+            while index < len(keys) and keys[index].startswith(terms[0]):
+                key, item_id = keys[index], item_ids[index]
+                index += 1
+                if item_id in matches:
+                    continue
+                if rest and not key.startswith(prefix):
+                    words = self.words[item_id]
+                    if not all(any(word.startswith(term) for word in words) for term in rest):
+                        continue
+                matches[item_id] = self.labels[item_id]
+                if len(matches) == limit:
+                    return list(matches.items())
+        return list(matches.items())
+
+
+_catalogs = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_catalog(enterprise):
+    """The cached catalog for `enterprise`, rebuilt if its catalog_version has moved on."""
+    with _lock:
+        catalog = _catalogs.get(enterprise.pk)
+        if catalog is not None and catalog.version == enterprise.catalog_version:
+            _catalogs.move_to_end(enterprise.pk)
+            return catalog
+
+    rows = Item.objects.filter(enterprise_id=enterprise.pk).values_list('id', 'name', 'category__name').iterator()
+    catalog = Catalog(enterprise.catalog_version, rows)
+
+    with _lock:
+        _catalogs[enterprise.pk] = catalog
+        _catalogs.move_to_end(enterprise.pk)
+        while len(_catalogs) > MAX_CACHED_CATALOGS:
+            _catalogs.popitem(last=False)
+    return catalog
@@ -0,0 +1,46 @@
+import random
+import statistics
+import time
+
+from inventory.models import Category, Item
+from repair.management.benchmark import BenchmarkCommand
+
+MODELS = ['iPhone', 'Galaxy', 'Redmi', 'Pixel', 'Nokia', 'Oppo', 'Vivo', 'Realme']
+PARTS = ['Display', 'Battery', 'Charging port', 'Back glass', 'Camera', 'Speaker', 'Frame']
+QUERIES = ['d', 'ip', 'iphone 1', 'galaxy bat', 'char redmi', 'cam', 'pixel 7 disp', 'zz']
+
+
+class Command(BenchmarkCommand):
+    help = "Time building and searching the autocomplete catalog of a large enterprise. Nothing is kept."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=50000, help="Items in the catalog (default 50000).")
+        parser.add_argument('--repeat', type=int, default=50, help="Times each query is timed (default 50).")
+
+    def benchmark(self, client, enterprise, items, repeat, **options):
+        categories = Category.objects.bulk_create(Category(name=part, enterprise=enterprise) for part in PARTS)
+        rng = random.Random(0)
+        Item.objects.bulk_create(
+            (
+                Item(
+                    name=f'{rng.choice(PARTS)} {rng.choice(MODELS)} {rng.randint(1, 20)} {n}',
+                    quantity=1, cost=1, enterprise=enterprise, category=rng.choice(categories),
+                )
+                for n in range(items)
+            ),
+            batch_size=1000,
+        )
+
+        url = '/inventory/item/autocomplete/'
+        self.timed(f"first query, builds the catalog of {items} items", client.get, url, {'q': 'd'})
+        for query in QUERIES:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                client.get(url, {'q': query})
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"{query!r}: median {statistics.median(timings):.2f} ms, "
+                f"p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms"
+            )
@@ -0,0 +1,74 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+from enterprise.models import Enterprise
+from inventory.models import CostLayer, Item, Purchase, StockMovement
+from inventory.valuation import recompute
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute weighted-average costs and FIFO cost layers for every item by "
+        "replaying the stock ledger, or check the layers against stock with --verify. "
+        "Stock from purchases that have since been deleted is valued at the running average."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help="Only report items whose open cost layers don't add up to their stock.")
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify()
+        else:
+            self.rebuild()
+
+    def verify(self):
+        layered = dict(
+            CostLayer.objects.filter(quantity_remaining__gt=0)
+            .values_list('item_id')
+            .annotate(total=Sum('quantity_remaining'))
+            .order_by()
+        )
+        mismatches = [
+            (item_id, quantity, layered.get(item_id, 0))
+            for item_id, quantity in Item.objects.values_list('id', Coalesce('quantity', 0)).iterator()
+            if quantity != layered.get(item_id, 0)
+        ]
+        for item_id, have, want in mismatches:
+            self.stdout.write(f"item {item_id}: stock {have}, cost layers {want}")
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} item(s) have cost layers that disagree with their stock")
+        self.stdout.write(self.style.SUCCESS("Cost layers match stock"))
+
+    @transaction.atomic
+    def rebuild(self):
+        # Unit price paid per (purchase, item), one grouped query instead of per movement
+        paid = defaultdict(lambda: [0.0, 0])
+        for transaction_id, item_id, price, quantity in Purchase.objects.values_list('transaction_id', 'item_id', 'price', 'quantity').iterator():
+            paid[(transaction_id, item_id)][0] += price * quantity
+            paid[(transaction_id, item_id)][1] += quantity
+        purchase_prices = {key: total / quantity for key, (total, quantity) in paid.items() if quantity}
+        base_costs = dict(Item.objects.values_list('id', 'cost'))
+
+        movements = (
+            StockMovement.objects
+            .order_by('item_id', 'created_at', 'id')
+            .values_list('item_id', 'delta', 'reason', 'purchase_transaction_id', 'created_at')
+            .iterator(chunk_size=5000)
+        )
+        averages, layers = recompute(movements, purchase_prices, base_costs)
+
+        items = list(Item.objects.only('id', 'cost'))
+        for item in items:
+            item.average_cost = averages.get(item.id, item.cost)
+        Item.objects.bulk_update(items, ['average_cost'], batch_size=1000)
+        CostLayer.objects.all().delete()
+        CostLayer.objects.bulk_create(layers, batch_size=1000)
+        # Cached inventory reads (ETags) must see the recomputed costs
+        for enterprise_id in Item.objects.values_list('enterprise_id', flat=True).distinct():
+            Enterprise.bump_versions(enterprise_id, 'inventory_version')
+        self.stdout.write(self.style.SUCCESS(f"Recomputed costs for {len(items)} item(s), {len(layers)} open cost layer(s)"))
@@ -0,0 +1,88 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from enterprise.models import Enterprise
+from inventory.models import Item, StockMovement, StockSnapshot
+from inventory.stock import end_of_day, ledger_totals, take_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain the stock ledger. `snapshot` records end-of-day stock for --date "
+        "(yesterday by default), `verify` reports items and snapshots that disagree "
+        "with the movements, and `rebuild` resets them from the movements."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['snapshot', 'verify', 'rebuild'])
+        parser.add_argument('--date', help="Day to snapshot, YYYY-MM-DD.")
+
+    def handle(self, *args, **options):
+        getattr(self, options['action'])(options)
+
+    def snapshot(self, options):
+        day = timezone.localdate() - timedelta(days=1)
+        if options['date']:
+            day = parse_date(options['date'])
+            if day is None:
+                raise CommandError(f"Invalid date {options['date']!r}")
+        if day >= timezone.localdate():
+            raise CommandError("Snapshots can only be taken for days that have ended")
+        count = take_snapshots(day)
+        self.stdout.write(self.style.SUCCESS(f"Recorded {count} stock snapshot(s) for {day}"))
+
+    def item_mismatches(self):
+        totals = ledger_totals(Item.objects.all())
+        return [
+            (item_id, quantity, totals.get(item_id, 0))
+            for item_id, quantity in Item.objects.values_list('id', 'quantity').iterator()
+            if (quantity or 0) != totals.get(item_id, 0)
+        ]
+
+    def snapshot_mismatches(self):
+        mismatches = []
+        for day in StockSnapshot.objects.values_list('date', flat=True).distinct().order_by('date'):
+            snapshots = StockSnapshot.objects.filter(date=day)
+            # Replay from the start of the ledger rather than trusting earlier snapshots
+            expected = dict(
+                StockMovement.objects
+                .filter(item_id__in=snapshots.values('item_id'), created_at__lt=end_of_day(day))
+                .values_list('item_id')
+                .annotate(total=Sum('delta'))
+                .order_by()
+            )
+            for snapshot_id, item_id, quantity in snapshots.values_list('id', 'item_id', 'quantity'):
+                if quantity != expected.get(item_id, 0):
+                    mismatches.append((snapshot_id, item_id, day, quantity, expected.get(item_id, 0)))
+        return mismatches
+
+    def verify(self, options):
+        items = self.item_mismatches()
+        snapshots = self.snapshot_mismatches()
+        for item_id, have, want in items:
+            self.stdout.write(f"item {item_id}: quantity {have}, ledger {want}")
+        for snapshot_id, item_id, day, have, want in snapshots:
+            self.stdout.write(f"item {item_id} snapshot {day}: quantity {have}, ledger {want}")
+        if items or snapshots:
+            raise CommandError(f"{len(items)} item(s) and {len(snapshots)} snapshot(s) disagree with the stock ledger")
+        self.stdout.write(self.style.SUCCESS("Stock quantities and snapshots match the ledger"))
+
+    @transaction.atomic
+    def rebuild(self, options):
+        items = self.item_mismatches()
+        for item_id, have, want in items:
+            Item.objects.filter(pk=item_id).update(quantity=want)
+        # Cached inventory reads (ETags) must see the corrected quantities
+        for enterprise_id in Item.objects.filter(pk__in=[item[0] for item in items]).values_list('enterprise_id', flat=True).distinct():
+            Enterprise.bump_versions(enterprise_id, 'inventory_version')
+        # Wrong snapshots are dropped; stock_as_of replays movements where one is missing
+        snapshots = self.snapshot_mismatches()
+        StockSnapshot.objects.filter(pk__in=[snapshot[0] for snapshot in snapshots]).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f"Reset {len(items)} item quantity(ies) and dropped {len(snapshots)} stale snapshot(s)"
+        ))
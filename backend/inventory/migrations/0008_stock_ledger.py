@@ -0,0 +1,58 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    # Every tracked item starts its ledger with its current quantity
+    Item = apps.get_model('inventory', 'Item')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    StockMovement.objects.bulk_create(
+        (
+            StockMovement(item_id=item_id, delta=quantity, reason='opening')
+            for item_id, quantity in Item.objects.exclude(quantity__isnull=True).exclude(quantity=0).values_list('id', 'quantity').iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_remove_item_stock'),
+        ('repair', '0008_repair_enterprise'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.IntegerField()),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='inventory.item')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('reason', models.CharField(choices=[('opening', 'Opening balance'), ('adjustment', 'Manual adjustment'), ('purchase', 'Purchase'), ('purchase_delete', 'Purchase deleted'), ('repair', 'Used in repair'), ('repair_delete', 'Repair deleted')], max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='inventory.item')),
+                ('purchase_transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='inventory.purchasetransaction')),
+                ('repair', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='repair.repair')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', 'created_at', 'id'], name='stock_move_item_created_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stocksnapshot',
+            constraint=models.UniqueConstraint(fields=('item', 'date'), name='unique_stock_snapshot'),
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:40
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+from repair.pgindexes import postgres_indexes
+
+SEARCH_INDEXES = [
+    ('item_name_trgm_idx', 'inventory_item', 'USING gin (name gin_trgm_ops)'),
+    ('category_name_trgm_idx', 'inventory_category', 'USING gin (name gin_trgm_ops)'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['enterprise', 'category', 'name'], name='item_ent_cat_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['enterprise', 'name'], name='item_ent_name_idx'),
+        ),
+        TrigramExtension(),
+        postgres_indexes(SEARCH_INDEXES),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def open_cost_layers(apps, schema_editor):
+    # Until `manage.py inventory_valuation` replays the ledger, stock on hand is valued at Item.cost
+    Item = apps.get_model('inventory', 'Item')
+    CostLayer = apps.get_model('inventory', 'CostLayer')
+    Item.objects.update(average_cost=F('cost'))
+    CostLayer.objects.bulk_create(
+        (
+            CostLayer(item_id=item_id, quantity_received=quantity, quantity_remaining=quantity, unit_cost=cost)
+            for item_id, quantity, cost in Item.objects.filter(quantity__gt=0).values_list('id', 'quantity', 'cost').iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_item_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='average_cost',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='CostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('quantity_received', models.IntegerField()),
+                ('quantity_remaining', models.IntegerField()),
+                ('unit_cost', models.FloatField()),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='inventory.item')),
+                ('purchase_transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cost_layers', to='inventory.purchasetransaction')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', 'received_at', 'id'], name='cost_layer_item_received_idx')],
+            },
+        ),
+        migrations.RunPython(open_cost_layers, migrations.RunPython.noop),
+    ]
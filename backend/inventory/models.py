@@ -1,4 +1,6 @@
 from django.db import models
+from django.utils import timezone
+from enterprise.models import Enterprise
 
 # Create your models here.
 
@@ -6,16 +8,42 @@ class Category(models.Model):
     name = models.CharField(max_length=20)
     enterprise = models.ForeignKey('enterprise.Enterprise', on_delete=models.CASCADE)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        Enterprise.bump_versions(self.enterprise_id, 'catalog_version', 'inventory_version')
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        Enterprise.bump_versions(self.enterprise_id, 'catalog_version', 'inventory_version')
+        return result
+
 
 class Item(models.Model):
     name = models.CharField(max_length=255)
     quantity = models.IntegerField(null=True,blank=True)
     cost = models.FloatField()
+    # Weighted-average cost of the stock on hand, maintained by inventory.stock
+    average_cost = models.FloatField(null=True, blank=True)
     enterprise = models.ForeignKey('enterprise.Enterprise', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     category = models.ForeignKey(Category,on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['enterprise', 'category', 'name'], name='item_ent_cat_name_idx'),
+            models.Index(fields=['enterprise', 'name'], name='item_ent_name_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        Enterprise.bump_versions(self.enterprise_id, 'catalog_version', 'inventory_version')
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        Enterprise.bump_versions(self.enterprise_id, 'catalog_version', 'inventory_version')
+        return result
+
     def __str__(self):
         return self.name
 
@@ -38,6 +66,67 @@ class Purchase(models.Model):
     price = models.FloatField()
     transaction = models.ForeignKey(PurchaseTransaction,on_delete=models.CASCADE,related_name='purchases')
 
+class StockMovement(models.Model):
+    """
+    Append-only record of every change to an item's stock. Item.quantity is a
+    cached running total of these rows; see inventory.stock and the
+    `stock_ledger` management command.
+    """
+    reason_choices = [
+        ("opening", "Opening balance"),
+        ("adjustment", "Manual adjustment"),
+        ("purchase", "Purchase"),
+        ("purchase_delete", "Purchase deleted"),
+        ("repair", "Used in repair"),
+        ("repair_delete", "Repair deleted"),
+    ]
+
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='movements')
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=reason_choices)
+    purchase_transaction = models.ForeignKey(PurchaseTransaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    repair = models.ForeignKey('repair.Repair', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['item', 'created_at', 'id'], name='stock_move_item_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item} {self.delta:+d} ({self.reason})"
+
+
+class StockSnapshot(models.Model):
+    """Stock of an item at the end of `date`, so history queries only replay movements after it."""
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='snapshots')
+    date = models.DateField()
+    quantity = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'date'], name='unique_stock_snapshot'),
+        ]
+
+
+class CostLayer(models.Model):
+    """
+    A FIFO lot: stock received at one unit cost, and how much of it is still on
+    the shelf. Issues consume the oldest open layers first.
+    """
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='cost_layers')
+    purchase_transaction = models.ForeignKey(PurchaseTransaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='cost_layers')
+    received_at = models.DateTimeField(default=timezone.now)
+    quantity_received = models.IntegerField()
+    quantity_remaining = models.IntegerField()
+    unit_cost = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['item', 'received_at', 'id'], name='cost_layer_item_received_idx'),
+        ]
+
+
 class PurchaseReturn(models.Model):
     date = models.DateField(auto_now_add=True)
     enterprise = models.ForeignKey('enterprise.Enterprise', on_delete=models.CASCADE,related_name='all_purchase_return')
@@ -0,0 +1,28 @@
+from django.db.models import Q
+
+from repair.textsearch import clean_query, no_results, ranked_search
+
+
+def search_items(items, query):
+    """
+    Ranked search over item and category names.
+
+    Matches are found through the trigram indexes from migration 0009 on
+    Postgres (ILIKE and typo matches alike), or a plain icontains elsewhere.
+    Name prefixes rank above category prefixes, which rank above substring
+    matches. Returns `items` filtered and annotated with `rank`.
+    """
+    query = clean_query(query)
+    if query is None:
+        return no_results(items)
+
+    return ranked_search(
+        items, query,
+        contains=('name', 'category__name'),
+        trigram=('name', 'category__name'),
+        ranks=[
+            (Q(name__istartswith=query), 0.9),
+            (Q(category__name__istartswith=query), 0.7),
+            (Q(name__icontains=query), 0.5),
+        ],
+    )
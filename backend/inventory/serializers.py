@@ -1,15 +1,40 @@
 from rest_framework.serializers import ModelSerializer
 from rest_framework import serializers
-from .models import Item,Purchase,PurchaseTransaction,Category
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from .models import Item,Purchase,PurchaseTransaction,Category,StockMovement
+from .stock import adjust_stock, set_stock
+from repair.serializers import EagerLoadingMixin
 
 class ItemSerializer(ModelSerializer):
     category_name = serializers.SerializerMethodField()
     class Meta:
         model = Item
         fields = '__all__'
+        read_only_fields = ['average_cost']
 
     def get_category_name(self, obj):
         return obj.category.name
+
+    @transaction.atomic
+    def create(self, validated_data):
+        quantity = validated_data.pop('quantity', None)
+        item = super().create(validated_data)
+        if quantity is not None:
+            set_stock(item, quantity, reason='opening')
+        return item
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        # Stock counts are set through the ledger, everything else as usual
+        if 'quantity' in validated_data:
+            set_stock(instance, validated_data.pop('quantity'))
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Never write back a quantity that may have moved since it was loaded
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
     
     
 
@@ -18,38 +43,86 @@ class CategorySerializer(ModelSerializer):
         model = Category
         fields = '__all__'
 
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that can be handed every pk of a list up front, so a
+    many=True payload resolves its related rows in one query instead of one per row.
+    """
+    def preload(self, pks):
+        pks = {int(pk) for pk in pks if isinstance(pk, int) or (isinstance(pk, str) and pk.isdigit())}
+        self._preloaded = self.get_queryset().in_bulk(pks)
+
+    def to_internal_value(self, data):
+        preloaded = getattr(self, '_preloaded', None)
+        if preloaded is not None:
+            try:
+                return preloaded[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
+
+class PurchaseListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child.fields['item'].preload(row.get('item') for row in data if isinstance(row, dict))
+        return super().to_internal_value(data)
+
+
 class PurchaseSerializer(ModelSerializer):
     id = serializers.IntegerField(required=False)
+    item = PreloadedPrimaryKeyRelatedField(queryset=Item.objects.all())
     # include item name for frontend display
     item_name = serializers.CharField(source='item.name', read_only=True)
     item_category = serializers.CharField(source='item.category.name', read_only=True)
     class Meta:
         model = Purchase 
+        list_serializer_class = PurchaseListSerializer
         # include item_name alongside item id, quantity, price
         fields = ['id', 'item', 'item_name', 'item_category', 'quantity', 'price']
 
-class PurchaseTransactionSerializer(ModelSerializer):
+class PurchaseTransactionSerializer(EagerLoadingMixin, ModelSerializer):
     purchases = PurchaseSerializer(many=True)
     purchased_by_name = serializers.SerializerMethodField()
+    select_related_fields = ('purchased_by__user',)
+    prefetch_related_fields = (
+        Prefetch('purchases', queryset=Purchase.objects.select_related('item__category')),
+    )
     class Meta:
         model = PurchaseTransaction
         fields = '__all__'
 
+    @transaction.atomic
     def create(self, validated_data):
         purchase_data = validated_data.pop('purchases')
+        # Total the invoice up front so the transaction row is written once
+        validated_data['total_amount'] = sum(purchase['price'] * purchase['quantity'] for purchase in purchase_data)
         purchase_transaction = PurchaseTransaction.objects.create(**validated_data)
-        for purchase in purchase_data:
-            purchase_instance = Purchase.objects.create(transaction=purchase_transaction, **purchase)
-            item = purchase_instance.item
-            item.quantity = (item.quantity or 0) + purchase_instance.quantity
-            item.save()
-        purchase_transaction.calculate_total_amount()
+        purchases = Purchase.objects.bulk_create(
+            Purchase(transaction=purchase_transaction, **purchase) for purchase in purchase_data
+        )
+
+        received = defaultdict(int)
+        paid = defaultdict(float)
+        for purchase in purchases:
+            received[purchase.item_id] += purchase.quantity
+            paid[purchase.item_id] += purchase.price * purchase.quantity
+        unit_costs = {item_id: paid[item_id] / quantity for item_id, quantity in received.items() if quantity}
+        adjust_stock(received, 'purchase', purchase_transaction=purchase_transaction, unit_costs=unit_costs)
+
+        prefetch_related_objects([purchase_transaction], *self.prefetch_related_fields)
         return purchase_transaction
 
     def get_purchased_by_name(self, obj):
         return obj.purchased_by.user.name if obj.purchased_by else None
 
 
+class StockMovementSerializer(ModelSerializer):
+    class Meta:
+        model = StockMovement
+        fields = ['id', 'delta', 'reason', 'purchase_transaction', 'repair', 'created_at']
+
+
 class PurchaseReportSerializer(PurchaseSerializer):
     """
     Extended serializer for purchase reports with additional transaction details
@@ -0,0 +1,204 @@
+"""
+All changes to Item.quantity go through this module. Each one is written to the
+StockMovement ledger in the same transaction, so Item.quantity is always the
+running total of an item's movements and history can be rebuilt from them.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from enterprise.models import Enterprise
+
+from .models import Item, StockMovement, StockSnapshot
+from .valuation import incoming_unit_costs, new_average_costs, update_cost_layers
+
+
+def _lock_items(item_ids):
+    """Lock the items in id order and return {item_id: (quantity, average_cost, cost, enterprise_id)}."""
+    rows = (
+        Item.objects.select_for_update()
+        .filter(pk__in=item_ids)
+        .order_by('pk')
+        .values_list('pk', 'quantity', 'average_cost', 'cost', 'enterprise_id')
+    )
+    return {item_id: (quantity or 0, average_cost, cost, enterprise_id) for item_id, quantity, average_cost, cost, enterprise_id in rows}
+
+
+def _apply(locked, applied, reason, purchase_transaction=None, repair=None, unit_costs=None):
+    incoming = incoming_unit_costs(locked, applied, unit_costs)
+    averages = new_average_costs(locked, applied, incoming)
+    updates = {
+        'quantity': Coalesce(F('quantity'), 0) + Case(
+            *[When(pk=item_id, then=Value(delta)) for item_id, delta in applied.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        'updated_at': timezone.now(),
+    }
+    if averages:
+        updates['average_cost'] = Case(
+            *[When(pk=item_id, then=Value(average)) for item_id, average in averages.items()],
+            default=F('average_cost'),
+            output_field=FloatField(),
+        )
+    Item.objects.filter(pk__in=applied).update(**updates)
+    update_cost_layers(
+        applied, incoming,
+        purchase_transaction=purchase_transaction,
+        consume_own_layers_first=(reason == 'purchase_delete'),
+    )
+    StockMovement.objects.bulk_create(
+        StockMovement(item_id=item_id, delta=delta, reason=reason, purchase_transaction=purchase_transaction, repair=repair)
+        for item_id, delta in applied.items()
+        if delta
+    )
+    # After commit, so concurrent stock writers don't all queue on the enterprise row
+    for enterprise_id in {row[3] for row in locked.values()}:
+        transaction.on_commit(partial(Enterprise.bump_versions, enterprise_id, 'inventory_version'))
+
+
+@transaction.atomic
+def adjust_stock(deltas, reason, purchase_transaction=None, repair=None, unit_costs=None):
+    """
+    Add `{item_id: delta}` to Item.quantity in a single UPDATE and record one
+    StockMovement per item with the given reason and source. Average cost and
+    FIFO cost layers move with it; received stock is valued at `unit_costs`
+    (`{item_id: price}`) when given, otherwise at the item's current average.
+
+    The rows are locked in id order first, so concurrent edits queue behind each
+    other instead of deadlocking or overwriting each other's counts. Stock is
+    clamped at zero (an untracked NULL quantity counts as zero). Returns the
+    delta actually applied to each item.
+    """
+    deltas = {item_id: delta for item_id, delta in deltas.items() if delta}
+    if not deltas:
+        return {}
+
+    locked = _lock_items(deltas)
+    applied = {}
+    for item_id, (quantity, _, _, _) in locked.items():
+        applied[item_id] = max(quantity + deltas[item_id], 0) - quantity
+    _apply(locked, applied, reason, purchase_transaction, repair, unit_costs)
+    return applied
+
+
+@transaction.atomic
+def set_stock(item, quantity, reason='adjustment'):
+    """Set an item's stock to a counted `quantity`, recording the difference as a movement."""
+    locked = _lock_items([item.pk])
+    delta = (quantity or 0) - locked[item.pk][0]
+    _apply(locked, {item.pk: delta}, reason)
+    if quantity is None:
+        # Untracked stock stays NULL rather than becoming an explicit zero
+        Item.objects.filter(pk=item.pk).update(quantity=None)
+    item.quantity = quantity
+
+
+@transaction.atomic
+def sync_repair_items(repair, rows):
+    """
+    Replace the parts used on `repair` with `rows` (dicts of item and quantity).
+
+    Only rows that actually changed are deleted or created, and the stock moves
+    by the net difference per item: parts taken off the repair go back on the
+    shelf, new parts are taken from it.
+    """
+    from repair.models import ItemUsageDaily, RepairItem
+
+    existing = list(repair.repair_items.all())
+    wanted = Counter((row['item'].pk, row['quantity']) for row in rows)
+
+    stale = []
+    for repair_item in existing:
+        key = (repair_item.item_id, repair_item.quantity)
+        if wanted[key]:
+            wanted[key] -= 1
+        else:
+            stale.append(repair_item)
+
+    deltas = defaultdict(int)
+    for repair_item in stale:
+        deltas[repair_item.item_id] += repair_item.quantity
+    created = [
+        RepairItem(repair=repair, item_id=item_id, quantity=quantity)
+        for (item_id, quantity), count in wanted.items()
+        for _ in range(count)
+    ]
+    for repair_item in created:
+        deltas[repair_item.item_id] -= repair_item.quantity
+
+    adjust_stock(deltas, 'repair', repair=repair)
+    if stale:
+        RepairItem.objects.filter(pk__in=[repair_item.pk for repair_item in stale]).delete()
+        ItemUsageDaily.record(stale, -1)
+    RepairItem.objects.bulk_create(created)
+    ItemUsageDaily.record(created)
+
+
+def end_of_day(day):
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def stock_as_of(item_id, day):
+    """
+    Stock of an item at the end of `day`: the latest snapshot on or before that
+    day plus the movements recorded after it, both read by index range.
+    """
+    snapshot = StockSnapshot.objects.filter(item_id=item_id, date__lte=day).order_by('-date').first()
+    movements = StockMovement.objects.filter(item_id=item_id, created_at__lt=end_of_day(day))
+    quantity = 0
+    if snapshot:
+        quantity = snapshot.quantity
+        movements = movements.filter(created_at__gte=end_of_day(snapshot.date))
+    return quantity + (movements.aggregate(total=Sum('delta'))['total'] or 0)
+
+
+def ledger_totals(items, day=None):
+    """
+    `{item_id: quantity}` replayed from the ledger for `items`, up to the end of
+    `day` (or everything). Each item starts from its latest snapshot before
+    `day`, so only the movements since then are summed.
+    """
+    if day is None:
+        rows = StockMovement.objects.filter(item__in=items).values_list('item_id').annotate(total=Sum('delta')).order_by()
+        return dict(rows)
+
+    latest = StockSnapshot.objects.filter(item=OuterRef('pk'), date__lt=day).order_by('-date')
+    starts = items.annotate(
+        snapshot_date=Subquery(latest.values('date')[:1]),
+        snapshot_quantity=Subquery(latest.values('quantity')[:1]),
+    ).values_list('pk', 'snapshot_date', 'snapshot_quantity')
+
+    totals = {}
+    by_start = defaultdict(list)
+    for item_id, snapshot_date, snapshot_quantity in starts:
+        totals[item_id] = snapshot_quantity or 0
+        by_start[snapshot_date].append(item_id)
+    # Items usually share their previous snapshot date, so this is one query per distinct date
+    for snapshot_date, item_ids in by_start.items():
+        movements = StockMovement.objects.filter(item_id__in=item_ids, created_at__lt=end_of_day(day))
+        if snapshot_date is not None:
+            movements = movements.filter(created_at__gte=end_of_day(snapshot_date))
+        for item_id, total in movements.values_list('item_id').annotate(total=Sum('delta')).order_by():
+            totals[item_id] += total
+    return totals
+
+
+@transaction.atomic
+def take_snapshots(day, items=None):
+    """Write (or overwrite) end-of-day snapshots for `day`, which must already be over."""
+    if day >= timezone.localdate():
+        raise ValueError("Snapshots can only be taken for days that have ended")
+    items = Item.objects.all() if items is None else items
+    totals = ledger_totals(items, day)
+    StockSnapshot.objects.filter(item__in=items, date=day).delete()
+    StockSnapshot.objects.bulk_create(
+        (StockSnapshot(item_id=item_id, date=day, quantity=quantity) for item_id, quantity in totals.items()),
+        batch_size=1000,
+    )
+    return len(totals)
@@ -1,3 +1,479 @@
-from django.test import TestCase
+import threading
+from datetime import date, datetime
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from enterprise.models import Enterprise, Person
+from repair.models import Repair
+from userauth.models import User
+
+from . import catalog
+from .models import Category, CostLayer, Item, Purchase, PurchaseTransaction, StockMovement, StockSnapshot
+from .stock import adjust_stock, end_of_day, ledger_totals, stock_as_of, take_snapshots
+from .views import PurchaseReportView
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentStockTests(TransactionTestCase):
+    """Purchases and repairs using parts race on one item; its stock must stay equal to its ledger."""
+
+    workers = 8
+
+    def setUp(self):
+        self.enterprise = Enterprise.objects.create(name='Shop')
+        self.user = User.objects.create_user('admin@example.com', 'Admin', 'pw')
+        Person.objects.create(user=self.user, enterprise=self.enterprise, role='Admin', due=0, technician_profit=0)
+        category = Category.objects.create(name='Screens', enterprise=self.enterprise)
+        self.item = Item.objects.create(name='Display', quantity=0, cost=50, enterprise=self.enterprise, category=category)
+
+    def purchase(self):
+        return {'purchases': [{'item': self.item.pk, 'quantity': 2, 'price': 40}]}
+
+    def sale(self):
+        repair = Repair.objects.create(
+            customer_name='Ram Bahadur', customer_phone_number='9800000000', phone_model='iPhone 12',
+            repair_problem='Screen', total_amount=100, advance_paid=10, due=90, received_by='Counter',
+            enterprise=self.enterprise,
+        )
+        return {'repair_id': repair.repair_id, 'repair_items': [{'item': self.item.pk, 'quantity': 1}]}
+
+    def run_in_parallel(self, requests):
+        barrier = threading.Barrier(len(requests))
+        statuses = []
+
+        def worker(method, url, data):
+            try:
+                client = APIClient()
+                client.force_authenticate(self.user)
+                barrier.wait()
+                statuses.append(getattr(client, method)(url, data, format='json').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=request) for request in requests]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_parallel_purchases_and_sales_match_the_ledger(self):
+        requests = [('post', '/inventory/purchasetransaction/', self.purchase()) for _ in range(self.workers)]
+        requests += [('patch', '/repair/', self.sale()) for _ in range(self.workers)]
+        statuses = self.run_in_parallel(requests)
+        self.assertEqual(sorted(statuses), [200] * self.workers + [201] * self.workers)
+
+        self.item.refresh_from_db()
+        ledger = StockMovement.objects.filter(item=self.item).aggregate(total=Sum('delta'))['total']
+        self.assertEqual(self.item.quantity, ledger)
+        self.assertGreaterEqual(self.item.quantity, self.workers)
+
+
+class StockLedgerTests(TestCase):
+    """History reads start from the latest snapshot and replay only the movements after it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        enterprise = Enterprise.objects.create(name='Shop')
+        category = Category.objects.create(name='Screens', enterprise=enterprise)
+        cls.item = Item.objects.create(name='Display', quantity=10, cost=50, enterprise=enterprise, category=category)
+        cls.days = [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3)]
+        noon = [timezone.make_aware(datetime(day.year, day.month, day.day, 12)) for day in cls.days]
+        StockMovement.objects.bulk_create([
+            StockMovement(item=cls.item, delta=5, reason='purchase', created_at=noon[0]),
+            StockMovement(item=cls.item, delta=3, reason='purchase', created_at=noon[1]),
+            StockMovement(item=cls.item, delta=-2, reason='repair', created_at=noon[1]),
+            # Exactly at the end of the second day, so it belongs to the third
+            StockMovement(item=cls.item, delta=4, reason='purchase', created_at=end_of_day(cls.days[1])),
+        ])
+
+    def items(self):
+        return Item.objects.filter(pk=self.item.pk)
+
+    def test_stock_as_of_each_day_around_snapshots(self):
+        expected = [5, 6, 10]
+        self.assertEqual([stock_as_of(self.item.pk, day) for day in self.days], expected)
+        for day in self.days[:2]:
+            take_snapshots(day, self.items())
+        self.assertEqual(list(StockSnapshot.objects.order_by('date').values_list('quantity', flat=True)), [5, 6])
+        self.assertEqual([stock_as_of(self.item.pk, day) for day in self.days], expected)
+        self.assertEqual(stock_as_of(self.item.pk, date(2023, 12, 31)), 0)
+        self.assertEqual([ledger_totals(self.items(), day)[self.item.pk] for day in self.days], expected)
+        self.assertEqual(ledger_totals(self.items()), {self.item.pk: 10})
+
+    def test_reads_start_from_the_snapshot(self):
+        take_snapshots(self.days[1], self.items())
+        StockSnapshot.objects.update(quantity=100)
+        self.assertEqual(stock_as_of(self.item.pk, self.days[2]), 104)
+        self.assertEqual(ledger_totals(self.items(), self.days[2]), {self.item.pk: 104})
+        self.assertEqual(stock_as_of(self.item.pk, self.days[0]), 5)
+
+    def test_verify_reports_drift_and_rebuild_repairs_it(self):
+        take_snapshots(self.days[0], self.items())
+        call_command('stock_ledger', 'verify', stdout=StringIO())
+
+        StockSnapshot.objects.update(quantity=7)
+        self.items().update(quantity=11)
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, '1 item(s) and 1 snapshot(s) disagree'):
+            call_command('stock_ledger', 'verify', stdout=out)
+        self.assertIn(f'item {self.item.pk}: quantity 11, ledger 10', out.getvalue())
+
+        call_command('stock_ledger', 'rebuild', stdout=StringIO())
+        call_command('stock_ledger', 'verify', stdout=StringIO())
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.quantity, StockSnapshot.objects.count()), (10, 0))
+
+
+class PurchaseCreateQueryTests(TestCase):
+    """Creating a purchase costs the same number of queries however many lines it has."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.enterprise = Enterprise.objects.create(name='Shop')
+        cls.user = User.objects.create_user('admin@example.com', 'Admin', 'pw')
+        Person.objects.create(user=cls.user, enterprise=cls.enterprise, role='Admin', due=0, technician_profit=0)
+        category = Category.objects.create(name='Screens', enterprise=cls.enterprise)
+        cls.items = Item.objects.bulk_create(
+            Item(name=f'Display {n}', quantity=0, cost=50, enterprise=cls.enterprise, category=category)
+            for n in range(40)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_query_count_does_not_grow_with_lines(self):
+        for lines in (2, 40):
+            data = {'purchases': [{'item': item.pk, 'quantity': 3, 'price': 40} for item in self.items[:lines]]}
+            # The inventory_version bump runs on commit and is counted too
+            with self.subTest(lines=lines), self.assertNumQueries(16), self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/inventory/purchasetransaction/', data, format='json')
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(len(response.data['purchases']), lines)
+
+
+class ItemSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.enterprise = Enterprise.objects.create(name='Shop')
+        cls.user = User.objects.create_user('admin@example.com', 'Admin', 'pw')
+        Person.objects.create(user=cls.user, enterprise=cls.enterprise, role='Admin', due=0, technician_profit=0)
+        screens = Category.objects.create(name='Screens', enterprise=cls.enterprise)
+        batteries = Category.objects.create(name='Battery', enterprise=cls.enterprise)
+        cls.display = Item.objects.create(name='Display iPhone 12', quantity=1, cost=50, enterprise=cls.enterprise, category=screens)
+        cls.battery = Item.objects.create(name='iPhone 12 cell', quantity=1, cost=20, enterprise=cls.enterprise, category=batteries)
+        cls.other = Item.objects.create(name='Charging port', quantity=1, cost=5, enterprise=cls.enterprise, category=batteries)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, query):
+        return [row['id'] for row in self.client.get('/inventory/item/', {'search': query}).data]
+
+    def test_name_prefix_ranks_above_substring(self):
+        self.assertEqual(self.search('iphone'), [self.battery.pk, self.display.pk])
+
+    def test_category_name_matches(self):
+        self.assertEqual(self.search('batt'), [self.other.pk, self.battery.pk])
+
+    def test_overlong_query_matches_nothing(self):
+        self.assertEqual(self.search('x' * 41), [])
+
+
+class PurchaseTestData:
+    """Three purchases over two months by the admin, and one by another enterprise."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.enterprise = Enterprise.objects.create(name='Shop')
+        cls.user = User.objects.create_user('admin@example.com', 'Admin', 'pw')
+        cls.admin = Person.objects.create(user=cls.user, enterprise=cls.enterprise, role='Admin', due=0, technician_profit=0)
+        screens = Category.objects.create(name='Screens', enterprise=cls.enterprise)
+        batteries = Category.objects.create(name='Battery', enterprise=cls.enterprise)
+        cls.display = Item.objects.create(name='Display', quantity=0, cost=50, enterprise=cls.enterprise, category=screens)
+        cls.cell = Item.objects.create(name='Cell', quantity=0, cost=20, enterprise=cls.enterprise, category=batteries)
+        cls.purchases = [
+            cls.purchase(date(2024, 3, 1), [(cls.display, 3, 40)]),
+            cls.purchase(date(2024, 3, 15), [(cls.display, 1, 50), (cls.cell, 2, 20)]),
+            cls.purchase(date(2024, 4, 2), [(cls.cell, 5, 10)]),
+        ]
+
+        other = Enterprise.objects.create(name='Other shop')
+        other_user = User.objects.create_user('other@example.com', 'Other', 'pw')
+        other_admin = Person.objects.create(user=other_user, enterprise=other, role='Admin', due=0, technician_profit=0)
+        other_item = Item.objects.create(name='Display', quantity=0, cost=50, enterprise=other, category=screens)
+        transaction = PurchaseTransaction.objects.create(enterprise=other, purchased_by=other_admin)
+        Purchase.objects.create(item=other_item, quantity=100, price=1, transaction=transaction)
+
+    @classmethod
+    def purchase(cls, day, lines):
+        transaction = PurchaseTransaction.objects.create(enterprise=cls.enterprise, purchased_by=cls.admin)
+        PurchaseTransaction.objects.filter(pk=transaction.pk).update(date=day)
+        return [
+            Purchase.objects.create(item=item, quantity=quantity, price=price, transaction=transaction)
+            for item, quantity, price in lines
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class PurchaseTransactionSearchTests(PurchaseTestData, TestCase):
+    def search(self, query):
+        response = self.client.get('/inventory/purchasetransaction/', {'search': query})
+        return [row['id'] for row in response.data['results']]
+
+    def test_matches_item_and_category_names_once_per_transaction(self):
+        first, second, third = (lines[0].transaction_id for lines in self.purchases)
+        self.assertEqual(self.search('cell'), [third, second])
+        self.assertEqual(self.search('SCREEN'), [second, first])
+        self.assertEqual(self.search('display'), [second, first])
+        self.assertEqual(self.search('nothing'), [])
+
+    def test_matches_the_purchaser_name(self):
+        user = User.objects.create_user('sita@example.com', 'Sita', 'pw')
+        sita = Person.objects.create(user=user, enterprise=self.enterprise, role='Staff', due=0, technician_profit=0)
+        transaction = PurchaseTransaction.objects.create(enterprise=self.enterprise, purchased_by=sita)
+        Purchase.objects.create(item=self.cell, quantity=1, price=10, transaction=transaction)
+        self.assertEqual(self.search('sit'), [transaction.pk])
+        self.assertEqual(len(self.search('admin')), 3)
+
+
+class PurchaseReportTests(PurchaseTestData, TestCase):
+    """Totals come from SQL over the whole filtered range; detail rows are keyset-paginated."""
+
+    def test_summary_covers_the_enterprise_only(self):
+        summary = self.client.get('/inventory/purchase-report/').data['summary']
+        self.assertEqual(summary, {
+            'total_purchases': 4, 'total_amount': 260.0, 'total_quantity': 11, 'average_price': 65.0,
+        })
+
+    def test_group_by_item_and_month(self):
+        groups = self.client.get('/inventory/purchase-report/', {'group_by': 'item'}).data['groups']
+        self.assertEqual(
+            [(group['name'], group['total_purchases'], group['total_quantity'], group['total_amount']) for group in groups],
+            [('Display', 2, 4, 170.0), ('Cell', 2, 7, 90.0)],
+        )
+        groups = self.client.get('/inventory/purchase-report/', {'group_by': 'month', 'category': 'batt'}).data['groups']
+        self.assertEqual([group['total_amount'] for group in groups], [40.0, 50.0])
+
+    def test_unknown_group_by_is_rejected(self):
+        self.assertEqual(self.client.get('/inventory/purchase-report/', {'group_by': 'day'}).status_code, 400)
+
+    def test_pages_walk_every_row_newest_first(self):
+        seen = []
+        url, params = '/inventory/purchase-report/', {'start_date': '2024-03-01', 'end_date': '2024-04-30'}
+        with mock.patch.object(PurchaseReportView, 'page_size', 2):
+            while url:
+                data = self.client.get(url, params).data
+                self.assertEqual(data['summary']['total_purchases'], 4)
+                seen += [row['id'] for row in data['purchases']]
+                url, params = data['next'], None
+        first, second, third = self.purchases
+        self.assertEqual(seen, [third[0].pk, second[1].pk, second[0].pk, first[0].pk])
+
+    def test_csv_export_has_every_filtered_row_of_the_enterprise(self):
+        response = self.client.get('/inventory/purchase-report/', {'format': 'csv', 'item_name': 'display'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="purchase-report.csv"')
+        header, *rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(header.split(','), list(PurchaseReportView.export_columns))
+        first, second, _ = self.purchases
+        self.assertEqual(rows, [
+            f'{second[0].pk},{second[0].transaction_id},2024-03-15,Display,Screens,1,50.0,50.0,Admin',
+            f'{first[0].pk},{first[0].transaction_id},2024-03-01,Display,Screens,3,40.0,120.0,Admin',
+        ])
+
+
+class CatalogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.enterprise = Enterprise.objects.create(name='Shop')
+        cls.user = User.objects.create_user('admin@example.com', 'Admin', 'pw')
+        Person.objects.create(user=cls.user, enterprise=cls.enterprise, role='Admin', due=0, technician_profit=0)
+        cls.screens = Category.objects.create(name='Screens', enterprise=cls.enterprise)
+        cls.display = Item.objects.create(name='Display iPhone 12', quantity=1, cost=50, enterprise=cls.enterprise, category=cls.screens)
+        cls.glass = Item.objects.create(name='iPhone 12 glass', quantity=1, cost=5, enterprise=cls.enterprise, category=cls.screens)
+
+    def setUp(self):
+        catalog._catalogs.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def autocomplete(self, query, **params):
+        # A fresh user per request, as with JWT, so the tenant's catalog_version is current
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        return [row['label'] for row in self.client.get('/inventory/item/autocomplete/', {'q': query, **params}).data]
+
+    def test_matches_word_prefixes_anywhere_in_the_label(self):
+        self.assertEqual(self.autocomplete('iph'), ['iPhone 12 glass Screens', 'Display iPhone 12 Screens'])
+        self.assertEqual(self.autocomplete('12 scr'), ['iPhone 12 glass Screens', 'Display iPhone 12 Screens'])
+        self.assertEqual(self.autocomplete('screens disp'), ['Display iPhone 12 Screens'])
+        self.assertEqual(self.autocomplete('hone'), [])
+
+    def test_renaming_an_item_rebuilds_the_catalog(self):
+        self.assertEqual(self.autocomplete('disp'), ['Display iPhone 12 Screens'])
+        cached = catalog._catalogs[self.enterprise.pk]
+        self.assertEqual(self.autocomplete('disp'), ['Display iPhone 12 Screens'])
+        self.assertIs(catalog._catalogs[self.enterprise.pk], cached)
+
+        self.display.name = 'OLED iPhone 12'
+        self.display.save()
+        self.assertEqual(self.autocomplete('disp'), [])
+        self.assertEqual(self.autocomplete('oled'), ['OLED iPhone 12 Screens'])
+        self.assertIsNot(catalog._catalogs[self.enterprise.pk], cached)
+
+    def test_least_recently_used_catalog_is_evicted(self):
+        enterprises = [self.enterprise] + [Enterprise.objects.create(name=f'Shop {n}') for n in range(2)]
+        with mock.patch.object(catalog, 'MAX_CACHED_CATALOGS', 2):
+            catalog.get_catalog(enterprises[0])
+            catalog.get_catalog(enterprises[1])
+            catalog.get_catalog(enterprises[0])
+            catalog.get_catalog(enterprises[2])
+        self.assertEqual(list(catalog._catalogs), [enterprises[0].pk, enterprises[2].pk])
+
+    def test_matches_past_thousands_of_shared_prefixes_are_found(self):
+        # 2100 labels start with "a" and sort before both matches
+        Item.objects.bulk_create(
+            Item(name=f'Apple {n:04d}', quantity=1, cost=1, enterprise=self.enterprise, category=self.screens) for n in range(2100)
+        )
+        Item.objects.create(name='Avocado bolt', quantity=1, cost=1, enterprise=self.enterprise, category=self.screens)
+        Item.objects.create(name='Zinc adapter', quantity=1, cost=1, enterprise=self.enterprise, category=self.screens)
+        self.assertEqual(self.autocomplete('a bolt'), ['Avocado bolt Screens'])
+        self.assertEqual(self.autocomplete('ad'), ['Zinc adapter Screens'])
+        self.assertEqual(len(self.autocomplete('a', limit=50)), 50)
+        self.assertEqual(self.autocomplete('a', limit=1), ['Apple 0000 Screens'])
+
+
+class InventoryETagTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.enterprise = Enterprise.objects.create(name='Shop')
+        cls.user = User.objects.create_user('admin@example.com', 'Admin', 'pw')
+        Person.objects.create(user=cls.user, enterprise=cls.enterprise, role='Admin', due=0, technician_profit=0)
+        category = Category.objects.create(name='Screens', enterprise=cls.enterprise)
+        cls.item = Item.objects.create(name='Display', quantity=0, cost=50, enterprise=cls.enterprise, category=category)
+
+    def get(self, etag=None, **params):
+        # A fresh user per request, as with JWT, so the tenant's inventory_version is current
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get('/inventory/item/', params, headers=headers)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_repeat_get_is_not_modified(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        repeat = self.get(first['ETag'])
+        self.assertEqual((repeat.status_code, repeat['ETag']), (304, first['ETag']))
+        self.assertEqual(self.get(first['ETag'], search='disp').status_code, 200)
+
+    def test_stock_write_changes_the_etag(self):
+        etag = self.get()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/inventory/purchasetransaction/', {'purchases': [{'item': self.item.pk, 'quantity': 2, 'price': 40}]}, format='json',
+            )
+        self.assertEqual(response.status_code, 201)
+        after = self.get(etag)
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], etag)
+        self.assertEqual(after.data[0]['quantity'], 2)
+
+    def test_rebuilds_change_the_etag(self):
+        # Drift the quantity without going through inventory.stock, so nothing is bumped
+        Item.objects.filter(pk=self.item.pk).update(quantity=5)
+        for command in (['stock_ledger', 'rebuild'], ['inventory_valuation']):
+            with self.subTest(command=command[0]):
+                etag = self.get()['ETag']
+                call_command(*command, stdout=StringIO())
+                after = self.get(etag)
+                self.assertEqual(after.status_code, 200)
+        self.assertEqual(after.data[0]['quantity'], 0)
+
+
+class ValuationTests(TestCase):
+    """Average cost and FIFO layers against a sequence worked out by hand."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.enterprise = Enterprise.objects.create(name='Shop')
+        cls.user = User.objects.create_user('admin@example.com', 'Admin', 'pw')
+        Person.objects.create(user=cls.user, enterprise=cls.enterprise, role='Admin', due=0, technician_profit=0)
+        category = Category.objects.create(name='Screens', enterprise=cls.enterprise)
+        cls.item = Item.objects.create(name='Display', quantity=0, cost=50, enterprise=cls.enterprise, category=category)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def purchase(self, quantity, price):
+        response = self.client.post(
+            '/inventory/purchasetransaction/', {'purchases': [{'item': self.item.pk, 'quantity': quantity, 'price': price}]}, format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def layers(self):
+        return list(
+            CostLayer.objects.filter(item=self.item, quantity_remaining__gt=0)
+            .order_by('received_at', 'id')
+            .values_list('purchase_transaction_id', 'quantity_remaining', 'unit_cost')
+        )
+
+    def valuation(self, method):
+        return self.client.get('/inventory/valuation/', {'method': method}).data['total_value']
+
+    def test_purchases_sales_and_deletes(self):
+        first = self.purchase(10, 40)                  # 10 @ 40, average 40
+        second = self.purchase(10, 60)                 # 20, average (400 + 600) / 20 = 50
+        adjust_stock({self.item.pk: -12}, 'repair')    # first lot used up, 8 left of the second
+        third = self.purchase(4, 80)                   # 12, average (8*50 + 4*80) / 12 = 60
+        self.assertEqual(self.layers(), [(second, 8, 60), (third, 4, 80)])
+
+        # Deleting the second purchase takes back its own 8 first, then 2 of the oldest other lot
+        adjust_stock({self.item.pk: -10}, 'purchase_delete', purchase_transaction=PurchaseTransaction.objects.get(pk=second))
+        self.assertEqual(self.layers(), [(third, 2, 80)])
+        adjust_stock({self.item.pk: 1}, 'repair_delete')  # returned at the average, which stays 60
+
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.quantity, self.item.average_cost), (3, 60))
+        self.assertEqual(self.layers(), [(third, 2, 80), (None, 1, 60)])
+        self.assertEqual(self.valuation('average'), 180)
+        self.assertEqual(self.valuation('fifo'), 220)
+        self.assertNotIn(first, [layer[0] for layer in self.layers()])
+        call_command('inventory_valuation', '--verify', stdout=StringIO())
+
+    def test_rebuild_reproduces_the_maintained_state(self):
+        self.purchase(10, 40)
+        self.purchase(10, 60)
+        adjust_stock({self.item.pk: -12}, 'repair')
+        self.purchase(4, 80)
+        maintained = (Item.objects.get(pk=self.item.pk).average_cost, self.layers())
+        call_command('inventory_valuation', stdout=StringIO())
+        self.assertEqual((Item.objects.get(pk=self.item.pk).average_cost, self.layers()), maintained)
+
+    def test_issuing_more_than_the_stock_clamps_at_zero(self):
+        self.purchase(2, 40)
+        applied = adjust_stock({self.item.pk: -5}, 'repair')
+        self.assertEqual(applied, {self.item.pk: -2})
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.quantity, self.item.average_cost), (0, 40))
+        self.assertEqual(self.layers(), [])
+        self.assertEqual(list(StockMovement.objects.filter(item=self.item).values_list('delta', flat=True).order_by('id')), [2, -2])
+
+        # The next purchase starts a fresh average rather than mixing with negative stock
+        self.purchase(1, 90)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.quantity, self.item.average_cost), (1, 90))
@@ -5,7 +5,11 @@ urlpatterns = [
     path('purchasetransaction/', views.PurchaseTransactionView.as_view(), name='purchase'),
     path('purchasetransaction/<int:pk>/', views.PurchaseTransactionView.as_view(), name='purchase_detail'),
     path('purchase-report/', views.PurchaseReportView.as_view(), name='purchase_report'),
+    path('item/autocomplete/', views.ItemAutocompleteView.as_view(), name='item_autocomplete'),
+    path('item/<int:item_id>/stock/', views.ItemStockView.as_view(), name='item_stock'),
+    path('valuation/', views.InventoryValuationView.as_view(), name='inventory_valuation'),
     path('item-usage/<int:item_id>/', views.ItemUsageReportView.as_view(), name='item_usage_report'),
+    path('item-usage/<int:item_id>/repairs/', views.ItemUsageDetailView.as_view(), name='item_usage_repairs'),
     # path('purchase/<int:pk>/', views.PurchaseTransactionDetailView.as_view(), name='purchase_detail'),
     path('category/', views.CategoryView.as_view(), name='category'),
     path('category/<int:pk>/', views.CategoryView.as_view(), name='category_detail'),
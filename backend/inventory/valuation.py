@@ -0,0 +1,129 @@
+"""
+Inventory valuation, maintained as stock moves.
+
+Each item keeps a perpetual weighted-average cost (Item.average_cost) and FIFO
+cost layers (CostLayer). inventory.stock updates both in the same locked
+transaction as the quantity, so valuation reports read the stored state instead
+of replaying purchases. `manage.py inventory_valuation` recomputes both from
+the stock ledger for backfills.
+"""
+from collections import defaultdict
+
+from django.db.models import Case, IntegerField, Value, When
+
+from .models import CostLayer
+
+
+def current_unit_cost(average_cost, cost):
+    return average_cost if average_cost is not None else cost
+
+
+def incoming_unit_costs(locked, applied, unit_costs=None):
+    """
+    Unit cost of the stock each positive delta brings in: the purchase price
+    when known, otherwise the item's current average (returns, recounts).
+    """
+    unit_costs = unit_costs or {}
+    incoming = {}
+    for item_id, delta in applied.items():
+        if delta > 0:
+            _, average_cost, cost, _ = locked[item_id]
+            incoming[item_id] = unit_costs.get(item_id, current_unit_cost(average_cost, cost))
+    return incoming
+
+
+def new_average_costs(locked, applied, incoming):
+    """Weighted-average cost after receiving stock. Issues leave the average unchanged."""
+    averages = {}
+    for item_id, unit_cost in incoming.items():
+        quantity, average_cost, cost, _ = locked[item_id]
+        delta = applied[item_id]
+        if quantity <= 0:
+            averages[item_id] = unit_cost
+        else:
+            current = current_unit_cost(average_cost, cost)
+            averages[item_id] = (quantity * current + delta * unit_cost) / (quantity + delta)
+    return averages
+
+
+def consume_layers(layers, consuming):
+    """
+    Take `{item_id: quantity}` out of `layers` (ordered oldest first per item)
+    and return the layers that changed.
+    """
+    changed = []
+    for layer in layers:
+        needed = consuming.get(layer.item_id, 0)
+        if needed <= 0:
+            continue
+        taken = min(needed, layer.quantity_remaining)
+        layer.quantity_remaining -= taken
+        consuming[layer.item_id] = needed - taken
+        changed.append(layer)
+    return changed
+
+
+def update_cost_layers(applied, incoming, purchase_transaction=None, consume_own_layers_first=False):
+    consuming = {item_id: -delta for item_id, delta in applied.items() if delta < 0}
+    if consuming:
+        ordering = ['item_id', 'received_at', 'id']
+        layers = CostLayer.objects.select_for_update().filter(item_id__in=consuming, quantity_remaining__gt=0)
+        if consume_own_layers_first and purchase_transaction is not None:
+            # Undoing a purchase removes the lots it brought in before older ones
+            layers = layers.annotate(own=Case(
+                When(purchase_transaction=purchase_transaction, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            ))
+            ordering.insert(1, 'own')
+        changed = consume_layers(layers.order_by(*ordering), consuming)
+        CostLayer.objects.bulk_update(changed, ['quantity_remaining'])
+
+    CostLayer.objects.bulk_create(
+        CostLayer(
+            item_id=item_id,
+            purchase_transaction=purchase_transaction,
+            quantity_received=applied[item_id],
+            quantity_remaining=applied[item_id],
+            unit_cost=unit_cost,
+        )
+        for item_id, unit_cost in incoming.items()
+    )
+
+
+def recompute(movements, purchase_prices, base_costs):
+    """
+    Replay stock movements (ordered by item, then time) into average costs and
+    open FIFO layers. `purchase_prices` maps (purchase_transaction_id, item_id)
+    to the unit price paid; `base_costs` maps item_id to Item.cost, used for
+    stock that entered without a known price. Returns ({item_id: average_cost},
+    [CostLayer]).
+    """
+    averages = {}
+    open_layers = defaultdict(list)
+    quantities = defaultdict(int)
+    for item_id, delta, reason, purchase_transaction_id, created_at in movements:
+        quantity = quantities[item_id]
+        average = averages.get(item_id, base_costs.get(item_id))
+        if delta > 0:
+            unit_cost = purchase_prices.get((purchase_transaction_id, item_id), average)
+            averages[item_id] = unit_cost if quantity <= 0 else (quantity * average + delta * unit_cost) / (quantity + delta)
+            open_layers[item_id].append(CostLayer(
+                item_id=item_id,
+                purchase_transaction_id=purchase_transaction_id if reason == 'purchase' else None,
+                received_at=created_at,
+                quantity_received=delta,
+                quantity_remaining=delta,
+                unit_cost=unit_cost,
+            ))
+        elif delta < 0:
+            layers = open_layers[item_id]
+            if reason == 'purchase_delete' and purchase_transaction_id is not None:
+                layers.sort(key=lambda layer: layer.purchase_transaction_id != purchase_transaction_id)
+            consume_layers(layers, {item_id: -delta})
+            open_layers[item_id] = sorted(
+                (layer for layer in layers if layer.quantity_remaining > 0),
+                key=lambda layer: layer.received_at,
+            )
+        quantities[item_id] = quantity + delta
+    return averages, [layer for layers in open_layers.values() for layer in layers]
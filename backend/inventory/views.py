@@ -1,3 +1,4 @@
+import hashlib
 from django.shortcuts import render
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
@@ -5,12 +6,23 @@ from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
 from rest_framework.pagination import PageNumberPagination
-from .models import PurchaseTransaction,Category,Item,Purchase
-from repair.models import RepairItem
+from .models import PurchaseTransaction,Category,Item,Purchase,CostLayer
+from repair.models import ItemUsageDaily, RepairItem
 from .serializers import PurchaseTransactionSerializer,CategorySerializer,ItemSerializer,PurchaseSerializer
 from django.db import transaction
+from django.utils import timezone
 from django.utils.dateparse import parse_date
-from django.db.models import Q
+from django.db.models import Count, Exists, ExpressionWrapper, F, FloatField, OuterRef, Q, Sum
+from django.db.models.functions import Coalesce, TruncDay, TruncMonth, TruncWeek
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from collections import defaultdict
+from repair.pagination import KeysetPagination, wants_cursor
+from .search import search_items
+from .catalog import get_catalog
+from .stock import adjust_stock, end_of_day, stock_as_of
+from repair.export import EXPORT_RENDERER_CLASSES, export_format, stream_export
 # Create your views here.
 
 
@@ -25,25 +37,27 @@ class PurchaseTransactionView(APIView):
     permission_classes = [IsAuthenticated]
     pagination_class = PurchaseTransactionPagination
 
-    def _get_locked_item(self, item_id, cache):
-        if item_id not in cache:
-            cache[item_id] = Item.objects.select_for_update().get(id=item_id)
-        return cache[item_id]
-
     def get(self, request, pk=None):
         if pk:
-            purchase_transaction = PurchaseTransaction.objects.get(id=pk)
+            purchase_transaction = PurchaseTransaction.objects.get(id=pk, enterprise_id=request.tenant.enterprise_id)
             serializer = PurchaseTransactionSerializer(purchase_transaction)
             return Response(serializer.data)
         
         # Get all purchase transactions for the enterprise
-        purchase_transactions = PurchaseTransaction.objects.filter(enterprise=request.user.person.enterprise)
+        purchase_transactions = PurchaseTransaction.objects.filter(enterprise_id=request.tenant.enterprise_id)
         purchase_transactions = purchase_transactions.order_by('-id')
         
         # Apply search filter
-        search = request.GET.get('search')
+        search = request.GET.get('search', '').strip()
         if search:
-            purchase_transactions = purchase_transactions.filter(purchases__product__icontains=search)
+            # EXISTS keeps one row per transaction, no DISTINCT needed; the
+            # item and category name lookups use the trigram indexes on Postgres
+            matching_lines = Purchase.objects.filter(transaction=OuterRef('pk')).filter(
+                Q(item__name__icontains=search) | Q(item__category__name__icontains=search)
+            )
+            purchase_transactions = purchase_transactions.filter(
+                Q(Exists(matching_lines)) | Q(purchased_by__user__name__icontains=search)
+            )
         
         # Apply date filters
         start_date = request.GET.get('start_date')
@@ -57,16 +71,16 @@ class PurchaseTransactionView(APIView):
                 )
         
         # Apply pagination
-        paginator = self.pagination_class()
-        paginated_transactions = paginator.paginate_queryset(purchase_transactions, request)
+        paginator = KeysetPagination(ordering=('-id',)) if wants_cursor(request) else self.pagination_class()
+        paginated_transactions = paginator.paginate_queryset(purchase_transactions, request, view=self)
         serializer = PurchaseTransactionSerializer(paginated_transactions, many=True)
         
         return paginator.get_paginated_response(serializer.data)
     
     def post(self, request):
         data = request.data
-        data["enterprise"] = request.user.person.enterprise.id
-        data["purchased_by"] = request.user.person
+        data["enterprise"] = request.tenant.enterprise_id
+        data["purchased_by"] = request.tenant.person
         serializer = PurchaseTransactionSerializer(data=data)
         if serializer.is_valid(raise_exception=True):
             serializer.save()
@@ -79,34 +93,61 @@ class PurchaseTransactionView(APIView):
         if not purchase_transaction:
             return Response({"detail": "Purchase transaction not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        items_cache = {}
-
-        for purchase in purchase_transaction.purchases.all():
-            item = self._get_locked_item(purchase.item.id, items_cache)
-            item.quantity= (item.quantity or 0) - purchase.quantity  # Reduce stock
-
-        for item in items_cache.values():
-            item.save()
+        # Take the purchased stock back off the shelf
+        returned = defaultdict(int)
+        for item_id, quantity in purchase_transaction.purchases.values_list('item_id', 'quantity'):
+            returned[item_id] -= quantity
+        adjust_stock(returned, 'purchase_delete', purchase_transaction=purchase_transaction)
 
         purchase_transaction.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
     
-class CategoryView(APIView):
+class InventoryETagMixin:
+    """
+    Strong ETags for inventory reads, built from the enterprise's
+    inventory_version and the request's query string. The version arrives with
+    request.tenant, so a matching If-None-Match is answered with 304 before
+    any inventory table is read.
+    """
+
+    def get_inventory_etag(self, request):
+        key = f"{request.tenant.enterprise_id}:{request.tenant.enterprise.inventory_version}:{request.get_full_path()}"
+        return '"%s"' % hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+    def not_modified(self, request, etag):
+        tags = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in tags or '*' in tags:
+            return self.with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+        return None
+
+    def with_etag(self, response, etag):
+        response['ETag'] = etag
+        # Browsers may keep the copy but must revalidate it on every use
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+
+class CategoryView(InventoryETagMixin, APIView):
 
     permission_classes = [IsAuthenticated]
 
     def get(self,request,*args, **kwargs):
 
-        categories = Category.objects.filter(enterprise=request.user.person.enterprise)
+        etag = self.get_inventory_etag(request)
+        cached = self.not_modified(request, etag)
+        if cached:
+            return cached
+        categories = Category.objects.filter(enterprise_id=request.tenant.enterprise_id)
         categories = categories.order_by('-id')
         serializer = CategorySerializer(categories, many=True)
-        return Response(serializer.data)
+        return self.with_etag(Response(serializer.data), etag)
     
     def post(self,request,*args, **kwargs):
 
         data = request.data
         print("Here is the data",data)
-        data["enterprise"] = request.user.person.enterprise.id
+        data["enterprise"] = request.tenant.enterprise_id
         serializer = CategorySerializer(data=data)
         if serializer.is_valid(raise_exception=True):
             serializer.save()
@@ -120,25 +161,59 @@ class CategoryView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
     
 
-class ItemView(APIView):
+class ItemView(InventoryETagMixin, APIView):
 
     permission_classes = [IsAuthenticated]
+    # ?ordering= values and the columns they sort on; id breaks ties
+    orderings = {
+        'name': 'name',
+        'quantity': 'stock',
+        'cost': 'cost',
+        'updated_at': 'updated_at',
+    }
+
+    def get_ordering(self, request, searching):
+        ordering = request.GET.get('ordering', '')
+        field = self.orderings.get(ordering.lstrip('-'))
+        if field:
+            direction = '-' if ordering.startswith('-') else ''
+            return (direction + field, direction + 'id')
+        return ('-rank', '-id') if searching else ('-id',)
 
     def get(self,request,*args, **kwargs):
 
-        items = Item.objects.filter(enterprise=request.user.person.enterprise)
+        etag = self.get_inventory_etag(request)
+        cached = self.not_modified(request, etag)
+        if cached:
+            return cached
+        items = (
+            Item.objects
+            .filter(enterprise_id=request.tenant.enterprise_id)
+            .select_related('category')
+            .annotate(stock=Coalesce('quantity', 0))
+        )
         # filter by category if provided
         category_id = request.GET.get('category')
         if category_id:
             items = items.filter(category_id=category_id)
-        items = items.order_by('-id')
+        search = request.GET.get('search') or request.GET.get('q')
+        if search:
+            items = search_items(items, search)
+        ordering = self.get_ordering(request, bool(search))
+
+        if wants_cursor(request):
+            paginator = KeysetPagination(ordering=ordering, page_size=50)
+            page = paginator.paginate_queryset(items, request, view=self)
+            return self.with_etag(paginator.get_paginated_response(ItemSerializer(page, many=True).data), etag)
+
+        items = items.order_by(*ordering)
         serializer = ItemSerializer(items, many=True)
-        return Response(serializer.data)
+        return self.with_etag(Response(serializer.data), etag)
     
     def post(self,request,*args, **kwargs):
             
         data = request.data
-        data["enterprise"] = request.user.person.enterprise.id
+        data["enterprise"] = request.tenant.enterprise_id
         serializer = ItemSerializer(data=data)
         if serializer.is_valid(raise_exception=True):
             serializer.save()
@@ -164,9 +239,31 @@ class ItemView(APIView):
 class PurchaseReportView(APIView):
     """
     API View for generating purchase reports with filtering capabilities
-    Returns individual purchase records (not grouped by transaction)
+    Returns individual purchase records (not grouped by transaction), a page at
+    a time, or totals per item, category, purchaser or month with ?group_by=
+    ?format=csv or ?format=ndjson streams every matching record instead
     """
     permission_classes = [IsAuthenticated]
+    renderer_classes = EXPORT_RENDERER_CLASSES
+    page_size = 50
+    amount = ExpressionWrapper(F('price') * F('quantity'), output_field=FloatField())
+    export_columns = {
+        'id': 'id',
+        'transaction_id': 'transaction_id',
+        'transaction_date': 'transaction__date',
+        'item': 'item__name',
+        'category': 'item__category__name',
+        'quantity': 'quantity',
+        'price': 'price',
+        'total_cost': amount,
+        'purchased_by': 'transaction__purchased_by__user__name',
+    }
+    group_by_fields = {
+        'item': {'key': F('item_id'), 'name': F('item__name'), 'category': F('item__category__name')},
+        'category': {'key': F('item__category_id'), 'name': F('item__category__name')},
+        'purchaser': {'key': F('transaction__purchased_by_id'), 'name': F('transaction__purchased_by__user__name')},
+        'month': {'key': TruncMonth('transaction__date')},
+    }
 
     def get(self, request):
         # Get query parameters
@@ -175,12 +272,17 @@ class PurchaseReportView(APIView):
         category_name = request.GET.get('category', '')
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
-        
+        group_by = request.GET.get('group_by')
+
+        if group_by and group_by not in self.group_by_fields:
+            return Response(
+                {'error': f"group_by must be one of: {', '.join(self.group_by_fields)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
         # Base queryset - get all purchases for the user's enterprise
-        purchases = Purchase.objects.filter(
-            transaction__enterprise=request.user.person.enterprise
-        ).select_related('item', 'item__category', 'transaction')
-        
+        purchases = Purchase.objects.filter(transaction__enterprise_id=request.tenant.enterprise_id)
+
         # Apply date range filter if provided
         if start_date and end_date:
             start_date_parsed = parse_date(start_date)
@@ -189,7 +291,7 @@ class PurchaseReportView(APIView):
                 purchases = purchases.filter(
                     transaction__date__range=(start_date_parsed, end_date_parsed)
                 )
-        
+
         # Apply search filters
         if search_term:
             # Search across multiple fields using Q objects
@@ -198,98 +300,259 @@ class PurchaseReportView(APIView):
             search_query |= Q(item__category__name__icontains=search_term)
             search_query |= Q(transaction__purchased_by__user__name__icontains=search_term)
             purchases = purchases.filter(search_query)
-        
+
         # Apply specific filters
         if item_name:
             purchases = purchases.filter(item__name__icontains=item_name)
-        
+
         if category_name:
             purchases = purchases.filter(item__category__name__icontains=category_name)
-        
-        # Order by most recent transactions first
-        purchases = purchases.order_by('-transaction__date', '-id')
-        
+
+        fmt = export_format(request)
+        if fmt:
+            purchases = purchases.order_by('-transaction__date', '-id')
+            return stream_export(purchases, self.export_columns, fmt, 'purchase-report')
+
+        # Summary statistics in one query
+        totals = purchases.aggregate(
+            total_purchases=Count('id'),
+            total_amount=Coalesce(Sum(self.amount), 0.0),
+            total_quantity=Coalesce(Sum('quantity'), 0),
+        )
+        totals['average_price'] = (
+            totals['total_amount'] / totals['total_purchases'] if totals['total_purchases'] > 0 else 0
+        )
+
+        if group_by:
+            groups = (
+                purchases
+                .values(**self.group_by_fields[group_by])
+                .annotate(
+                    total_purchases=Count('id'),
+                    total_amount=Sum(self.amount),
+                    total_quantity=Sum('quantity'),
+                )
+                .order_by('key' if group_by == 'month' else '-total_amount')
+            )
+            return Response({'group_by': group_by, 'groups': list(groups), 'summary': totals})
+
+        # Detail rows, most recent transactions first, one page at a time
+        purchases = purchases.select_related('item__category', 'transaction__purchased_by__user')
+        paginator = KeysetPagination(ordering=('-transaction__date', '-id'), page_size=self.page_size)
+        page = paginator.paginate_queryset(purchases, request, view=self)
+
         # Serialize the data
         from .serializers import PurchaseReportSerializer
-        serializer = PurchaseReportSerializer(purchases, many=True)
-        
-        # Calculate summary statistics
-        total_purchases = purchases.count()
-        total_amount = sum(p.price * p.quantity for p in purchases)
-        total_quantity = sum(p.quantity for p in purchases)
-        
-        # Return response with data and summary
+        serializer = PurchaseReportSerializer(page, many=True)
+
         return Response({
             'purchases': serializer.data,
-            'summary': {
-                'total_purchases': total_purchases,
-                'total_amount': total_amount,
-                'total_quantity': total_quantity,
-                'average_price': total_amount / total_purchases if total_purchases > 0 else 0
-            }
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+            'summary': totals,
         })
 
 
-class ItemUsageReportView(APIView):
+class InventoryValuationView(APIView):
     """
-    Returns the list of repairs in which a given inventory item was used,
-    with dates and quantities, scoped to the user's enterprise.
+    Value of the stock on hand per category, from the maintained valuation
+    state: ?method=average (default) uses each item's weighted-average cost,
+    ?method=fifo sums the open FIFO cost layers.
     """
     permission_classes = [IsAuthenticated]
 
-    def get(self, request, item_id: int):
-        enterprise = request.user.person.enterprise
+    def get(self, request):
+        method = request.GET.get('method', 'average')
+        if method == 'fifo':
+            rows = (
+                CostLayer.objects
+                .filter(item__enterprise_id=request.tenant.enterprise_id, quantity_remaining__gt=0)
+                .values(category_id=F('item__category_id'), category_name=F('item__category__name'))
+                .annotate(
+                    stock=Sum('quantity_remaining'),
+                    value=Sum(ExpressionWrapper(F('quantity_remaining') * F('unit_cost'), output_field=FloatField())),
+                )
+            )
+        elif method == 'average':
+            rows = (
+                Item.objects
+                .filter(enterprise_id=request.tenant.enterprise_id, quantity__gt=0)
+                .values('category_id', category_name=F('category__name'))
+                .annotate(
+                    stock=Sum('quantity'),
+                    value=Sum(ExpressionWrapper(F('quantity') * Coalesce('average_cost', 'cost'), output_field=FloatField())),
+                )
+            )
+        else:
+            return Response({'error': "method must be 'average' or 'fifo'"}, status=status.HTTP_400_BAD_REQUEST)
 
-        usages = (
-            RepairItem.objects
-            .filter(item_id=item_id, repair__enterprise_repairs__name=enterprise)
-            .select_related('repair', 'item', 'item__category')
-            .order_by('-repair__updated_at', '-id')
+        categories = sorted(rows, key=lambda row: row['value'] or 0, reverse=True)
+        return Response({
+            'method': method,
+            'total_stock': sum(row['stock'] or 0 for row in categories),
+            'total_value': sum(row['value'] or 0 for row in categories),
+            'categories': categories,
+        })
+
+
+class ItemAutocompleteView(APIView):
+    """
+    Type-ahead over "name category" part labels, answered from the in-process
+    catalog in inventory.catalog instead of the database.
+    """
+    permission_classes = [IsAuthenticated]
+    default_limit = 10
+    max_limit = 50
+
+    def get(self, request):
+        query = request.GET.get('q', '')
+        try:
+            limit = min(int(request.GET.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+        if not query.strip() or limit <= 0:
+            return Response([])
+        catalog = get_catalog(request.tenant.enterprise)
+        return Response([{'id': item_id, 'label': label} for item_id, label in catalog.search(query, limit)])
+
+
+class ItemStockView(APIView):
+    """
+    Stock history of one item: its quantity at the end of ?as_of=YYYY-MM-DD
+    (today by default) and the movements up to then, newest first, a page at a time.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, item_id):
+        item = Item.objects.filter(id=item_id, enterprise_id=request.tenant.enterprise_id).first()
+        if not item:
+            return Response({"detail": "Item not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        as_of = parse_date(request.GET.get('as_of') or '') or timezone.localdate()
+        movements = item.movements.filter(created_at__lt=end_of_day(as_of))
+        paginator = KeysetPagination(ordering=('-created_at', '-id'), page_size=20)
+        page = paginator.paginate_queryset(movements, request, view=self)
+
+        from .serializers import StockMovementSerializer
+        return Response({
+            'item': item.id,
+            'quantity': item.quantity,
+            'as_of': as_of,
+            'quantity_as_of': stock_as_of(item.id, as_of),
+            'movements': StockMovementSerializer(page, many=True).data,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+        })
+
+
+class ItemUsageDetailView(APIView):
+    """
+    The repairs a given inventory item was used in, newest first, a page at a
+    time, scoped to the user's enterprise.
+    """
+    permission_classes = [IsAuthenticated]
+    page_size = 20
+
+    def get_item(self, request, item_id):
+        return (
+            Item.objects
+            .select_related('category')
+            .filter(id=item_id, enterprise_id=request.tenant.enterprise_id)
+            .first()
         )
 
-        # Optional date filtering using either repair.updated_at (date) or fallback to received_date
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
+    def get_date_range(self, request):
+        start_date = parse_date(request.GET.get('start_date') or '')
+        end_date = parse_date(request.GET.get('end_date') or '')
         if start_date and end_date:
-            start_date_parsed = parse_date(start_date)
-            end_date_parsed = parse_date(end_date)
-            if start_date_parsed and end_date_parsed:
-                usages = usages.filter(
-                    Q(repair__updated_at__date__range=(start_date_parsed, end_date_parsed)) |
-                    Q(repair__updated_at__isnull=True, repair__received_date__range=(start_date_parsed, end_date_parsed))
-                )
+            return start_date, end_date
+        return None
 
-        data = []
-        total_quantity = 0
-        item_meta = None
-        for u in usages:
-            r = u.repair
-            total_quantity += (u.quantity or 0)
-            if item_meta is None and u.item:
-                item_meta = {
-                    'id': u.item.id,
-                    'name': u.item.name,
-                    'category_id': u.item.category.id if u.item.category else None,
-                    'category_name': u.item.category.name if u.item.category else None,
-                }
-            data.append({
-                'repair_pk': r.id,
-                'repair_id': r.repair_id,
-                'customer_name': r.customer_name,
-                'customer_phone_number': r.customer_phone_number,
-                'phone_model': r.phone_model,
-                'repair_status': r.repair_status,
+    def get_usage_page(self, request, item, date_range, base_url=None):
+        usages = (
+            RepairItem.objects
+            .filter(item_id=item.id, repair__enterprise_id=request.tenant.enterprise_id)
+            .select_related('repair')
+        )
+        if date_range:
+            usages = usages.filter(used_on__range=date_range)
+        paginator = KeysetPagination(ordering=('-used_on', '-id'), page_size=self.page_size, base_url=base_url)
+        page = paginator.paginate_queryset(usages, request, view=self)
+        rows = [
+            {
+                'repair_pk': u.repair.id,
+                'repair_id': u.repair.repair_id,
+                'customer_name': u.repair.customer_name,
+                'customer_phone_number': u.repair.customer_phone_number,
+                'phone_model': u.repair.phone_model,
+                'repair_status': u.repair.repair_status,
                 'quantity': u.quantity,
-                'used_date': r.updated_at or r.received_date,
-                'received_date': r.received_date,
-                'delivery_date': r.delivery_date,
-            })
+                'used_date': u.used_on,
+                'received_date': u.repair.received_date,
+                'delivery_date': u.repair.delivery_date,
+            }
+            for u in page
+        ]
+        return rows, paginator
 
+    def get(self, request, item_id: int):
+        item = self.get_item(request, item_id)
+        if not item:
+            return Response({"detail": "Item not found"}, status=status.HTTP_404_NOT_FOUND)
+        rows, paginator = self.get_usage_page(request, item, self.get_date_range(request))
         return Response({
-            'item': item_meta,
-            'usage': data,
-            'summary': {
-                'total_usages': len(data),
-                'total_quantity': total_quantity,
-            }
-        })
\ No newline at end of file
+            'usage': rows,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+        })
+
+
+class ItemUsageReportView(ItemUsageDetailView):
+    """
+    Usage summary and trend for one inventory item, read from the daily
+    ItemUsageDaily rollup, with the first page of repairs it was used in. The
+    `next` link continues the listing at item-usage/<id>/repairs/.
+    """
+    intervals = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+    def get(self, request, item_id: int):
+        item = self.get_item(request, item_id)
+        if not item:
+            return Response({"detail": "Item not found"}, status=status.HTTP_404_NOT_FOUND)
+        date_range = self.get_date_range(request)
+
+        rollup = ItemUsageDaily.objects.filter(item_id=item.id, enterprise_id=request.tenant.enterprise_id)
+        if date_range:
+            rollup = rollup.filter(day__range=date_range)
+        summary = rollup.aggregate(
+            total_usages=Coalesce(Sum('usages'), 0),
+            total_quantity=Coalesce(Sum('quantity'), 0),
+        )
+        interval = request.GET.get('interval')
+        interval = interval if interval in self.intervals else 'day'
+        trend = (
+            rollup
+            .annotate(period=self.intervals[interval]('day'))
+            .values('period')
+            .annotate(quantity=Sum('quantity'), usages=Sum('usages'))
+            .order_by('period')
+        )
+
+        detail_url = request.build_absolute_uri(reverse('item_usage_repairs', args=[item.id]))
+        if request.GET:
+            detail_url = f"{detail_url}?{request.GET.urlencode()}"
+        rows, paginator = self.get_usage_page(request, item, date_range, base_url=detail_url)
+
+        return Response({
+            'item': {
+                'id': item.id,
+                'name': item.name,
+                'category_id': item.category_id,
+                'category_name': item.category.name if item.category else None,
+            },
+            'summary': summary,
+            'interval': interval,
+            'trend': list(trend),
+            'usage': rows,
+            'next': paginator.get_next_link(),
+        })
@@ -0,0 +1,213 @@
+"""
+Time series of repair volume, revenue, profit and turnaround for charts, and
+per-technician performance metrics.
+
+Each series is a handful of GROUP BY queries over the (enterprise, date)
+indexes, bucketed by day, week or month and gap-filled so every period in the
+range is present. Results are cached per enterprise, range and interval under
+a version derived from the repairs themselves: the newest updated_at moves on
+every save and the status counters move on every create and delete. The
+enterprise's people_version is part of it too, since technician names and
+shares change without touching any repair. A stale entry is never read back.
+"""
+import statistics
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import (
+    Aggregate, Avg, Count, DateField, DurationField, ExpressionWrapper, F, FloatField, Func, IntegerField, Max, Q, Sum,
+)
+from django.db.models.functions import Coalesce, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from enterprise.models import Enterprise
+
+from .models import SETTLED_STATUSES, Repair, RepairStatusCount
+
+INTERVALS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+# Keeps gap-filled responses to a chartable size
+MAX_PERIODS = 400
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def period_start(day, interval):
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def periods(start, end, interval):
+    """Every bucket start from the one containing `start` to the one containing `end`."""
+    current = period_start(start, interval)
+    while current <= end:
+        yield current
+        if interval == 'month':
+            current = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+        else:
+            current += timedelta(days=7 if interval == 'week' else 1)
+
+
+def period_count(start, end, interval):
+    """How many buckets `periods` yields, worked out without walking them."""
+    first = period_start(start, interval)
+    if first > end:
+        return 0
+    if interval == 'month':
+        return (end.year - first.year) * 12 + end.month - first.month + 1
+    return (end - first).days // (7 if interval == 'week' else 1) + 1
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _bucketed(queryset, field, interval, **aggregates):
+    rows = (
+        queryset
+        .annotate(period=INTERVALS[interval](field, output_field=DateField()))
+        .values('period')
+        .annotate(**aggregates)
+        .order_by()
+    )
+    return {_as_date(row.pop('period')): row for row in rows}
+
+
+def repair_series(enterprise_id, start, end, interval):
+    repairs = Repair.objects.filter(enterprise_id=enterprise_id)
+
+    received = _bucketed(
+        repairs.filter(received_date__range=(start, end)),
+        'received_date', interval,
+        received=Count('id'),
+    )
+    delivered = _bucketed(
+        repairs.filter(repair_status__in=SETTLED_STATUSES, delivery_date__range=(start, end)),
+        'delivery_date', interval,
+        delivered=Count('id'),
+        revenue=Coalesce(Sum('amount_paid'), 0.0),
+        profit=Coalesce(Sum('repair_profit'), 0.0),
+        turnaround=Avg(ExpressionWrapper(F('delivery_date') - F('received_date'), output_field=DurationField())),
+    )
+    updated = _bucketed(
+        repairs.filter(
+            updated_at__gte=timezone.make_aware(datetime.combine(start, time.min)),
+            updated_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+        ),
+        'updated_at', interval,
+        updated=Count('id'),
+    )
+
+    series = []
+    for period in periods(start, end, interval):
+        delivered_row = delivered.get(period, {})
+        turnaround = delivered_row.get('turnaround')
+        series.append({
+            'period': period,
+            'received': received.get(period, {}).get('received', 0),
+            'delivered': delivered_row.get('delivered', 0),
+            'revenue': delivered_row.get('revenue', 0.0),
+            'profit': delivered_row.get('profit', 0.0),
+            'avg_turnaround_days': round(turnaround.total_seconds() / 86400, 2) if turnaround is not None else None,
+            'updated': updated.get(period, {}).get('updated', 0),
+        })
+    return series
+
+
+def analytics_version(enterprise_id):
+    last_update = Repair.objects.filter(enterprise_id=enterprise_id).aggregate(last=Max('updated_at'))['last']
+    total = sum(RepairStatusCount.for_enterprise(enterprise_id).values())
+    people = Enterprise.objects.filter(pk=enterprise_id).values_list('people_version', flat=True).first()
+    return f"{last_update.timestamp() if last_update else 0}-{total}-{people}"
+
+
+def cached_repair_series(enterprise_id, start, end, interval):
+    key = f"repair-analytics:{enterprise_id}:{analytics_version(enterprise_id)}:{interval}:{start}:{end}"
+    series = cache.get(key)
+    if series is None:
+        series = repair_series(enterprise_id, start, end, interval)
+        cache.set(key, series, CACHE_TIMEOUT)
+    return series
+
+
+class DaysBetween(Func):
+    """`end - start` for two date columns, which Postgres returns as whole days."""
+    arg_joiner = ' - '
+    template = '(%(expressions)s)'
+    output_field = IntegerField()
+
+
+class PercentileCont(Aggregate):
+    """Postgres' interpolated percentile, an ordered-set aggregate."""
+    function = 'percentile_cont'
+    template = '%(function)s(%(percentile)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, expression, percentile, **extra):
+        super().__init__(expression, percentile=float(percentile), **extra)
+
+
+def _percentiles(days):
+    """(median, p90) of a list of turnaround days, interpolated like percentile_cont."""
+    if not days:
+        return None, None
+    if len(days) == 1:
+        return float(days[0]), float(days[0])
+    return statistics.median(days), statistics.quantiles(days, n=10, method='inclusive')[-1]
+
+
+def technician_metrics(enterprise_id, start, end):
+    """
+    Per technician, for repairs received between `start` and `end`: how many
+    they were assigned, the share settled and the share unrepairable, and the
+    median and 90th percentile days from receipt to delivery of the settled
+    ones. Percentiles are computed by the database on Postgres and from one
+    narrow scan of the settled repairs elsewhere.
+    """
+    repairs = Repair.objects.filter(
+        enterprise_id=enterprise_id, received_date__range=(start, end), repaired_by__isnull=False,
+    )
+    settled = Q(repair_status__in=SETTLED_STATUSES, delivery_date__isnull=False)
+    aggregates = {
+        'repairs': Count('id'),
+        'settled': Count('id', filter=Q(repair_status__in=SETTLED_STATUSES)),
+        'unrepairable': Count('id', filter=Q(repair_status='Unrepairable')),
+    }
+    postgres = connection.vendor == 'postgresql'
+    if postgres:
+        turnaround = DaysBetween('delivery_date', 'received_date')
+        aggregates['median_turnaround_days'] = PercentileCont(turnaround, 0.5, filter=settled)
+        aggregates['p90_turnaround_days'] = PercentileCont(turnaround, 0.9, filter=settled)
+
+    rows = list(
+        repairs
+        .values(technician_id=F('repaired_by_id'), name=F('repaired_by__user__name'))
+        .annotate(**aggregates)
+        .order_by('-repairs')
+    )
+
+    if not postgres:
+        days = defaultdict(list)
+        for technician_id, received, delivered in repairs.filter(settled).values_list(
+            'repaired_by_id', 'received_date', 'delivery_date',
+        ).iterator():
+            days[technician_id].append((delivered - received).days)
+        for row in rows:
+            row['median_turnaround_days'], row['p90_turnaround_days'] = _percentiles(days[row['technician_id']])
+
+    for row in rows:
+        row['completion_rate'] = round(row['settled'] / row['repairs'], 4)
+        row['unrepairable_rate'] = round(row['unrepairable'] / row['repairs'], 4)
+    return rows
+
+
+def cached_technician_metrics(enterprise_id, start, end):
+    key = f"technician-metrics:{enterprise_id}:{analytics_version(enterprise_id)}:{start}:{end}"
+    metrics = cache.get(key)
+    if metrics is None:
+        metrics = technician_metrics(enterprise_id, start, end)
+        cache.set(key, metrics, CACHE_TIMEOUT)
+    return metrics
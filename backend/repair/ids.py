@@ -0,0 +1,97 @@
+"""
+Short repair ids that are unique by construction.
+
+Each id is a counter value (a Postgres sequence, or the RepairIdSequence row
+on other backends) pushed through a keyed Feistel permutation and written as
+7 base62 characters. Distinct counter values always give distinct codes, so no
+existence check is needed. Because the permutation is keyed, consecutive
+repairs don't get guessable neighbouring ids. The key is stored in the
+RepairIdSequence row rather than in settings, so no deployment change can
+reshuffle the permutation and reissue an old code.
+
+Legacy ids are random 8-character strings, so they can never collide with
+these 7-character codes.
+"""
+import functools
+import hashlib
+import secrets
+import string
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models import F
+
+ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase
+CODE_LENGTH = 7
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH
+SEQUENCE_NAME = 'repair_repair_code_seq'
+
+_HALF_BITS = 21  # the Feistel network works on 42 bits, just above CODE_SPACE
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+
+
+def _sequence_row():
+    # Migration 0013 creates the row; a missing one (an empty database) gets a fresh key
+    RepairIdSequence = apps.get_model('repair', 'RepairIdSequence')
+    return RepairIdSequence.objects.get_or_create(pk=1, defaults={'key': secrets.token_hex(32)})[0]
+
+
+@functools.lru_cache(maxsize=None)
+def _key():
+    return hashlib.blake2b(_sequence_row().key.encode()).digest()
+
+
+def _round_function(value, round_index):
+    digest = hashlib.blake2b(f'{round_index}:{value}'.encode(), key=_key(), digest_size=4).digest()
+    return int.from_bytes(digest, 'big') & _HALF_MASK
+
+
+def _feistel(value):
+    left, right = value >> _HALF_BITS, value & _HALF_MASK
+    for round_index in range(_ROUNDS):
+        left, right = right, left ^ _round_function(right, round_index)
+    return (left << _HALF_BITS) | right
+
+
+def permute(value):
+    """Bijection on range(CODE_SPACE); cycle-walks values that land outside it."""
+    value = _feistel(value)
+    while value >= CODE_SPACE:
+        value = _feistel(value)
+    return value
+
+
+def encode(value):
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, remainder = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
+
+@transaction.atomic(savepoint=False)
+def _next_row_values(count):
+    """
+    Counter for backends without sequences. The increment takes the
+    database's write lock until commit, so values are unique across
+    processes and restarts.
+    """
+    row = apps.get_model('repair', 'RepairIdSequence').objects.filter(pk=1)
+    if not row.update(last_value=F('last_value') + count):
+        _sequence_row()
+        row.update(last_value=F('last_value') + count)
+    last_value = row.values_list('last_value', flat=True).get()
+    return list(range(last_value - count + 1, last_value + 1))
+
+
+def next_counter_values(count):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)', [SEQUENCE_NAME, count])
+            return [row[0] for row in cursor.fetchall()]
+    return _next_row_values(count)
+
+
+def generate_repair_ids(count=1):
+    return [encode(permute(value % CODE_SPACE)) for value in next_counter_values(count)]
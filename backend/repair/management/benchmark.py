@@ -0,0 +1,40 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from enterprise.models import Enterprise, Person
+from userauth.models import User
+
+
+class BenchmarkCommand(BaseCommand):
+    """
+    Base for commands that time the API against throwaway data. Everything
+    runs inside one transaction that is rolled back afterwards, so a benchmark
+    can be pointed at a copy of production without leaving rows behind.
+    Subclasses implement `benchmark(client, enterprise, **options)`; the client
+    is authenticated as an admin of the new enterprise.
+    """
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            enterprise = Enterprise.objects.create(name='Benchmark')
+            user = User.objects.create_user(f'benchmark-{uuid.uuid4().hex}@example.com', 'Benchmark', None)
+            Person.objects.create(user=user, enterprise=enterprise, role='Admin', due=0, technician_profit=0)
+            client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(user)
+            self.benchmark(client, enterprise, **options)
+            transaction.set_rollback(True)
+
+    def benchmark(self, client, enterprise, **options):
+        raise NotImplementedError
+
+    def timed(self, label, function, *args, **kwargs):
+        """Call `function`, report how long it took and return (result, seconds)."""
+        started = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label}: {elapsed * 1000:.1f} ms")
+        return result, elapsed
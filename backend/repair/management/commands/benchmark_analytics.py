@@ -0,0 +1,63 @@
+import random
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from repair.ids import generate_repair_ids
+from repair.management.benchmark import BenchmarkCommand
+from repair.models import Repair, RepairStatusCount
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Time GET /repair/analytics/ for each interval over a year of bulk-created repairs, "
+        "first uncached and then from the cache. Nothing is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repairs', type=int, default=1000000, help="Repairs to create (default 1000000).")
+
+    def benchmark(self, client, enterprise, repairs, **options):
+        end = date.today()
+        start = end - timedelta(days=364)
+        statuses = ['Not repaired', 'Repaired', 'Completed', 'Unrepairable']
+        now = datetime.now()
+
+        def create():
+            # Written straight to the table: save() and its rollups are not what is measured here
+            batch, counts = [], Counter()
+            for _ in range(repairs):
+                received = start + timedelta(days=random.randrange(365))
+                repair_status = random.choice(statuses)
+                counts[repair_status] += 1
+                batch.append(Repair(
+                    enterprise=enterprise, updated_at=now,
+                    customer_name='Benchmark', customer_phone_number='9800000000', phone_model='iPhone 12',
+                    repair_problem='Screen', total_amount=100, advance_paid=0, due=100, received_by='Counter',
+                    received_date=received, repair_status=repair_status,
+                    delivery_date=min(received + timedelta(days=random.randrange(10)), end),
+                    amount_paid=100 if repair_status == 'Completed' else 0,
+                    repair_profit=80 if repair_status == 'Completed' else 0,
+                ))
+                if len(batch) == 5000:
+                    write(batch)
+                    batch = []
+            write(batch)
+            RepairStatusCount.adjust_many((enterprise.pk, repair_status, total) for repair_status, total in counts.items())
+
+        def write(batch):
+            for repair, repair_id in zip(batch, generate_repair_ids(len(batch))):
+                repair.repair_id = repair_id
+            Repair.objects.bulk_create(batch)
+
+        self.timed(f"create {repairs} repairs", create)
+        for interval in ('day', 'week', 'month'):
+            params = {'interval': interval, 'start_date': start, 'end_date': end}
+            # The new repairs give the enterprise a fresh analytics version, so the first GET misses
+            response, uncached = self.timed(f"{interval} series, uncached", client.get, '/repair/analytics/', params)
+            if response.status_code != 200:
+                self.stderr.write(f"analytics failed: {response.status_code} {response.data}")
+                return
+            _, cached = self.timed(f"{interval} series, cached", client.get, '/repair/analytics/', params)
+            self.stdout.write(self.style.SUCCESS(
+                f"{interval}: {len(response.data['series'])} periods, cache is {uncached / cached:.0f}x faster"
+            ))
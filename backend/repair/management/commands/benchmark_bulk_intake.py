@@ -0,0 +1,35 @@
+from repair.management.benchmark import BenchmarkCommand
+
+
+def intake_row(number):
+    return {
+        'customer_name': f'Customer {number}',
+        'customer_phone_number': f'98{number:08d}',
+        'phone_model': 'iPhone 12',
+        'repair_problem': 'Screen',
+        'total_amount': 100,
+        'advance_paid': 10,
+        'due': 90,
+        'received_by': 'Counter',
+    }
+
+
+class Command(BenchmarkCommand):
+    help = "Time taking in repairs one POST /repair/ at a time against one POST /repair/bulk/. Nothing is kept."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help="Repairs to take in each way (default 100).")
+
+    def benchmark(self, client, enterprise, rows, **options):
+        data = [intake_row(number) for number in range(rows)]
+
+        def post_one_by_one():
+            for row in data:
+                client.post('/repair/', row, format='json')
+
+        _, single = self.timed(f"{rows} single POSTs", post_one_by_one)
+        response, bulk = self.timed(f"1 bulk POST of {rows}", client.post, '/repair/bulk/', data, format='json')
+        if response.status_code != 201:
+            self.stderr.write(f"bulk intake failed: {response.status_code} {response.data}")
+            return
+        self.stdout.write(self.style.SUCCESS(f"bulk intake is {single / bulk:.1f}x faster"))
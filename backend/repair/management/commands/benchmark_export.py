@@ -0,0 +1,41 @@
+import tracemalloc
+from datetime import date
+
+from enterprise.models import Person
+from repair.management.benchmark import BenchmarkCommand
+from transactions.models import Transaction
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Compare the peak memory and time of a streamed CSV export of /transactions/search "
+        "with the JSON listing of the same rows. Nothing is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help="Transactions to export (default 5000).")
+
+    def benchmark(self, client, enterprise, rows, **options):
+        admin = Person.objects.get(enterprise=enterprise)
+        Transaction.objects.bulk_create(
+            (
+                Transaction(date=date(2024, 1, 1), enterprise=enterprise, transaction_from=admin, transaction_to=admin, desc=f'Payment {n}', amount=n)
+                for n in range(rows)
+            ),
+            batch_size=1000,
+        )
+
+        def peak(label, fetch):
+            tracemalloc.start()
+            try:
+                self.timed(label, fetch)
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        streamed = peak("streamed CSV", lambda: sum(
+            len(chunk) for chunk in client.get('/transactions/search', {'format': 'csv'}).streaming_content
+        ))
+        in_memory = peak("JSON listing", lambda: client.get('/transactions/search').content)
+        self.stdout.write(f"peak memory: streamed {streamed / 1024:.0f} KiB, listing {in_memory / 1024:.0f} KiB")
+        self.stdout.write(self.style.SUCCESS(f"streaming peaks at {in_memory / streamed:.1f}x less memory"))
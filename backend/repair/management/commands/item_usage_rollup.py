@@ -0,0 +1,51 @@
+from django.db.models import Count, Sum
+
+from repair.management.rollup import RollupCommand
+from repair.models import ItemUsageDaily, RepairItem
+
+
+def total_usage_by_day():
+    rows = (
+        RepairItem.objects
+        .filter(repair__enterprise__isnull=False)
+        .values_list('item_id', 'repair__enterprise_id', 'used_on')
+        .annotate(quantity=Sum('quantity'), usages=Count('id'))
+        .order_by()
+    )
+    return {(item_id, day): (enterprise_id, quantity, usages) for item_id, enterprise_id, day, quantity, usages in rows}
+
+
+class Command(RollupCommand):
+    help = "Rebuild the daily item usage rollup from the RepairItem table, or verify it with --verify."
+    noun = 'item usage rollup row'
+    source = 'the RepairItem table'
+    empty = (None, 0, 0)
+
+    def expected(self):
+        return total_usage_by_day()
+
+    def stored(self):
+        return {
+            (item_id, day): (enterprise_id, quantity, usages)
+            for item_id, day, enterprise_id, quantity, usages
+            in ItemUsageDaily.objects.values_list('item_id', 'day', 'enterprise_id', 'quantity', 'usages')
+        }
+
+    def matches(self, have, want):
+        # The enterprise only matters for rows that exist on both sides
+        return have[1:] == want[1:]
+
+    def describe(self, key, have, want):
+        item_id, day = key
+        return f"item {item_id} on {day}: rollup {have[1:]}, actual {want[1:]} (quantity, usages)"
+
+    def write(self, expected):
+        ItemUsageDaily.objects.all().delete()
+        ItemUsageDaily.objects.bulk_create(
+            (
+                ItemUsageDaily(item_id=item_id, enterprise_id=enterprise_id, day=day, quantity=quantity, usages=usages)
+                for (item_id, day), (enterprise_id, quantity, usages) in expected.items()
+            ),
+            batch_size=1000,
+        )
+        return len(expected)
@@ -0,0 +1,65 @@
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+
+from repair.management.rollup import RollupCommand
+from repair.models import PROFIT_FIELDS, SETTLED_STATUSES, DailyProfit, Repair
+
+# Float sums drift slightly as amounts are added and taken out again
+TOLERANCE = 0.01
+
+
+def total_profit_by_day():
+    rows = (
+        Repair.objects
+        .filter(repair_status__in=SETTLED_STATUSES, enterprise__isnull=False, delivery_date__isnull=False)
+        .values_list('enterprise_id', 'delivery_date', 'repaired_by_id', 'repair_status')
+        .annotate(repairs=Count('id'), **{f'total_{field}': Coalesce(Sum(field), 0.0) for field in PROFIT_FIELDS})
+        .order_by()
+    )
+    return {tuple(row[:4]): tuple(row[4:]) for row in rows}
+
+
+def stored_profit_by_day():
+    rows = DailyProfit.objects.values_list('enterprise_id', 'day', 'technician_id', 'repair_status', 'repairs', *PROFIT_FIELDS)
+    return {tuple(row[:4]): tuple(row[4:]) for row in rows}
+
+
+class Command(RollupCommand):
+    help = "Rebuild the daily profit rollup from the Repair table, or verify it with --verify."
+    noun = 'daily profit rollup row'
+    source = 'the Repair table'
+    empty = (0,) * (len(PROFIT_FIELDS) + 1)
+
+    def expected(self):
+        return total_profit_by_day()
+
+    def stored(self):
+        return stored_profit_by_day()
+
+    def matches(self, have, want):
+        return all(abs(a - b) <= TOLERANCE for a, b in zip(have, want))
+
+    def describe(self, key, have, want):
+        enterprise_id, day, technician_id, repair_status = key
+        return (
+            f"enterprise {enterprise_id} {day} technician {technician_id} {repair_status}: "
+            f"rollup {have}, actual {want} (repairs, {', '.join(PROFIT_FIELDS)})"
+        )
+
+    def write(self, expected):
+        DailyProfit.objects.all().delete()
+        DailyProfit.objects.bulk_create(
+            (
+                DailyProfit(
+                    enterprise_id=enterprise_id,
+                    day=day,
+                    technician_id=technician_id,
+                    repair_status=repair_status,
+                    repairs=repairs,
+                    **dict(zip(PROFIT_FIELDS, profits)),
+                )
+                for (enterprise_id, day, technician_id, repair_status), (repairs, *profits) in expected.items()
+            ),
+            batch_size=1000,
+        )
+        return len(expected)
@@ -0,0 +1,42 @@
+from django.db.models import Count
+
+from repair.management.rollup import RollupCommand
+from repair.models import Repair, RepairStatusCount
+
+
+def count_repairs_by_status():
+    rows = (
+        Repair.objects
+        .filter(enterprise__isnull=False)
+        .values_list('enterprise_id', 'repair_status')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    return {(enterprise_id, repair_status): total for enterprise_id, repair_status, total in rows}
+
+
+class Command(RollupCommand):
+    help = "Rebuild the per-enterprise repair status counters from the Repair table, or verify them with --verify."
+    noun = 'repair status counter'
+    source = 'the Repair table'
+
+    def expected(self):
+        return count_repairs_by_status()
+
+    def stored(self):
+        return {
+            (enterprise_id, repair_status): count
+            for enterprise_id, repair_status, count in RepairStatusCount.objects.values_list('enterprise_id', 'repair_status', 'count')
+        }
+
+    def describe(self, key, have, want):
+        enterprise_id, repair_status = key
+        return f"enterprise {enterprise_id} {repair_status!r}: counter {have}, actual {want}"
+
+    def write(self, expected):
+        RepairStatusCount.objects.all().delete()
+        RepairStatusCount.objects.bulk_create(
+            RepairStatusCount(enterprise_id=enterprise_id, repair_status=repair_status, count=total)
+            for (enterprise_id, repair_status), total in expected.items()
+        )
+        return len(expected)
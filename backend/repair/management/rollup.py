@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+
+class RollupCommand(BaseCommand):
+    """
+    Base for commands that keep a table of derived totals in step with the
+    rows it is derived from. By default the table is rebuilt; with --verify
+    the rows that disagree are only reported, and the command fails if any do.
+
+    Subclasses name a row (`noun`) and the `source`, and provide `expected()`
+    and `stored()` as {key: values} dicts, `describe()` for one mismatch and
+    `write()`, which rebuilds the table and returns how many rows it wrote.
+    """
+    noun = 'rollup row'
+    source = 'the source table'
+    # Values of a key missing on one side
+    empty = 0
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help=f"Only report {self.noun}s that disagree with {self.source}.")
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify()
+        else:
+            self.rebuild()
+
+    def expected(self):
+        raise NotImplementedError
+
+    def stored(self):
+        raise NotImplementedError
+
+    def describe(self, key, have, want):
+        return f"{key}: stored {have}, actual {want}"
+
+    def write(self, expected):
+        raise NotImplementedError
+
+    def matches(self, have, want):
+        return have == want
+
+    def mismatches(self, expected):
+        stored = self.stored()
+        return [
+            (key, stored.get(key, self.empty), expected.get(key, self.empty))
+            for key in sorted(set(expected) | set(stored), key=str)
+            if not self.matches(stored.get(key, self.empty), expected.get(key, self.empty))
+        ]
+
+    def verify(self):
+        mismatches = self.mismatches(self.expected())
+        for key, have, want in mismatches:
+            self.stdout.write(self.describe(key, have, want))
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} {self.noun}(s) disagree with {self.source}")
+        self.stdout.write(self.style.SUCCESS(f"Every {self.noun} matches {self.source}"))
+
+    @transaction.atomic
+    def rebuild(self):
+        written = self.write(self.expected())
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} {self.noun}(s)"))
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:50
+
+from datetime import datetime, time, timezone
+
+from django.db import migrations, models
+
+
+def backfill_updated_at(apps, schema_editor):
+    # Keyset pagination can't page over NULLs; legacy rows get their intake date.
+    Repair = apps.get_model('repair', 'Repair')
+    pending = []
+    for repair in Repair.objects.filter(updated_at__isnull=True).only('id', 'received_date').iterator():
+        repair.updated_at = datetime.combine(repair.received_date, time.min, tzinfo=timezone.utc)
+        pending.append(repair)
+    Repair.objects.bulk_update(pending, ['updated_at'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enterprise', '0003_alter_person_technician_profit'),
+        ('repair', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='repair',
+            index=models.Index(fields=['-updated_at', '-id'], name='repair_updated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repair',
+            index=models.Index(fields=['repair_status', '-updated_at', '-id'], name='repair_status_updated_id_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+from repair.pgindexes import postgres_indexes
+
+SEARCH_INDEXES = [
+    ('repair_customer_name_trgm_idx', 'repair_repair', 'USING gin (customer_name gin_trgm_ops)'),
+    ('repair_phone_model_trgm_idx', 'repair_repair', 'USING gin (phone_model gin_trgm_ops)'),
+    ('repair_phone_number_trgm_idx', 'repair_repair', 'USING gin (customer_phone_number gin_trgm_ops)'),
+    ('repair_phone_number_prefix_idx', 'repair_repair', '(customer_phone_number varchar_pattern_ops)'),
+    ('repair_repair_id_idx', 'repair_repair', '(repair_id)'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repair', '0003_repair_keyset_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        postgres_indexes(SEARCH_INDEXES),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counts(apps, schema_editor):
+    Repair = apps.get_model('repair', 'Repair')
+    RepairStatusCount = apps.get_model('repair', 'RepairStatusCount')
+    rows = (
+        Repair.objects
+        .filter(enterprise_repairs__isnull=False)
+        .values_list('enterprise_repairs', 'repair_status')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    RepairStatusCount.objects.bulk_create(
+        RepairStatusCount(enterprise_id=enterprise_id, repair_status=repair_status, count=total)
+        for enterprise_id, repair_status, total in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enterprise', '0003_alter_person_technician_profit'),
+        ('repair', '0004_repair_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepairStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('repair_status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('enterprise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='repair_status_counts', to='enterprise.enterprise')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='repairstatuscount',
+            constraint=models.UniqueConstraint(fields=('enterprise', 'repair_status'), name='unique_repair_status_count'),
+        ),
+        migrations.RunPython(populate_counts, migrations.RunPython.noop),
+    ]
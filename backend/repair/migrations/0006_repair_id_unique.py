@@ -0,0 +1,72 @@
+import random
+import string
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# Frozen copies: this migration must not change when repair.ids does
+SEQUENCE_NAME = 'repair_repair_code_seq'
+LEGACY_ID_CHARACTERS = string.ascii_letters + string.digits
+LEGACY_ID_LENGTH = 8
+
+
+def create_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'CREATE SEQUENCE IF NOT EXISTS {SEQUENCE_NAME}')
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP SEQUENCE IF EXISTS {SEQUENCE_NAME}')
+
+
+def reissue_conflicting_ids(apps, schema_editor):
+    # The unique index can't be built over blank or duplicated legacy ids. The
+    # oldest repair keeps a duplicated id; the others get fresh legacy-style
+    # 8-character ids, which can't collide with the 7-character codes issued
+    # from the sequence later.
+    Repair = apps.get_model('repair', 'Repair')
+    duplicated = (
+        Repair.objects.values('repair_id')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .values_list('repair_id', flat=True)
+    )
+    conflicting = []
+    for repair_id in list(duplicated):
+        repairs = Repair.objects.filter(repair_id=repair_id).order_by('id')
+        conflicting.extend(repairs if repair_id == '' else repairs[1:])
+    if not conflicting:
+        return
+    taken = set(Repair.objects.values_list('repair_id', flat=True))
+    for repair in conflicting:
+        new_id = None
+        while new_id is None or new_id in taken:
+            new_id = ''.join(random.choice(LEGACY_ID_CHARACTERS) for _ in range(LEGACY_ID_LENGTH))
+        taken.add(new_id)
+        repair.repair_id = new_id
+    Repair.objects.bulk_update(conflicting, ['repair_id'])
+
+
+def drop_search_index(apps, schema_editor):
+    # Superseded by the unique index below (see 0004_repair_search_indexes)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS repair_repair_id_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repair', '0005_repairstatuscount'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sequence, drop_sequence),
+        migrations.RunPython(reissue_conflicting_ids, migrations.RunPython.noop),
+        migrations.RunPython(drop_search_index, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='repair',
+            name='repair_id',
+            field=models.CharField(blank=True, max_length=8, unique=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:54
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repair', '0006_repair_id_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='repair',
+            name='delivery_date',
+            field=models.DateField(blank=True, default=datetime.date.today, null=True),
+        ),
+        migrations.AlterField(
+            model_name='repair',
+            name='received_date',
+            field=models.DateField(default=datetime.date.today),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_enterprise_from_m2m(apps, schema_editor):
+    Repair = apps.get_model('repair', 'Repair')
+    Enterprise = apps.get_model('enterprise', 'Enterprise')
+    EnterpriseRepair = Enterprise.repairs.through
+    first_link = EnterpriseRepair.objects.filter(repair_id=OuterRef('pk')).order_by('id').values('enterprise_id')[:1]
+    Repair.objects.filter(enterprise__isnull=True).update(enterprise_id=Subquery(first_link))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enterprise', '0003_alter_person_technician_profit'),
+        ('repair', '0007_repair_date_defaults'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='repair',
+            name='repair_updated_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='repair',
+            name='repair_status_updated_id_idx',
+        ),
+        migrations.AddField(
+            model_name='repair',
+            name='enterprise',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='enterprise.enterprise'),
+        ),
+        migrations.RunPython(copy_enterprise_from_m2m, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='repair',
+            index=models.Index(fields=['enterprise', '-updated_at', '-id'], name='repair_ent_updated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repair',
+            index=models.Index(fields=['enterprise', 'repair_status', '-updated_at', '-id'], name='repair_ent_status_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repair',
+            index=models.Index(fields=['enterprise', 'delivery_date'], name='repair_ent_delivery_idx'),
+        ),
+    ]
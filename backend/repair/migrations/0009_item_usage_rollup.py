@@ -0,0 +1,83 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:04
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill_usage(apps, schema_editor):
+    Repair = apps.get_model('repair', 'Repair')
+    RepairItem = apps.get_model('repair', 'RepairItem')
+    ItemUsageDaily = apps.get_model('repair', 'ItemUsageDaily')
+
+    # The usage report used to date a part by its repair's last update
+    used_on = Repair.objects.filter(pk=OuterRef('repair_id')).values(
+        day=Coalesce(TruncDate('updated_at'), 'received_date')
+    )[:1]
+    RepairItem.objects.update(used_on=Coalesce(Subquery(used_on), 'used_on'))
+
+    rows = (
+        RepairItem.objects
+        .filter(repair__enterprise__isnull=False)
+        .values_list('item_id', 'repair__enterprise_id', 'used_on')
+        .annotate(quantity=Sum('quantity'), usages=Count('id'))
+        .order_by()
+    )
+    ItemUsageDaily.objects.bulk_create(
+        (
+            ItemUsageDaily(item_id=item_id, enterprise_id=enterprise_id, day=day, quantity=quantity, usages=usages)
+            for item_id, enterprise_id, day, quantity, usages in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enterprise', '0004_enterprise_catalog_version'),
+        ('inventory', '0009_item_indexes'),
+        ('repair', '0008_repair_enterprise'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemUsageDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('usages', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='repairitem',
+            name='used_on',
+            field=models.DateField(default=datetime.date.today),
+        ),
+        migrations.AddIndex(
+            model_name='repairitem',
+            index=models.Index(fields=['item', '-used_on', '-id'], name='repairitem_item_used_idx'),
+        ),
+        migrations.AddField(
+            model_name='itemusagedaily',
+            name='enterprise',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='item_usage', to='enterprise.enterprise'),
+        ),
+        migrations.AddField(
+            model_name='itemusagedaily',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_usage', to='inventory.item'),
+        ),
+        migrations.AddIndex(
+            model_name='itemusagedaily',
+            index=models.Index(fields=['enterprise', 'day'], name='item_usage_ent_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='itemusagedaily',
+            constraint=models.UniqueConstraint(fields=('item', 'day'), name='unique_item_usage_day'),
+        ),
+        migrations.RunPython(backfill_usage, migrations.RunPython.noop),
+    ]
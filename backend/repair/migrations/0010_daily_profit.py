@@ -0,0 +1,65 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_profit(apps, schema_editor):
+    Repair = apps.get_model('repair', 'Repair')
+    DailyProfit = apps.get_model('repair', 'DailyProfit')
+
+    profit_fields = ('repair_profit', 'technician_profit', 'my_profit', 'admin_only_profit')
+    rows = (
+        Repair.objects
+        .filter(repair_status__in=('Completed', 'Credited'), enterprise__isnull=False, delivery_date__isnull=False)
+        .values('enterprise_id', 'delivery_date', 'repaired_by_id', 'repair_status')
+        .annotate(repairs=Count('id'), **{field: Coalesce(Sum(field), 0.0) for field in profit_fields})
+        .order_by()
+    )
+    DailyProfit.objects.bulk_create(
+        (
+            DailyProfit(
+                enterprise_id=row['enterprise_id'],
+                day=row['delivery_date'],
+                technician_id=row['repaired_by_id'],
+                repair_status=row['repair_status'],
+                repairs=row['repairs'],
+                **{field: row[field] for field in profit_fields},
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enterprise', '0005_enterprise_inventory_version'),
+        ('repair', '0009_item_usage_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProfit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('repair_status', models.CharField(max_length=20)),
+                ('repairs', models.IntegerField(default=0)),
+                ('repair_profit', models.FloatField(default=0)),
+                ('technician_profit', models.FloatField(default=0)),
+                ('my_profit', models.FloatField(default=0)),
+                ('admin_only_profit', models.FloatField(default=0)),
+                ('enterprise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_profits', to='enterprise.enterprise')),
+                ('technician', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_profits', to='enterprise.person')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailyprofit',
+            constraint=models.UniqueConstraint(fields=('enterprise', 'day', 'technician', 'repair_status'), name='unique_daily_profit'),
+        ),
+        migrations.RunPython(backfill_profit, migrations.RunPython.noop),
+    ]
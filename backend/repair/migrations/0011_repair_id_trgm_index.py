@@ -0,0 +1,19 @@
+from django.db import migrations
+
+from repair.pgindexes import postgres_indexes
+
+# Partial repair ids are matched with ILIKE in repair.search; see 0004
+SEARCH_INDEXES = [
+    ('repair_repair_id_trgm_idx', 'repair_repair', 'USING gin (repair_id gin_trgm_ops)'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repair', '0010_daily_profit'),
+    ]
+
+    operations = [
+        postgres_indexes(SEARCH_INDEXES),
+    ]
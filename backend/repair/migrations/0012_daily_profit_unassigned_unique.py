@@ -0,0 +1,45 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:43
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_unassigned_duplicates(apps, schema_editor):
+    DailyProfit = apps.get_model('repair', 'DailyProfit')
+
+    profit_fields = ('repairs', 'repair_profit', 'technician_profit', 'my_profit', 'admin_only_profit')
+    duplicates = (
+        DailyProfit.objects
+        .filter(technician__isnull=True)
+        .values('enterprise_id', 'day', 'repair_status')
+        .annotate(rows=Count('id'), **{f'total_{field}': Sum(field) for field in profit_fields})
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for group in duplicates.iterator():
+        rows = DailyProfit.objects.filter(
+            technician__isnull=True, enterprise_id=group['enterprise_id'], day=group['day'], repair_status=group['repair_status'],
+        ).order_by('id')
+        keep = rows.first()
+        rows.exclude(pk=keep.pk).delete()
+        DailyProfit.objects.filter(pk=keep.pk).update(**{field: group[f'total_{field}'] for field in profit_fields})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enterprise', '0006_due_ledger'),
+        ('repair', '0011_repair_id_trgm_index'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='dailyprofit',
+            name='unique_daily_profit',
+        ),
+        migrations.RunPython(merge_unassigned_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyprofit',
+            constraint=models.UniqueConstraint(fields=('enterprise', 'day', 'technician', 'repair_status'), name='unique_daily_profit', nulls_distinct=False),
+        ),
+    ]
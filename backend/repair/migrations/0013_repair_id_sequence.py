@@ -0,0 +1,53 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:05
+
+import os
+import secrets
+import time
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Length
+
+# Frozen copy of the clock counter repair.ids used before this migration
+CLOCK_EPOCH = 1704067200
+CLOCK_COUNTER_BITS = 12
+
+
+def seed_sequence(apps, schema_editor):
+    """
+    Store the permutation key with the data. Codes issued so far were keyed by
+    REPAIR_ID_KEY from the environment or, without it, by SECRET_KEY, so that
+    key is kept when any exist; otherwise a random one is drawn. Off Postgres
+    the counter resumes above every value the old clock counter could have
+    handed out.
+    """
+    Repair = apps.get_model('repair', 'Repair')
+    RepairIdSequence = apps.get_model('repair', 'RepairIdSequence')
+    issued = Repair.objects.annotate(length=Length('repair_id')).filter(length=7).exists()
+    if issued:
+        key = os.environ.get('REPAIR_ID_KEY') or 'repair-ids:' + settings.SECRET_KEY
+    else:
+        key = secrets.token_hex(32)
+    last_value = 0
+    if issued and schema_editor.connection.vendor != 'postgresql':
+        last_value = (int(time.time()) - CLOCK_EPOCH + 1) << CLOCK_COUNTER_BITS
+    RepairIdSequence.objects.create(pk=1, key=key, last_value=last_value)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repair', '0012_daily_profit_unassigned_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepairIdSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=128)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_sequence, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,30 @@
 from django.db import models
-from datetime import datetime
-from enterprise.models import Enterprise,Outside
-import random
-import string
-from django.db.models import Q
+from datetime import date, datetime
+from collections import Counter, defaultdict
+from enterprise.models import Enterprise,Outside,Person
+from django.db.models import Exists, F, OuterRef, Q
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.db import transaction
 from django.apps import apps
+from enterprise.dues import post_due, post_dues
+from inventory.stock import adjust_stock
+from .ids import generate_repair_ids
+from .rollups import increment
 # from django.conf import settings
 
 # Create your models here.
 
+# Statuses whose profit has been split and credited to the technician
+SETTLED_STATUSES = ("Completed", "Credited")
+# Columns Repair.save compares against the stored row
+TRACKED_FIELDS = {
+    'enterprise_id', 'repair_status', 'repaired_by_id', 'delivery_date',
+    'repair_profit', 'technician_profit', 'my_profit', 'admin_only_profit',
+}
+# Profit columns summed into DailyProfit
+PROFIT_FIELDS = ('repair_profit', 'technician_profit', 'my_profit', 'admin_only_profit')
+
 class Repair(models.Model):
 
     status_choices = [
@@ -27,7 +43,7 @@ class Repair(models.Model):
     ]
 
     # company = models.CharField(max_length=30)
-    repair_id = models.CharField(max_length=8,blank=True)
+    repair_id = models.CharField(max_length=8,blank=True,unique=True)
     customer_name = models.CharField(max_length=30)
     customer_phone_number = models.CharField(max_length=10)
     phone_model = models.CharField(max_length=30)
@@ -43,7 +59,7 @@ class Repair(models.Model):
     total_amount = models.IntegerField()
     advance_paid = models.IntegerField()
     due = models.IntegerField()
-    received_date = models.DateField(default=datetime.now)
+    received_date = models.DateField(default=date.today)
     received_by = models.CharField(max_length=30)
     repaired_by = models.ForeignKey('enterprise.Person',limit_choices_to=Q(role='Technician') | Q(role='Admin'), null=True, blank=True, on_delete=models.SET_NULL) #same enterprise ko lagi
     outside_repair = models.BooleanField(default=False)
@@ -64,150 +80,400 @@ class Repair(models.Model):
     returned_by = models.CharField(max_length=30,null=True,blank=True)
     outside_returned_date = models.DateField(null=True,blank=True)
     outside_cost = models.FloatField(null=True, blank=True)
-    delivery_date = models.DateField(default=datetime.now,null=True,blank=True)
+    delivery_date = models.DateField(default=date.today,null=True,blank=True)
     credit_due = models.IntegerField(null=True,blank=True)
     credit_paid = models.IntegerField(null = True, blank = True)
     updated_at = models.DateTimeField(null=True,blank=True)
+    # Owning enterprise. Enterprise.repairs (M2M) is still written for older readers.
+    enterprise = models.ForeignKey(Enterprise, null=True, blank=True, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            # keyset pagination of the repair list, plain and filtered by status
+            models.Index(fields=['enterprise', '-updated_at', '-id'], name='repair_ent_updated_id_idx'),
+            models.Index(fields=['enterprise', 'repair_status', '-updated_at', '-id'], name='repair_ent_status_updated_idx'),
+            # profit reports over a delivery date range
+            models.Index(fields=['enterprise', 'delivery_date'], name='repair_ent_delivery_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so save() can detect transitions without re-fetching the row
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_original(self):
+        """Field values as last loaded from or written to the database, or None for a new repair."""
+        if not self.pk:
+            return None
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or not TRACKED_FIELDS.issubset(loaded):
+            loaded = Repair.objects.filter(pk=self.pk).values(*TRACKED_FIELDS).first()
+        return loaded
 
+    # No savepoint when nested: a failed save aborts the caller's transaction anyway
+    @transaction.atomic(savepoint=False)
     def save(self, *args, **kwargs):
-        if not self.pk:  # Check if the instance is new
+        original = self.get_original()
+        if original is None:  # Check if the instance is new
             self.repair_id = self.generate_unique_repair_id()
 
         self.updated_at = datetime.now()
+        old_status = original['repair_status'] if original else None
 
-        if self.pk:
-            original = Repair.objects.get(pk=self.pk)
-            if original.repair_status != "Completed" and self.repair_status == "Completed":
-                self.amount_paid = (self.amount_paid or 0) + self.advance_paid    
+        if original:
+            if old_status != "Completed" and self.repair_status == "Completed":
+                self.amount_paid = (self.amount_paid or 0) + self.advance_paid
 
-            if original.repair_status != "Credited" and self.repair_status == "Credited":
-                print(self.amount_paid)
-                print(self.credit_due)
-                print(self.repair_cost_price)
-                self.repair_profit = self.amount_paid + self.credit_due - self.repair_cost_price
+            if old_status != "Credited" and self.repair_status == "Credited":
                 Credit = apps.get_model('transactions', 'Credit')
-                creditor = Credit.objects.get(repair = self)
-                creditor.due = creditor.due + self.credit_due
-                creditor.save()
-
-                if self.outside_repair: 
-                    self.repair_profit = self.repair_profit - self.outside_cost
-                    self.admin_only_profit = self.repair_profit
-                    self.technician_profit = 0
-                else:
-                    enterprises = self.enterprise_repairs.all()
-                    if not enterprises:
-                        self.technician_profit = 0
-                        self.my_profit = self.repair_profit  # Or any other default value
-
-
-                        #definitely do sth about this
-                    else:
-                        repaired_by = self.repaired_by
-                        if repaired_by.role == "Admin":
-                            self.admin_only_profit = self.repair_profit
-                            self.technician_profit = 0
-                        else:
-                            tech = self.repaired_by
-                            self.technician_profit = (tech.technician_profit / 100) * self.repair_profit
-                            print(tech.technician_profit)
-                            self.my_profit = ((100 - tech.technician_profit) / 100) * self.repair_profit
-                            tech.due = tech.due + (tech.technician_profit / 100) * self.repair_profit
-                            tech.save()
-
-            if original.repair_status == "Credited" and self.repair_status == "Credited":
+                self.repair_profit = self.amount_paid + self.credit_due - self.repair_cost_price
+                Credit.objects.filter(repair=self).update(due=F('due') + self.credit_due)
+                self.split_profit()
+
+            if old_status == "Credited" and self.repair_status == "Credited":
                 CreditTransaction = apps.get_model('transactions', 'CreditTransaction')
                 Credit = apps.get_model('transactions', 'Credit')
+                paid = self.credit_paid or 0
                 creditor = Credit.objects.get(repair = self)
-                enterprise = Enterprise.objects.get(repairs = self)
                 CreditTransaction.objects.create(
                     repair = self,
                     transaction_from = creditor,
-                    enterprise = enterprise,
-                    amount = self.credit_paid,
+                    enterprise_id = self.enterprise_id,
+                    amount = paid,
                     date = self.updated_at
                 )
-                self.amount_paid = self.credit_paid + self.amount_paid
-                self.credit_due = self.credit_due - self.credit_paid
+                Credit.objects.filter(pk=creditor.pk).update(due=F('due') - paid)
+                self.amount_paid = paid + self.amount_paid
+                self.credit_due = self.credit_due - paid
                 self.credit_paid = 0
                 if self.credit_due == 0:
                     self.repair_status = "Completed"
-                creditor.due = creditor.due - self.credit_paid
-                creditor.save()
-
-                # CreditTransaction.objects.create(repair=self,transaction_from = )
 
-            
+            if old_status in SETTLED_STATUSES and self.repair_status not in SETTLED_STATUSES:
+                # Reopened: the profit split is undone and the technician's share reversed below
+                self.technician_profit = 0
+                self.my_profit = 0
+                self.repair_profit = 0
+                self.admin_only_profit = 0
 
         if self.repair_status=="Completed":
             if self.credit_due:
-                self.amount_paid = self.amount_paid + self.credit_paid
-                self.credit_due = self.credit_due - self.credit_paid
+                self.amount_paid = self.amount_paid + (self.credit_paid or 0)
+                self.credit_due = self.credit_due - (self.credit_paid or 0)
                 self.credit_paid = 0
-
-            print("Here")
-            print(self.amount_paid)
-            print(self.repair_cost_price)
             self.repair_profit = self.amount_paid - self.repair_cost_price
-            
-            if self.outside_repair: 
-                self.repair_profit = self.repair_profit - self.outside_cost
-                self.admin_only_profit = self.repair_profit
-                self.technician_profit = 0
-            else:
-                enterprises = self.enterprise_repairs.all()
-                if not enterprises:
-                    print("hereerere")
-                    self.technician_profit = 0
-                    self.my_profit = self.repair_profit  # Or any other default value
-                else:
-                    enterprise = enterprises.first()  # Get the first related enterprise, adjust as needed
-                    repaired_by = self.repaired_by
-                    if repaired_by.role == "Admin":
-                        self.admin_only_profit = self.repair_profit
-                        self.technician_profit = 0
-                    else:
-                        tech = self.repaired_by
-                        self.technician_profit = (tech.technician_profit / 100) * self.repair_profit
-                        self.my_profit = ((100 - tech.technician_profit) / 100) * self.repair_profit
-                        tech.due = tech.due + (tech.technician_profit / 100) * self.repair_profit
-                        print("##########################################")
-                        tech.save()
-                # self.technician_profit = (self.enterprise.technician_profit / 100) * self.repair_profit
-                # self.my_profit = ((100-self.enterprise.technician_profit) / 100) * self.repair_profit
+            self.split_profit()
+
         super(Repair, self).save(*args, **kwargs)
 
+        if original is None and self.enterprise_id:
+            Enterprise.repairs.through.objects.create(enterprise_id=self.enterprise_id, repair_id=self.pk)
+        self.apply_technician_dues(original)
+        self.apply_status_counts(original)
+        DailyProfit.apply(original, self._profit_values())
+        self._loaded_values = {field: getattr(self, field) for field in TRACKED_FIELDS}
+
+    @classmethod
+    @transaction.atomic
+    def bulk_intake(cls, enterprise_id, rows):
+        """
+        Create many repairs for one enterprise with a handful of statements:
+        ids are drawn in one batch, and the repairs, their enterprise links and
+        the status counters are each written in bulk. save() is bypassed, so
+        callers must only pass open repairs (no settled status, no parts).
+        """
+        now = datetime.now()
+        repairs = [
+            cls(repair_id=repair_id, enterprise_id=enterprise_id, updated_at=now, **row)
+            for row, repair_id in zip(rows, generate_repair_ids(len(rows)))
+        ]
+        cls.objects.bulk_create(repairs)
+
+        EnterpriseRepair = Enterprise.repairs.through
+        EnterpriseRepair.objects.bulk_create(
+            EnterpriseRepair(enterprise_id=enterprise_id, repair_id=repair.pk) for repair in repairs
+        )
+        RepairStatusCount.adjust_many(
+            (enterprise_id, repair_status, total)
+            for repair_status, total in Counter(repair.repair_status for repair in repairs).items()
+        )
+        for repair in repairs:
+            repair._loaded_values = {field: getattr(repair, field) for field in TRACKED_FIELDS}
+        return repairs
+
+    def split_profit(self):
+        """Divide repair_profit between the technician and the shop."""
+        if self.outside_repair:
+            self.repair_profit = self.repair_profit - self.outside_cost
+            self.admin_only_profit = self.repair_profit
+            self.technician_profit = 0
+            return
+
+        repaired_by = self.repaired_by
+        if not self.enterprise_id or repaired_by is None:
+            self.technician_profit = 0
+            self.my_profit = self.repair_profit  # Or any other default value
+        elif repaired_by.role == "Admin":
+            self.admin_only_profit = self.repair_profit
+            self.technician_profit = 0
+        else:
+            self.technician_profit = (repaired_by.technician_profit / 100) * self.repair_profit
+            self.my_profit = ((100 - repaired_by.technician_profit) / 100) * self.repair_profit
+
+    def apply_status_counts(self, original):
+        old = (original['enterprise_id'], original['repair_status']) if original else (None, None)
+        new = (self.enterprise_id, self.repair_status)
+        if old == new:
+            return
+        RepairStatusCount.adjust_many([(old[0], old[1], -1), (new[0], new[1], 1)])
+
+    def _profit_values(self):
+        return {field: getattr(self, field) for field in TRACKED_FIELDS}
+
+    def apply_technician_dues(self, original):
+        """
+        Person.due holds the technician share of every settled repair, so post
+        a reversal of the previously credited share and the current share to
+        the due ledger. Re-saving a settled repair therefore leaves dues unchanged.
+        """
+        old = (None, 0)
+        if original and original['repair_status'] in SETTLED_STATUSES and original['repaired_by_id']:
+            old = (original['repaired_by_id'], round(original['technician_profit'] or 0))
+        new = (None, 0)
+        if self.repair_status in SETTLED_STATUSES and self.repaired_by_id:
+            new = (self.repaired_by_id, round(self.technician_profit or 0))
+        if old != new:
+            post_dues([(old[0], -old[1], 'reversal'), (new[0], new[1], 'repair_share')], repair=self)
+
+    @transaction.atomic
     def delete(self, *args, **kwargs):
+        if self.enterprise_id:
+            RepairStatusCount.adjust(self.enterprise_id, self.repair_status, -1)
+        DailyProfit.apply(self.get_original(), None)
+        repair_items = list(self.repair_items.all())
+        ItemUsageDaily.record(repair_items, -1)
         if self.delivery_date and (datetime.now().date() - self.delivery_date).days <= 7:
-            print("deleting")
-            items = self.repair_items.all()
-            print(items)
-            for item in items:
-                item.item.quantity += item.quantity
-                item.item.save()
-            print("DONE")
-            tech = self.repaired_by
-            if tech and self.technician_profit:
-                tech.due -= self.technician_profit
-                tech.save()
+            returned = defaultdict(int)
+            for repair_item in repair_items:
+                returned[repair_item.item_id] += repair_item.quantity
+            adjust_stock(returned, 'repair_delete', repair=self)
+            if self.repaired_by_id and self.technician_profit:
+                post_due(self.repaired_by_id, -round(self.technician_profit), 'reversal', repair=self)
         super(Repair, self).delete(*args, **kwargs)
 
-    def generate_unique_repair_id(self,length=8):
-        characters = string.ascii_letters + string.digits
-        while True:
-            repair_id = ''.join(random.choice(characters) for _ in range(length))
-
-            if not Repair.objects.filter(repair_id=repair_id).exists():
-                return repair_id
+    def generate_unique_repair_id(self):
+        return generate_repair_ids(1)[0]
 
     def __str__(self):
         return f"{self.phone_model} by {self.customer_name}"
     
 
+class RepairIdSequence(models.Model):
+    """
+    Key of the repair id permutation and, on backends without sequences, the
+    counter it permutes (see repair.ids). There is one row, kept with the data
+    so the key can't drift away from the ids already issued.
+    """
+    key = models.CharField(max_length=128)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"repair ids up to {self.last_value}"
+
+
+class RepairStatusCount(models.Model):
+    """
+    Number of repairs per status for an enterprise, kept in step by Repair.save
+    and Repair.delete so dashboards read one row per status instead of counting.
+    Rebuild or verify with `manage.py repair_status_counts`.
+    """
+    enterprise = models.ForeignKey(Enterprise, on_delete=models.CASCADE, related_name='repair_status_counts')
+    repair_status = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['enterprise', 'repair_status'], name='unique_repair_status_count'),
+        ]
+
+    @classmethod
+    def adjust(cls, enterprise_id, repair_status, delta):
+        cls.adjust_many([(enterprise_id, repair_status, delta)])
+
+    @classmethod
+    def adjust_many(cls, changes):
+        """Apply `(enterprise_id, repair_status, delta)` changes in one statement, skipping repairs without an enterprise."""
+        increment(cls, ('enterprise', 'repair_status'), [
+            ({'enterprise_id': enterprise_id, 'repair_status': repair_status}, {'count': delta})
+            for enterprise_id, repair_status, delta in changes
+            if enterprise_id
+        ])
+
+    @classmethod
+    def for_enterprise(cls, enterprise_id):
+        return dict(cls.objects.filter(enterprise_id=enterprise_id).values_list('repair_status', 'count'))
+
+    def __str__(self):
+        return f"{self.enterprise_id} {self.repair_status}: {self.count}"
+
+
+class DailyProfit(models.Model):
+    """
+    Settled repairs and their profit per enterprise, delivery day, technician
+    and status, kept in step by Repair.save and Repair.delete so profit reports
+    add up a row per day instead of every repair in the range.
+    Rebuild or verify with `manage.py profit_rollup`.
+    """
+    enterprise = models.ForeignKey(Enterprise, on_delete=models.CASCADE, related_name='daily_profits')
+    day = models.DateField()
+    technician = models.ForeignKey(Person, null=True, blank=True, on_delete=models.SET_NULL, related_name='daily_profits')
+    repair_status = models.CharField(max_length=20)
+    repairs = models.IntegerField(default=0)
+    repair_profit = models.FloatField(default=0)
+    technician_profit = models.FloatField(default=0)
+    my_profit = models.FloatField(default=0)
+    admin_only_profit = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            # Unassigned rows (technician NULL) must be unique too
+            models.UniqueConstraint(
+                fields=['enterprise', 'day', 'technician', 'repair_status'],
+                name='unique_daily_profit',
+                nulls_distinct=False,
+            ),
+        ]
+
+    @staticmethod
+    def _key(values):
+        """Rollup row a repair counts towards, or None if it isn't a settled, dated repair."""
+        if not values or values['repair_status'] not in SETTLED_STATUSES:
+            return None
+        if not values['enterprise_id'] or not values['delivery_date']:
+            return None
+        return (values['enterprise_id'], values['delivery_date'], values['repaired_by_id'], values['repair_status'])
+
+    @classmethod
+    def apply(cls, old, new):
+        """Move a repair's contribution from its `old` values to its `new` ones (either may be None)."""
+        old_key, new_key = cls._key(old), cls._key(new)
+        if old_key == new_key and (old_key is None or all(old[field] == new[field] for field in PROFIT_FIELDS)):
+            return
+        changes = []
+        if old_key:
+            changes.append((old_key, -1, {field: -(old[field] or 0) for field in PROFIT_FIELDS}))
+        if new_key:
+            changes.append((new_key, 1, {field: new[field] or 0 for field in PROFIT_FIELDS}))
+        cls.adjust(changes)
+
+    @classmethod
+    def adjust(cls, changes):
+        """
+        Add each `(key, repairs, profits)` change to the rollup row for `key`,
+        creating rows as needed, in one statement. The rows are locked by the
+        upsert, so concurrent saves for the same day and technician queue
+        behind each other.
+        """
+        increment(cls, ('enterprise', 'day', 'technician', 'repair_status'), [
+            (
+                {'enterprise_id': enterprise_id, 'day': day, 'technician_id': technician_id, 'repair_status': repair_status},
+                {'repairs': repairs, **profits},
+            )
+            for (enterprise_id, day, technician_id, repair_status), repairs, profits in changes
+        ])
+
+    def __str__(self):
+        return f"{self.enterprise_id} {self.day} {self.repair_status}: {self.repair_profit}"
+
+
+@receiver(pre_delete, sender=Person)
+def merge_unassigned_profits(sender, instance, **kwargs):
+    """
+    A deleted technician's rollup rows become unassigned (SET_NULL). Rows that
+    already have an unassigned twin are added into it and removed first, so
+    the unique constraint still holds once the rest are nulled.
+    """
+    unassigned = DailyProfit.objects.filter(
+        technician__isnull=True,
+        enterprise_id=OuterRef('enterprise_id'), day=OuterRef('day'), repair_status=OuterRef('repair_status'),
+    )
+    merged = []
+    for row in DailyProfit.objects.filter(technician=instance).filter(Exists(unassigned)):
+        DailyProfit.objects.filter(
+            technician__isnull=True, enterprise_id=row.enterprise_id, day=row.day, repair_status=row.repair_status,
+        ).update(repairs=F('repairs') + row.repairs, **{field: F(field) + getattr(row, field) for field in PROFIT_FIELDS})
+        merged.append(row.pk)
+    if merged:
+        DailyProfit.objects.filter(pk__in=merged).delete()
+
+
+class ItemUsageDaily(models.Model):
+    """
+    Parts used per item per day, kept in step with the RepairItem rows so usage
+    reports add up a row per day instead of scanning every repair.
+    Rebuild or verify with `manage.py item_usage_rollup`.
+    """
+    item = models.ForeignKey('inventory.Item', on_delete=models.CASCADE, related_name='daily_usage')
+    enterprise = models.ForeignKey(Enterprise, on_delete=models.CASCADE, related_name='item_usage')
+    day = models.DateField()
+    quantity = models.IntegerField(default=0)
+    usages = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'day'], name='unique_item_usage_day'),
+        ]
+        indexes = [
+            models.Index(fields=['enterprise', 'day'], name='item_usage_ent_day_idx'),
+        ]
+
+    @classmethod
+    def record(cls, repair_items, sign=1):
+        """Add (sign=1) or remove (sign=-1) RepairItem rows from the rollup."""
+        totals = defaultdict(lambda: [0, 0])
+        for repair_item in repair_items:
+            enterprise_id = repair_item.repair.enterprise_id
+            if enterprise_id is None:
+                continue
+            key = (repair_item.item_id, enterprise_id, repair_item.used_on)
+            totals[key][0] += sign * repair_item.quantity
+            totals[key][1] += sign
+        increment(cls, ('item', 'day'), [
+            ({'item_id': item_id, 'day': day, 'enterprise_id': enterprise_id}, {'quantity': quantity, 'usages': usages})
+            for (item_id, enterprise_id, day), (quantity, usages) in totals.items()
+        ])
+
+    def __str__(self):
+        return f"{self.item_id} on {self.day}: {self.quantity}"
+
+
 class RepairItem(models.Model):
     item = models.ForeignKey('inventory.Item', on_delete=models.CASCADE)
     repair = models.ForeignKey(Repair, on_delete=models.CASCADE,related_name='repair_items')
     quantity = models.IntegerField()
+    used_on = models.DateField(default=date.today)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['item', '-used_on', '-id'], name='repairitem_item_used_idx'),
+        ]
+
+    # Bulk paths (inventory.stock.sync_repair_items, Repair.delete) call
+    # ItemUsageDaily.record themselves
+    # No savepoint when nested: a failed save aborts the caller's transaction anyway
+    @transaction.atomic(savepoint=False)
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            ItemUsageDaily.record([self])
+
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        ItemUsageDaily.record([self], -1)
+        return super().delete(*args, **kwargs)
 
     def __str__(self):
         return f"{self.item} for {self.repair}"
@@ -1,9 +1,7 @@
 # def check_status(user):
 #     group = user.groups.first()
 #     return group.name
-from enterprise.models import Person
+from userauth.authentication import get_tenant
 
 def check_status(user):
-    person=Person.objects.filter(user=user).first()
-    role = person.role
-    return role
\ No newline at end of file
+    return get_tenant(user).role
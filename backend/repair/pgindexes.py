@@ -0,0 +1,28 @@
+"""
+Postgres-only indexes (gin_trgm_ops, varchar_pattern_ops) for migrations.
+
+Migrations import this module, so it must keep creating and dropping exactly
+what it does today; add a new helper rather than change this one.
+"""
+from django.db import migrations
+
+
+def postgres_indexes(indexes):
+    """
+    A RunPython operation that creates `indexes`, (name, table, definition)
+    tuples, on Postgres and drops them on reverse. Other backends have no
+    such operator classes and fall back to unindexed lookups.
+    """
+    def create(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for name, table, definition in indexes:
+            schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} {definition}')
+
+    def drop(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for name, _, _ in indexes:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+    return migrations.RunPython(create, drop)
@@ -0,0 +1,97 @@
+"""
+Counter tables kept in step with their source rows (RepairStatusCount,
+DailyProfit, ItemUsageDaily) all change the same way: add some deltas to the
+row for a key, creating that row at zero the first time the key is seen.
+
+`increment` does this for any number of rows in one INSERT ... ON CONFLICT DO
+UPDATE statement wherever the backend enforces the model's unique constraint
+on the key. The upsert locks each row it adds to, so concurrent writers queue
+behind each other and never lose an increment. Elsewhere (for example a
+nulls_distinct=False constraint before Postgres 15) each row is updated,
+created under select_for_update() if missing, and updated again.
+"""
+from django.db import connection, transaction
+from django.db.models import F, UniqueConstraint
+
+
+def _enforces_unique_key(model, key_fields):
+    if not connection.features.supports_update_conflicts_with_target:
+        return False
+    for constraint in model._meta.constraints:
+        if isinstance(constraint, UniqueConstraint) and set(constraint.fields) == set(key_fields):
+            if constraint.condition is not None:
+                return False
+            if constraint.nulls_distinct is not None:
+                return connection.features.supports_nulls_distinct_unique_constraints
+            return True
+    return False
+
+
+def _merge(model, key_fields, rows):
+    """Sum the deltas of rows sharing a key; one statement can't touch a row twice."""
+    key_attnames = [model._meta.get_field(name).attname for name in key_fields]
+    merged = {}
+    for values, deltas in rows:
+        key = tuple(values[attname] for attname in key_attnames)
+        if key not in merged:
+            merged[key] = (values, dict(deltas))
+            continue
+        totals = merged[key][1]
+        for field, amount in deltas.items():
+            totals[field] = totals.get(field, 0) + amount
+    return key_attnames, list(merged.values())
+
+
+def _upsert(model, key_fields, rows):
+    opts = model._meta
+    quote = connection.ops.quote_name
+    value_fields = [opts.get_field(name) for name in rows[0][0]]
+    delta_fields = [opts.get_field(name) for name in rows[0][1]]
+    fields = value_fields + delta_fields
+
+    params = []
+    for values, deltas in rows:
+        row = {**values, **deltas}
+        params.extend(field.get_db_prep_save(row[field.attname], connection) for field in fields)
+
+    table = quote(opts.db_table)
+    placeholders = '(%s)' % ', '.join(['%s'] * len(fields))
+    updates = ', '.join(
+        f'{quote(field.column)} = {table}.{quote(field.column)} + EXCLUDED.{quote(field.column)}'
+        for field in delta_fields
+    )
+    sql = (
+        f'INSERT INTO {table} ({", ".join(quote(field.column) for field in fields)}) '
+        f'VALUES {", ".join([placeholders] * len(rows))} '
+        f'ON CONFLICT ({", ".join(quote(opts.get_field(name).column) for name in key_fields)}) '
+        f'DO UPDATE SET {updates}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+@transaction.atomic(savepoint=False)
+def increment(model, key_fields, rows):
+    """
+    Add to counter rows of `model`. `rows` is a sequence of `(values, deltas)`
+    dicts keyed by attname: `values` holds the `key_fields` (plus any other
+    columns a new row needs) and `deltas` the amounts to add to counters.
+    Every row must name the same columns.
+    """
+    rows = [(values, deltas) for values, deltas in rows if any(deltas.values())]
+    if not rows:
+        return
+    key_attnames, rows = _merge(model, key_fields, rows)
+
+    if _enforces_unique_key(model, key_fields):
+        _upsert(model, key_fields, rows)
+        return
+
+    for values, deltas in rows:
+        lookup = {attname: values[attname] for attname in key_attnames}
+        counter = model.objects.filter(**lookup)
+        updates = {field: F(field) + amount for field, amount in deltas.items()}
+        if not counter.update(**updates):
+            defaults = {name: value for name, value in values.items() if name not in lookup}
+            model.objects.select_for_update().get_or_create(**lookup, defaults=defaults)
+            counter.update(**updates)
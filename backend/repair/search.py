@@ -0,0 +1,34 @@
+from django.db.models import Q
+
+from .textsearch import clean_query, no_results, ranked_search
+
+
+def search_repairs(repairs, query):
+    """
+    Ranked search over customer name, phone number, phone model and repair id.
+
+    An exact repair id ranks first and phone numbers starting with a digit
+    query next (the btree and varchar_pattern_ops indexes from migration 0004
+    serve those lookups). Fuzzy matches on the other fields follow in the same
+    result, so a phone prefix shared by several customers never hides anyone.
+    Returns `repairs` annotated with `rank` and ordered best match first.
+    """
+    query = clean_query(query)
+    if query is None:
+        return no_results(repairs)
+
+    ranks = [(Q(repair_id=query), 1.0)]
+    if query.isdigit() and len(query) >= 3:
+        ranks.append((Q(customer_phone_number__startswith=query), 0.95))
+    ranks += [
+        (Q(customer_name__istartswith=query), 0.9),
+        (Q(repair_id__istartswith=query), 0.85),
+        (Q(phone_model__istartswith=query), 0.8),
+        (Q(customer_name__icontains=query) | Q(phone_model__icontains=query), 0.5),
+    ]
+    return ranked_search(
+        repairs, query,
+        contains=('customer_name', 'phone_model', 'customer_phone_number', 'repair_id'),
+        trigram=('customer_name', 'phone_model'),
+        ranks=ranks,
+    ).order_by('-rank', '-updated_at', '-id')
@@ -1,12 +1,42 @@
 from rest_framework import serializers
 from .models import Repair,Outside,RepairItem
 from inventory.models import Item
+from inventory.stock import sync_repair_items
 from django.db import transaction
-
-
-
-class RepairItemSerializer(serializers.ModelSerializer):
+from django.db.models import Prefetch, QuerySet, prefetch_related_objects
+
+
+class EagerLoadingMixin:
+    """
+    Serializers declare the relations they read in `select_related_fields` and
+    `prefetch_related_fields`. Anything serialized with many=True, either a
+    queryset or an already paginated list, gets that plan applied first, so
+    a page costs the same number of queries regardless of its size.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    @classmethod
+    def setup_eager_loading(cls, instances):
+        if isinstance(instances, QuerySet):
+            return instances.select_related(*cls.select_related_fields).prefetch_related(*cls.prefetch_related_fields)
+        instances = list(instances)
+        prefetch_related_objects(instances, *cls.select_related_fields, *cls.prefetch_related_fields)
+        return instances
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        if args and args[0] is not None:
+            args = (cls.setup_eager_loading(args[0]),) + args[1:]
+        elif kwargs.get('instance') is not None:
+            kwargs['instance'] = cls.setup_eager_loading(kwargs['instance'])
+        return super().many_init(*args, **kwargs)
+
+
+
+class RepairItemSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     item_name = serializers.SerializerMethodField(read_only=True)
+    select_related_fields = ('item__category',)
 
     class Meta:
         model = RepairItem
@@ -15,9 +45,13 @@ class RepairItemSerializer(serializers.ModelSerializer):
     def get_item_name(self, obj):
         return f"{obj.item.name} {obj.item.category.name}" if obj.item and obj.item.category else None
 
-class AdminRepairSerializer(serializers.ModelSerializer):
+class AdminRepairSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     repaired_by_name = serializers.SerializerMethodField(read_only=True)
     repair_items = RepairItemSerializer(many=True,required=False)
+    select_related_fields = ('repaired_by__user', 'outside')
+    prefetch_related_fields = (
+        Prefetch('repair_items', queryset=RepairItem.objects.select_related(*RepairItemSerializer.select_related_fields)),
+    )
     class Meta:
         model = Repair
         fields = [
@@ -77,43 +111,20 @@ class AdminRepairSerializer(serializers.ModelSerializer):
         repair_items = validated_data.pop('repair_items', None)
 
         if repair_items:
-            # Update the item quantities and delete existing repair items
-            for repair_item in instance.repair_items.all():
-                if repair_item:
-                    item = repair_item.item
-                    item.quantity = (repair_item.quantity + item.quantity) if item.quantity is not None else item.quantity
-                    item.save()
-            # Delete the existing repair items related to this repair
-            instance.repair_items.all().delete()
-
-            # Process new repair items
-            for item_data in repair_items:
-                repair = RepairItem.objects.create(repair=instance, item=item_data['item'], quantity=item_data['quantity'])
-                item = repair.item
-                item.refresh_from_db()
-                # Update item quantity
-                item.quantity = (item.quantity - repair.quantity) if (item.quantity and item.quantity > repair.quantity) else 0
-                item.save()
-        else:
-            validated_data.pop('repair_items', None)
-
-        if instance.repair_status == "Completed" and validated_data['repair_status'] != "Completed":
-            technician = instance.repaired_by
-            technician.due = technician.due - instance.technician_profit
-            instance.technician_profit = 0
-            instance.my_profit = 0
-            instance.repair_profit = 0
-            technician.save()
-
+            # Swap in the new parts and move stock by the net difference per item
+            sync_repair_items(instance, repair_items)
 
+        # Reopening a settled repair (and reversing the technician's share) is handled by Repair.save
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
 
         instance.save()
         return instance
 
-class TechnicianRepairSerializer(serializers.ModelSerializer):
+class TechnicianRepairSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     repaired_by_name = serializers.SerializerMethodField(read_only=True)
+    select_related_fields = ('repaired_by__user',)
+    prefetch_related_fields = ('repair_items',)
     class Meta:
         model = Repair
         fields = [
@@ -166,8 +177,8 @@ class TechnicianRepairSerializer(serializers.ModelSerializer):
     def get_repaired_by_name(self, obj):
         return obj.repaired_by.user.name if obj.repaired_by and obj.repaired_by.user else None
 
-class StaffRepairSerializer(serializers.ModelSerializer):
+class StaffRepairSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Repair
-        exclude = ['repair_cost_price','cost_price_description','repair_profit','technician_profit','my_profit','outside_cost']
+        exclude = ['repair_cost_price','repair_profit','technician_profit','my_profit','outside_cost']
 
@@ -1,3 +1,601 @@
-from django.test import TestCase
+import importlib
+import json
+import threading
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from enterprise.models import DueMovement, Enterprise, Person
+from inventory.models import Category, Item
+from transactions.models import Credit
+from userauth.models import User
+
+from . import ids
+from .analytics import MAX_PERIODS, period_count, periods, technician_metrics
+from .models import DailyProfit, Repair, RepairIdSequence, RepairItem
+from .views import SearchView
+
+
+class RepairTestData:
+    """An enterprise with an admin and a technician on a 40% share."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.enterprise = Enterprise.objects.create(name='Shop')
+        cls.admin_user = User.objects.create_user('admin@example.com', 'Admin', 'pw')
+        cls.admin = Person.objects.create(user=cls.admin_user, enterprise=cls.enterprise, role='Admin', due=0, technician_profit=0)
+        cls.tech_user = User.objects.create_user('tech@example.com', 'Tech', 'pw')
+        cls.tech = Person.objects.create(user=cls.tech_user, enterprise=cls.enterprise, role='Technician', due=0, technician_profit=40)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin_user)
+
+    def make_repair(self, **fields):
+        values = {
+            'customer_name': 'Ram Bahadur',
+            'customer_phone_number': '9800000000',
+            'phone_model': 'iPhone 12',
+            'repair_problem': 'Screen',
+            'total_amount': 100,
+            'advance_paid': 10,
+            'due': 90,
+            'received_by': 'Counter',
+            'enterprise': self.enterprise,
+            **fields,
+        }
+        repair = Repair(**values)
+        repair.save()
+        return repair
+
+
+class SearchViewTests(RepairTestData, TestCase):
+    def test_results_are_a_plain_list_by_default(self):
+        repair = self.make_repair()
+        response = self.client.get('/repair/search/', {'q': 'Ram'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.data, list)
+        self.assertEqual([row['repair_id'] for row in response.data], [repair.repair_id])
+
+    def test_page_parameter_opts_into_pagination(self):
+        for _ in range(12):
+            self.make_repair()
+        response = self.client.get('/repair/search/', {'q': 'iphone', 'page': 2})
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_partial_repair_id_matches(self):
+        repair = self.make_repair(customer_name='Sita')
+        self.make_repair(customer_name='Gita')
+        response = self.client.get('/repair/search/', {'q': repair.repair_id[1:5]})
+        self.assertEqual([row['repair_id'] for row in response.data], [repair.repair_id])
+
+    def test_phone_prefix_returns_every_customer_sharing_it(self):
+        first = self.make_repair(customer_name='Sita', customer_phone_number='9841000001')
+        second = self.make_repair(customer_name='Gita', customer_phone_number='9841000002')
+        self.make_repair(customer_name='Hari', customer_phone_number='9812000003')
+        response = self.client.get('/repair/search/', {'q': '9841'})
+        self.assertEqual([row['repair_id'] for row in response.data], [second.repair_id, first.repair_id])
+
+    def test_exact_repair_id_ranks_first_among_other_matches(self):
+        named = self.make_repair()
+        exact = self.make_repair(customer_name='Sita')
+        # A customer whose name contains the exact id still matches, just lower
+        Repair.objects.filter(pk=named.pk).update(customer_name=f'Ram {exact.repair_id}')
+        response = self.client.get('/repair/search/', {'q': exact.repair_id})
+        self.assertEqual([row['repair_id'] for row in response.data], [exact.repair_id, named.repair_id])
+
+    def test_no_match(self):
+        self.make_repair()
+        response = self.client.get('/repair/search/', {'q': 'Samsung'})
+        self.assertEqual(response.data, "NONE")
+
+
+class StatusTransitionQueryTests(RepairTestData, TestCase):
+    """
+    Repair.save works from its loaded snapshot and writes each rollup (status
+    counters, daily profit, dues) in one statement, so each transition costs a
+    fixed number of queries. Every test first runs the same transition on
+    another repair so the status counter and profit rollup rows exist, and the
+    count is the steady-state one.
+    """
+
+    def settle(self, repair, repair_status, **fields):
+        repair.repair_status = repair_status
+        for name, value in fields.items():
+            setattr(repair, name, value)
+        repair.save()
+
+    def credited_repair(self):
+        repair = self.make_repair(repaired_by=self.tech, repair_status='Repaired')
+        credit = Credit.objects.create(name='Hari', enterprise=self.enterprise, due=0)
+        credit.repair.add(repair)
+        return repair, credit
+
+    def test_completed(self):
+        self.settle(self.make_repair(repaired_by=self.tech), 'Completed', amount_paid=90, repair_cost_price=20)
+        repair = self.make_repair(repaired_by=self.tech, repair_status='Repaired')
+        with self.assertNumQueries(5):
+            self.settle(repair, 'Completed', amount_paid=90, repair_cost_price=20)
+        self.tech.refresh_from_db()
+        self.assertEqual(self.tech.due, 64)
+
+    def test_credited(self):
+        self.settle(self.credited_repair()[0], 'Credited', amount_paid=40, credit_due=50, repair_cost_price=20)
+        repair, credit = self.credited_repair()
+        with self.assertNumQueries(6):
+            self.settle(repair, 'Credited', amount_paid=40, credit_due=50, repair_cost_price=20)
+        credit.refresh_from_db()
+        self.assertEqual(credit.due, 50)
+
+    def test_credited_payment(self):
+        repair, credit = self.credited_repair()
+        self.settle(repair, 'Credited', amount_paid=40, credit_due=50, repair_cost_price=20)
+        with self.assertNumQueries(4):
+            self.settle(repair, 'Credited', credit_paid=20)
+        credit.refresh_from_db()
+        self.assertEqual((credit.due, repair.credit_due), (30, 30))
+
+    def test_returned(self):
+        self.settle(self.make_repair(repaired_by=self.tech, repair_status='Unrepairable'), 'Returned')
+        repair = self.make_repair(repaired_by=self.tech, repair_status='Unrepairable')
+        with self.assertNumQueries(2):
+            self.settle(repair, 'Returned')
+
+    def test_reopen(self):
+        repair = self.make_repair(repaired_by=self.tech, repair_status='Repaired')
+        self.settle(repair, 'Completed', amount_paid=90, repair_cost_price=20)
+        with self.assertNumQueries(5):
+            self.settle(repair, 'Repaired')
+        self.tech.refresh_from_db()
+        self.assertEqual(self.tech.due, 0)
+
+
+class RepairExportTests(RepairTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.staff_user = User.objects.create_user('staff@example.com', 'Staff', 'pw')
+        Person.objects.create(user=cls.staff_user, enterprise=cls.enterprise, role='Staff', due=0, technician_profit=0)
+        other = Enterprise.objects.create(name='Other shop')
+        Repair.objects.create(
+            customer_name='Elsewhere', customer_phone_number='9811111111', phone_model='Galaxy', repair_problem='Battery',
+            total_amount=50, advance_paid=0, due=50, received_by='Counter', enterprise=other,
+        )
+
+    def export(self, fmt, user=None):
+        if user:
+            self.client.force_authenticate(user)
+        response = self.client.get('/repair/search/', {'format': fmt})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_admin_csv_has_profit_columns_for_own_repairs_only(self):
+        repair = self.make_repair(repaired_by=self.tech, repair_status='Repaired', repair_cost_price=20)
+        repair.repair_status, repair.amount_paid = 'Completed', 90
+        repair.save()
+        header, *rows = self.export('csv').splitlines()
+        self.assertEqual(header.split(','), [*SearchView.export_columns, *SearchView.profit_export_columns])
+        self.assertEqual(len(rows), 1)
+        row = dict(zip(header.split(','), rows[0].split(',')))
+        self.assertEqual(
+            (row['repair_id'], row['customer_name'], row['repaired_by'], row['repair_status'], row['repair_profit'], row['technician_profit']),
+            (repair.repair_id, 'Ram Bahadur', 'Tech', 'Completed', '80.0', '32.0'),
+        )
+
+    def test_staff_ndjson_hides_profit(self):
+        repair = self.make_repair()
+        lines = self.export('ndjson', user=self.staff_user).splitlines()
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual(list(row), list(SearchView.export_columns))
+        self.assertEqual((row['repair_id'], row['total_amount'], row['repaired_by']), (repair.repair_id, 100, None))
+
+
+class RepairIdTests(RepairTestData, TestCase):
+    def tearDown(self):
+        ids._key.cache_clear()
+
+    def test_key_comes_from_the_database_not_settings(self):
+        code = ids.permute(12345)
+        with override_settings(SECRET_KEY='rotated'):
+            ids._key.cache_clear()
+            self.assertEqual(ids.permute(12345), code)
+        RepairIdSequence.objects.filter(pk=1).update(key='another key')
+        ids._key.cache_clear()
+        self.assertNotEqual(ids.permute(12345), code)
+
+    def test_counter_continues_after_a_restart(self):
+        first = ids.next_counter_values(3)
+        ids._key.cache_clear()
+        second = ids.next_counter_values(3)
+        self.assertLess(max(first), min(second))
+        self.assertEqual(len(set(ids.generate_repair_ids(50))), 50)
+
+    def test_migration_keeps_the_key_of_issued_codes(self):
+        seed_sequence = importlib.import_module('repair.migrations.0013_repair_id_sequence').seed_sequence
+        self.make_repair()
+        RepairIdSequence.objects.all().delete()
+        with override_settings(SECRET_KEY='deployed secret'):
+            seed_sequence(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(RepairIdSequence.objects.get().key, 'repair-ids:deployed secret')
+
+        RepairIdSequence.objects.all().delete()
+        Repair.objects.all().delete()
+        seed_sequence(apps, SimpleNamespace(connection=connection))
+        self.assertNotEqual(RepairIdSequence.objects.get().key, 'repair-ids:deployed secret')
+
+
+class RepairBulkViewTests(RepairTestData, TestCase):
+    def intake_row(self, **fields):
+        return {
+            'customer_name': 'Ram Bahadur',
+            'customer_phone_number': '9800000000',
+            'phone_model': 'iPhone 12',
+            'repair_problem': 'Screen',
+            'total_amount': 100,
+            'advance_paid': 10,
+            'due': 90,
+            'received_by': 'Counter',
+            **fields,
+        }
+
+    def test_repair_id_in_a_row_is_replaced(self):
+        response = self.client.post('/repair/bulk/', [self.intake_row(repair_id='CLIENT1'), self.intake_row()], format='json')
+        self.assertEqual(response.status_code, 201)
+        repair_ids = [row['repair_id'] for row in response.data]
+        self.assertNotIn('CLIENT1', repair_ids)
+        self.assertEqual(Repair.objects.filter(repair_id__in=repair_ids).count(), 2)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        # Timing against single POSTs: manage.py benchmark_bulk_intake
+        self.client.post('/repair/bulk/', [self.intake_row()], format='json')  # loads the id key once
+        query_counts = []
+        for rows in (2, 20):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/repair/bulk/', [self.intake_row() for _ in range(rows)], format='json')
+            self.assertEqual(response.status_code, 201)
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+        self.assertEqual(Repair.objects.filter(enterprise=self.enterprise).count(), 23)
+
+
+class RepairListQueryTests(RepairTestData, TestCase):
+    """The listing's query count depends on the page, not on how many rows it holds."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        category = Category.objects.create(name='Screens', enterprise=cls.enterprise)
+        cls.item = Item.objects.create(name='Display', quantity=100, cost=50, enterprise=cls.enterprise, category=category)
+
+    def make_repairs(self, count):
+        repairs = [self.make_repair(repaired_by=self.tech) for _ in range(count)]
+        RepairItem.objects.bulk_create(RepairItem(item=self.item, repair=repair, quantity=1) for repair in repairs)
+
+    def test_keyset_pages_of_different_sizes(self):
+        self.make_repairs(30)
+        for page_size in (5, 30):
+            with self.subTest(page_size=page_size), self.assertNumQueries(4):
+                response = self.client.get('/repair/', {'pagination': 'cursor', 'page_size': page_size})
+                self.assertEqual(len(response.data['results']), page_size)
+
+    def test_page_numbers_with_few_and_full_pages(self):
+        self.make_repairs(3)
+        with self.assertNumQueries(5):
+            self.assertEqual(len(self.client.get('/repair/').data['results']), 3)
+        self.make_repairs(12)
+        with self.assertNumQueries(5):
+            self.assertEqual(len(self.client.get('/repair/').data['results']), 10)
+
+
+class KeysetPaginationTests(RepairTestData, TestCase):
+    def walk(self, params):
+        """Follow next links from the first page, returning the repair ids in order and the last page."""
+        response = self.client.get('/repair/', {'pagination': 'cursor', **params})
+        seen = [row['repair_id'] for row in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += [row['repair_id'] for row in response.data['results']]
+        return seen, response
+
+    def test_ties_on_updated_at_are_broken_by_id(self):
+        repairs = [self.make_repair() for _ in range(5)]
+        Repair.objects.update(updated_at=datetime(2024, 1, 1, 12, tzinfo=dt_timezone.utc))
+        seen, last_page = self.walk({'page_size': 2})
+        self.assertEqual(seen, [repair.repair_id for repair in reversed(repairs)])
+
+        previous = self.client.get(last_page.data['previous'])
+        self.assertEqual([row['repair_id'] for row in previous.data['results']], seen[2:4])
+
+    def test_newest_first_within_a_status(self):
+        older = self.make_repair(repair_status='Repaired')
+        self.make_repair()
+        newer = self.make_repair(repair_status='Repaired')
+        Repair.objects.filter(pk=older.pk).update(updated_at=datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
+        seen, _ = self.walk({'status': 'Repaired', 'page_size': 1})
+        self.assertEqual(seen, [newer.repair_id, older.repair_id])
+
+    def test_legacy_null_updated_at_is_backfilled_from_intake(self):
+        migration = importlib.import_module('repair.migrations.0003_repair_keyset_indexes')
+        legacy = self.make_repair(received_date=date(2023, 5, 1))
+        current = self.make_repair()
+        Repair.objects.filter(pk=legacy.pk).update(updated_at=None)
+
+        migration.backfill_updated_at(apps, None)
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.updated_at, datetime.combine(date(2023, 5, 1), dt_time.min, tzinfo=dt_timezone.utc))
+        seen, _ = self.walk({'page_size': 1})
+        self.assertEqual(seen, [current.repair_id, legacy.repair_id])
+
+    def test_invalid_cursor_is_a_404(self):
+        response = self.client.get('/repair/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class EnterpriseBackfillTests(RepairTestData, TestCase):
+    """Migration 0008 copies each repair's enterprise from its oldest Enterprise.repairs link."""
+
+    def backfill(self):
+        importlib.import_module('repair.migrations.0008_repair_enterprise').copy_enterprise_from_m2m(apps, None)
+
+    def test_legacy_repairs_get_the_enterprise_they_were_first_linked_to(self):
+        other = Enterprise.objects.create(name='Other shop')
+        linked, doubly_linked, unlinked = self.make_repair(), self.make_repair(), self.make_repair()
+        EnterpriseRepair = Enterprise.repairs.through
+        EnterpriseRepair.objects.filter(repair_id__in=[doubly_linked.pk, unlinked.pk]).delete()
+        EnterpriseRepair.objects.create(enterprise=other, repair=doubly_linked)
+        EnterpriseRepair.objects.create(enterprise=self.enterprise, repair=doubly_linked)
+        Repair.objects.update(enterprise=None)
+
+        self.backfill()
+
+        enterprises = dict(Repair.objects.values_list('pk', 'enterprise_id'))
+        self.assertEqual(enterprises, {linked.pk: self.enterprise.pk, doubly_linked.pk: other.pk, unlinked.pk: None})
+        self.assertEqual([row['id'] for row in self.client.get('/repair/').data['results']], [linked.pk])
+
+    def test_existing_enterprise_is_kept(self):
+        repair = self.make_repair()
+        other = Enterprise.objects.create(name='Other shop')
+        Enterprise.repairs.through.objects.filter(repair=repair).update(enterprise=other)
+        self.backfill()
+        repair.refresh_from_db()
+        self.assertEqual(repair.enterprise_id, self.enterprise.pk)
+
+
+class DailyProfitTests(RepairTestData, TestCase):
+    def complete(self, **fields):
+        return self.make_repair(repair_status='Completed', amount_paid=90, repair_cost_price=20, **fields)
+
+    def test_unassigned_repairs_share_one_row(self):
+        self.complete()
+        self.complete()
+        rollup = DailyProfit.objects.get(enterprise=self.enterprise, technician__isnull=True)
+        self.assertEqual(rollup.repairs, 2)
+
+    @skipUnlessDBFeature('supports_nulls_distinct_unique_constraints')
+    def test_duplicate_unassigned_row_is_rejected(self):
+        rollup = DailyProfit.objects.create(enterprise=self.enterprise, day=date.today(), repair_status='Completed')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailyProfit.objects.create(enterprise=self.enterprise, day=rollup.day, repair_status='Completed')
+
+    def test_deleting_a_technician_merges_their_rows_into_unassigned(self):
+        self.complete()
+        self.complete(repaired_by=self.tech)
+        self.tech_user.delete()
+        rollup = DailyProfit.objects.get(enterprise=self.enterprise)
+        self.assertIsNone(rollup.technician_id)
+        self.assertEqual(rollup.repairs, 2)
+        self.assertEqual(rollup.repair_profit, 140)
+
+    def test_reopening_clears_every_profit_column(self):
+        repair = self.make_repair(repaired_by=self.admin, repair_status='Repaired')
+        repair.repair_status, repair.amount_paid, repair.repair_cost_price = 'Completed', 90, 20
+        repair.save()
+        self.assertEqual(repair.admin_only_profit, 80)
+
+        repair.repair_status = 'Repaired'
+        repair.save()
+        repair.refresh_from_db()
+        self.assertEqual(
+            [repair.repair_profit, repair.technician_profit, repair.my_profit, repair.admin_only_profit], [0, 0, 0, 0],
+        )
+        rollup = DailyProfit.objects.get(enterprise=self.enterprise)
+        self.assertEqual((rollup.repairs, rollup.repair_profit, rollup.admin_only_profit), (0, 0, 0))
+        call_command('profit_rollup', '--verify', stdout=StringIO())
+
+
+class AnalyticsTests(RepairTestData, TestCase):
+    def series(self, **params):
+        response = self.client.get('/repair/analytics/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['series']
+
+    def test_empty_periods_are_filled_with_zeros(self):
+        self.make_repair(received_date=date(2026, 1, 5))
+        self.make_repair(
+            received_date=date(2026, 1, 5), delivery_date=date(2026, 1, 8),
+            repair_status='Completed', amount_paid=90, repair_cost_price=20,
+        )
+        series = self.series(interval='day', start_date='2026-01-05', end_date='2026-01-09')
+        self.assertEqual([row['period'] for row in series], list(periods(date(2026, 1, 5), date(2026, 1, 9), 'day')))
+        self.assertEqual([row['received'] for row in series], [2, 0, 0, 0, 0])
+        self.assertEqual([row['delivered'] for row in series], [0, 0, 0, 1, 0])
+        self.assertEqual([row['profit'] for row in series], [0, 0, 0, 70, 0])
+        self.assertEqual([row['avg_turnaround_days'] for row in series], [None, None, None, 3, None])
+
+        weeks = self.series(interval='week', start_date='2026-01-01', end_date='2026-01-20')
+        self.assertEqual(
+            [(row['period'], row['received']) for row in weeks],
+            [(date(2025, 12, 29), 0), (date(2026, 1, 5), 2), (date(2026, 1, 12), 0), (date(2026, 1, 19), 0)],
+        )
+
+    def test_period_count_matches_the_periods_walked(self):
+        for interval in ('day', 'week', 'month'):
+            for start, end in [
+                (date(2026, 1, 5), date(2026, 1, 5)),
+                (date(2025, 12, 31), date(2026, 1, 4)),
+                (date(2024, 2, 29), date(2026, 3, 1)),
+            ]:
+                with self.subTest(interval=interval, start=start, end=end):
+                    self.assertEqual(period_count(start, end, interval), len(list(periods(start, end, interval))))
+
+    def test_range_longer_than_max_periods_is_rejected(self):
+        start = date(2025, 1, 1)
+        self.assertEqual(len(self.series(interval='day', start_date=start, end_date=start + timedelta(days=MAX_PERIODS - 1))), MAX_PERIODS)
+        response = self.client.get(
+            '/repair/analytics/', {'interval': 'day', 'start_date': start, 'end_date': start + timedelta(days=MAX_PERIODS)},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(MAX_PERIODS), response.data['error'])
+        # Fails before any period is walked, however far apart the dates are
+        with self.assertNumQueries(0):
+            response = self.client.get('/repair/analytics/', {'interval': 'day', 'start_date': '0001-01-01', 'end_date': '9999-12-31'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TechnicianMetricsTests(RepairTestData, TestCase):
+    start, end = date(2026, 1, 1), date(2026, 1, 31)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        for days in (1, 2, 3, 4, 10):
+            self.make_repair(
+                repaired_by=self.tech, repair_status='Completed', amount_paid=90, repair_cost_price=20,
+                received_date=date(2026, 1, 5), delivery_date=date(2026, 1, 5) + timedelta(days=days),
+            )
+        self.make_repair(repaired_by=self.tech, repair_status='Unrepairable', received_date=date(2026, 1, 6))
+        self.make_repair(repaired_by=self.tech, received_date=date(2026, 1, 7))
+
+    def assertMetrics(self, rows):
+        self.assertEqual(len(rows), 1)
+        row = rows[0]
+        self.assertEqual((row['technician_id'], row['repairs'], row['settled'], row['unrepairable']), (self.tech.pk, 7, 5, 1))
+        self.assertEqual((row['completion_rate'], row['unrepairable_rate']), (0.7143, 0.1429))
+        # Interpolated like percentile_cont: the 90th percentile sits 0.6 of the way from 4 to 10
+        self.assertEqual(row['median_turnaround_days'], 3)
+        self.assertAlmostEqual(row['p90_turnaround_days'], 7.6)
+
+    @skipUnless(connection.vendor == 'postgresql', "percentile_cont is only used on Postgres")
+    def test_percentiles_from_postgres(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = technician_metrics(self.enterprise.pk, self.start, self.end)
+        self.assertIn('percentile_cont', queries[0]['sql'].lower())
+        self.assertMetrics(rows)
+
+    def test_percentiles_computed_in_python_elsewhere(self):
+        with mock.patch('repair.analytics.connection', SimpleNamespace(vendor='sqlite')):
+            self.assertMetrics(technician_metrics(self.enterprise.pk, self.start, self.end))
+
+    def get(self):
+        response = self.client.get('/repair/analytics/technicians/', {'start_date': self.start, 'end_date': self.end})
+        self.assertEqual(response.status_code, 200)
+        return response.data['technicians']
+
+    def assertCached(self, cached):
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.get()
+        computed = any('repaired_by_id' in query['sql'] for query in queries)
+        self.assertEqual(computed, not cached)
+        return rows
+
+    def test_cache_is_hit_until_a_repair_changes(self):
+        self.assertMetrics(self.assertCached(False))
+        self.assertCached(True)
+        self.make_repair(repaired_by=self.tech, received_date=date(2026, 1, 8))
+        self.assertEqual(self.assertCached(False)[0]['repairs'], 8)
+
+    def test_renaming_or_re_rating_a_technician_invalidates_the_cache(self):
+        self.assertCached(False)
+        self.assertCached(True)
+        self.tech_user.name = 'Renamed'
+        self.tech_user.save()
+        self.assertEqual(self.assertCached(False)[0]['name'], 'Renamed')
+        self.assertCached(True)
+        self.tech.technician_profit = 50
+        self.tech.save()
+        self.assertCached(False)
+
+    def test_logging_in_keeps_the_cache(self):
+        self.assertCached(False)
+        self.tech_user.save(update_fields=['last_login'])
+        self.assertCached(True)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentCompletionTests(RepairTestData, TransactionTestCase):
+    """Parallel PATCHes and payouts must leave Person.due equal to the technician's due ledger."""
+
+    workers = 8
+
+    def setUp(self):
+        self.setUpTestData()
+        super().setUp()
+
+    def run_in_parallel(self, requests):
+        """Send each `request(client)` from its own thread and connection, all at once; return the status codes."""
+        barrier = threading.Barrier(len(requests))
+        statuses = []
+
+        def send(request):
+            try:
+                client = APIClient()
+                client.force_authenticate(self.admin_user)
+                barrier.wait()
+                statuses.append(request(client).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=send, args=(request,)) for request in requests]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def assertDue(self, expected):
+        self.tech.refresh_from_db()
+        self.assertEqual(self.tech.due, expected)
+        self.assertEqual(DueMovement.objects.filter(person=self.tech).aggregate(total=Sum('amount'))['total'], expected)
+
+    def completion(self, repair):
+        # No advance, so every completion computes a 32 share
+        data = {'repair_id': repair.repair_id, 'repair_status': 'Completed', 'amount_paid': 100, 'repair_cost_price': 20}
+        return lambda client: client.patch('/repair/', data, format='json')
+
+    def test_parallel_completions_credit_once(self):
+        repair = self.make_repair(repaired_by=self.tech, repair_status='Repaired', advance_paid=0, due=100)
+        statuses = self.run_in_parallel([self.completion(repair)] * self.workers)
+        self.assertEqual(statuses, [200] * self.workers)
+        self.assertDue(32)
+
+    def test_completions_of_different_repairs_interleaved_with_payouts(self):
+        repairs = [
+            self.make_repair(repaired_by=self.tech, repair_status='Repaired', advance_paid=0, due=100)
+            for _ in range(self.workers // 2)
+        ]
+        payout = {
+            'transaction_from': self.admin.pk, 'transaction_to': self.tech.pk,
+            'amount': 10, 'date': date.today(), 'desc': 'Payout',
+        }
+        requests = []
+        for repair in repairs:
+            requests.append(self.completion(repair))
+            requests.append(lambda client: client.post('/transactions/', payout, format='json'))
+
+        statuses = self.run_in_parallel(requests)
+        self.assertEqual(statuses, [200] * len(requests))
+        self.assertDue(32 * len(repairs) - 10 * len(repairs))
+        self.assertEqual(DueMovement.objects.filter(person=self.tech, reason='payout').count(), len(repairs))
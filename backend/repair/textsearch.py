@@ -0,0 +1,53 @@
+"""
+Ranked text search shared by the repair and inventory search boxes.
+
+A row matches when any of the `contains` fields holds the query (ILIKE), or on
+Postgres when one of the `trigram` fields is trigram-similar to it, which
+catches typos; both go through the gin_trgm_ops indexes. Rows are ranked by
+the first of the `ranks` conditions they meet, and on Postgres by trigram
+similarity when that scores higher. Other backends (SQLite in development)
+get the same matches and ranks without the trigram part.
+"""
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Greatest
+
+MAX_QUERY_LENGTH = 40
+DEFAULT_RANK = 0.3
+
+
+def clean_query(query):
+    """The stripped query, or None if it is empty or too long to search for."""
+    query = (query or '').strip()
+    if not query or len(query) > MAX_QUERY_LENGTH:
+        return None
+    return query
+
+
+def no_results(queryset):
+    """An empty result that can still be ordered by `rank`."""
+    return queryset.none().annotate(rank=Value(DEFAULT_RANK, output_field=FloatField()))
+
+
+def ranked_search(queryset, query, contains, trigram=(), ranks=()):
+    """
+    Filter `queryset` to rows matching `query` and annotate them with `rank`.
+    `ranks` is a sequence of (Q, score) pairs, best first.
+    """
+    matches = Q()
+    for field in contains:
+        matches |= Q(**{f'{field}__icontains': query})
+    rank = Case(
+        *[When(condition, then=Value(score)) for condition, score in ranks],
+        default=Value(DEFAULT_RANK),
+        output_field=FloatField(),
+    )
+
+    if trigram and connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        for field in trigram:
+            matches |= Q(**{f'{field}__trigram_similar': query})
+        rank = Greatest(rank, *[TrigramSimilarity(field, query) for field in trigram], output_field=FloatField())
+
+    return queryset.filter(matches).annotate(rank=rank)
@@ -4,8 +4,11 @@ from . import views
 
 urlpatterns = [
     path('', views.RepairView.as_view(), name='repair'),
+    path('bulk/', views.RepairBulkView.as_view(), name='repair_bulk'),
     path('stats/',views.CountStat.as_view(),name="count_stat"),
-    path('search/', views.SearchView.as_view(), name='search')
+    path('search/', views.SearchView.as_view(), name='search'),
+    path('analytics/', views.AnalyticsView.as_view(), name='repair_analytics'),
+    path('analytics/technicians/', views.TechnicianMetricsView.as_view(), name='technician_metrics'),
 
 
 ]
\ No newline at end of file
@@ -1,10 +1,9 @@
 from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework import generics
-from .models import Repair
+from .models import Repair,RepairStatusCount,SETTLED_STATUSES
 from rest_framework.response import Response
 from .serializers import AdminRepairSerializer,TechnicianRepairSerializer,StaffRepairSerializer
-from .permissions import check_status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from django.utils.dateparse import parse_date
@@ -12,31 +11,40 @@ from django.utils.dateparse import parse_date
 from transactions.models import Credit
 # Create your views here.
 from rest_framework.pagination import PageNumberPagination
+from .pagination import KeysetPagination, wants_cursor
+from .search import search_repairs
+from .export import EXPORT_RENDERER_CLASSES, export_format, stream_export
+from django.db import transaction
 from django.db.models import Count
+from datetime import date, timedelta
+from .analytics import INTERVALS, MAX_PERIODS, cached_repair_series, cached_technician_metrics, period_count
 
 class RepairView(APIView):
     permission_classes = [IsAuthenticated]
 
+    def get_paginator(self, request):
+        # Page numbers stay the default; `?pagination=cursor` switches to keyset
+        # pages on (updated_at, id), which don't slow down on deep pages.
+        if wants_cursor(request):
+            return KeysetPagination(ordering=('-updated_at', '-id'))
+        paginator = PageNumberPagination()
+        paginator.page_size = 10  # Set the page size here
+        return paginator
+
     def get(self, request):
         repair_status = request.GET.get('status')
         stat = request.GET.get('stat')
         print(repair_status)
         user = request.user
-        enterprise = user.person.enterprise
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
 
-        repairs = Repair.objects.filter(enterprise_repairs__name=enterprise).order_by('-updated_at')
+        repairs = Repair.objects.filter(enterprise_id=request.tenant.enterprise_id).order_by('-updated_at')
         if stat:
-            pending_repairs = repairs.filter(repair_status="Not repaired").count()
-            unrepairable_repairs = repairs.filter(repair_status="Unrepairable").count()
-            outside_repairs = repairs.filter(repair_status="Outrepaired").count()
-            print(pending_repairs,unrepairable_repairs,outside_repairs)
-            status = check_status(user)
+            status = request.tenant.role
 
         # Set up pagination
-            paginator = PageNumberPagination()
-            paginator.page_size = 10  # Set the page size here
+            paginator = self.get_paginator(request)
             paginated_repairs = paginator.paginate_queryset(repairs, request)
 
             # Serialize the paginated data
@@ -52,11 +60,10 @@ class RepairView(APIView):
 
         if repair_status:
             repairs = repairs.filter(repair_status = repair_status)
-        status = check_status(user)
+        status = request.tenant.role
 
         # Set up pagination
-        paginator = PageNumberPagination()
-        paginator.page_size = 10  # Set the page size here
+        paginator = self.get_paginator(request)
         paginated_repairs = paginator.paginate_queryset(repairs, request)
 
         # Serialize the paginated data
@@ -74,18 +81,18 @@ class RepairView(APIView):
         data = request.data
         serializer = AdminRepairSerializer(data=data)
         if serializer.is_valid(raise_exception=True):
-            user = request.user
-            enterprise = user.person.enterprise
-            obj = serializer.save()     #ALWAYS REMEMBER U FIRST NEED IT TO BE SAVED TO ADD
-            enterprise.repairs.add(obj)
+            serializer.save(enterprise=request.tenant.enterprise)
             return Response(serializer.data)
 
+    @transaction.atomic
     def patch(self,request):
         repair_id = request.data.get('repair_id',None)
-        repair = Repair.objects.get(repair_id=repair_id)
+        # Locked until the save commits, so concurrent edits see each other's
+        # status and a completion credits the technician once
+        repair = Repair.objects.select_for_update().get(repair_id=repair_id,enterprise_id=request.tenant.enterprise_id)
         data=request.data
         credit_id = request.data.get('credit_id',None)
-        if check_status(request.user) != "Admin":
+        if request.tenant.role != "Admin":
             return Response("Unauthorized")
 
         if credit_id:
@@ -104,39 +111,155 @@ class RepairView(APIView):
 
     def delete(self,request):
         repair_id = request.data.get('repair_id',None)
-        repair = Repair.objects.get(repair_id=repair_id)
+        repair = Repair.objects.get(repair_id=repair_id,enterprise_id=request.tenant.enterprise_id)
         repair.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class RepairBulkView(APIView):
+    """
+    Intake of many repairs at once. Accepts a list of repairs (or
+    {"repairs": [...]}) and saves all of them in one transaction, or none if
+    any row is invalid, in which case `errors` lines up with the input rows.
+    """
+    permission_classes = [IsAuthenticated]
+    max_batch_size = 500
+
+    def post(self, request):
+        rows = request.data.get('repairs') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({"detail": "Expected a non-empty list of repairs"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.max_batch_size:
+            return Response({"detail": f"At most {self.max_batch_size} repairs per request"}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializers = [AdminRepairSerializer(data=row) for row in rows]
+        errors = []
+        for serializer in serializers:
+            row_errors = {}
+            if not serializer.is_valid():
+                row_errors = serializer.errors
+            elif serializer.validated_data.get('repair_status') in SETTLED_STATUSES:
+                row_errors = {"repair_status": ["Bulk intake only accepts open repairs."]}
+            elif serializer.validated_data.get('repair_items'):
+                row_errors = {"repair_items": ["Parts can be added after intake."]}
+            errors.append(row_errors)
+        if any(errors):
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = []
+        for serializer in serializers:
+            serializer.validated_data.pop('repair_items', None)
+            # Bulk ids are always drawn from the id generator
+            serializer.validated_data.pop('repair_id', None)
+            rows.append(serializer.validated_data)
+        repairs = Repair.bulk_intake(request.tenant.enterprise_id, rows)
+        return Response(AdminRepairSerializer(repairs, many=True).data, status=status.HTTP_201_CREATED)
+
+
 class CountStat(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self,request):
         user = request.user
-        enterprise = user.person.enterprise
-        repairs = Repair.objects.filter(enterprise_repairs__name=enterprise).order_by('-updated_at')
-        pending_repairs = repairs.filter(repair_status="Not repaired").count()
-        unrepairable_repairs = repairs.filter(repair_status="Unrepairable").count()
-        outside_repairs = repairs.filter(repair_status="Outrepaired").count()
-        print(pending_repairs,unrepairable_repairs,outside_repairs)
-        status = check_status(user)
+        status = request.tenant.role
         if status == "Admin" or status == "Technician":
-            return Response({"pending":pending_repairs,"unrepairable":unrepairable_repairs,"outside":outside_repairs})
+            counts = RepairStatusCount.for_enterprise(request.tenant.enterprise_id)
+            return Response({"pending":counts.get("Not repaired", 0),"unrepairable":counts.get("Unrepairable", 0),"outside":counts.get("Outrepaired", 0)})
         else:
             return Response("UNAUTHORIZED")
 
+class AnalyticsView(APIView):
+    """
+    Repairs received and delivered, revenue, profit and average turnaround per
+    day, week or month (?interval=) between start_date and end_date, with
+    empty periods filled in. Defaults to the last 30 days, 12 weeks or 12 months.
+    """
+    permission_classes = [IsAuthenticated]
+    default_spans = {'day': timedelta(days=29), 'week': timedelta(weeks=11), 'month': timedelta(days=365)}
+
+    def get(self, request):
+        if request.tenant.role != "Admin":
+            return Response({"detail": "Only admins can view analytics"}, status=status.HTTP_403_FORBIDDEN)
+
+        interval = request.GET.get('interval')
+        interval = interval if interval in INTERVALS else 'day'
+        end_date = parse_date(request.GET.get('end_date') or '') or date.today()
+        start_date = parse_date(request.GET.get('start_date') or '') or end_date - self.default_spans[interval]
+        if start_date > end_date:
+            return Response({"error": "start_date must not be after end_date"}, status=status.HTTP_400_BAD_REQUEST)
+        if period_count(start_date, end_date, interval) > MAX_PERIODS:
+            return Response(
+                {"error": f"Range too long for interval '{interval}', at most {MAX_PERIODS} periods"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response({
+            'interval': interval,
+            'start_date': start_date,
+            'end_date': end_date,
+            'series': cached_repair_series(request.tenant.enterprise_id, start_date, end_date, interval),
+        })
+
+
+class TechnicianMetricsView(APIView):
+    """
+    Per-technician repair counts, completion and unrepairable rates, and median
+    and 90th percentile turnaround in days for repairs received between
+    start_date and end_date (this month by default).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if request.tenant.role != "Admin":
+            return Response({"detail": "Only admins can view technician metrics"}, status=status.HTTP_403_FORBIDDEN)
+
+        end_date = parse_date(request.GET.get('end_date') or '') or date.today()
+        start_date = parse_date(request.GET.get('start_date') or '') or end_date.replace(day=1)
+        if start_date > end_date:
+            return Response({"error": "start_date must not be after end_date"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'start_date': start_date,
+            'end_date': end_date,
+            'technicians': cached_technician_metrics(request.tenant.enterprise_id, start_date, end_date),
+        })
+
+
 class SearchView(APIView):
 
     permission_classes=[IsAuthenticated]
+    renderer_classes = EXPORT_RENDERER_CLASSES
+    export_columns = {
+        'repair_id': 'repair_id',
+        'customer_name': 'customer_name',
+        'customer_phone_number': 'customer_phone_number',
+        'phone_model': 'phone_model',
+        'repair_problem': 'repair_problem',
+        'imei_number': 'imei_number',
+        'total_amount': 'total_amount',
+        'advance_paid': 'advance_paid',
+        'due': 'due',
+        'repair_status': 'repair_status',
+        'received_date': 'received_date',
+        'received_by': 'received_by',
+        'repaired_by': 'repaired_by__user__name',
+        'delivery_date': 'delivery_date',
+    }
+    # Columns StaffRepairSerializer hides
+    profit_export_columns = {
+        'repair_cost_price': 'repair_cost_price',
+        'outside_cost': 'outside_cost',
+        'repair_profit': 'repair_profit',
+        'technician_profit': 'technician_profit',
+        'my_profit': 'my_profit',
+    }
 
     def get(self,request):
         search = request.GET.get('q')
         user = request.user
-        enterprise = user.person.enterprise
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
-        repairs = Repair.objects.filter(enterprise_repairs__name=enterprise)
+        repairs = Repair.objects.filter(enterprise_id=request.tenant.enterprise_id)
         if start_date and end_date:
             start_date = parse_date(start_date)
             end_date = parse_date(end_date)
@@ -144,23 +267,36 @@ class SearchView(APIView):
                 repairs = repairs.filter(received_date__range=(start_date, end_date))
 
         if search:
-            if len(search)>40:
-                repairs=Repair.objects.none()
-            else:
-                repair_customer_name= repairs.filter(customer_name__icontains=search)
-                repair_phone_model= repairs.filter(phone_model__icontains=search)
-                repair_id =repairs.filter(repair_id__exact=search)
-                repair_customer_phone_number = repairs.filter(customer_phone_number__icontains=search)
-                repairs=  repair_customer_name.union(repair_customer_phone_number,repair_phone_model,repair_id)
-            if not repairs:
-                return Response("NONE")
-        status = check_status(user)
-        repairs = repairs.order_by('-updated_at')
+            repairs = search_repairs(repairs, search)
+        else:
+            repairs = repairs.order_by('-updated_at', '-id')
+
+        status = request.tenant.role
+        fmt = export_format(request)
+        if fmt:
+            columns = self.export_columns
+            if status in ("Admin", "Technician"):
+                columns = {**columns, **self.profit_export_columns}
+            return stream_export(repairs, columns, fmt, 'repairs')
+
         if status == "Admin":
-            serializer = AdminRepairSerializer(repairs,many=True)
+            serializer_class = AdminRepairSerializer
         elif status == "Technician":
-            serializer = TechnicianRepairSerializer(repairs,many=True)
+            serializer_class = TechnicianRepairSerializer
         else:
-            serializer = StaffRepairSerializer(repairs,many=True)
-        return Response(serializer.data)
+            serializer_class = StaffRepairSerializer
+
+        # A plain list stays the default; `?page=` opts into page-number pages
+        if 'page' in request.GET:
+            paginator = PageNumberPagination()
+            paginator.page_size = 10
+            paginated_repairs = paginator.paginate_queryset(repairs, request)
+            if search and not paginator.page.paginator.count:
+                return Response("NONE")
+            return paginator.get_paginated_response(serializer_class(paginated_repairs, many=True).data)
+
+        repairs = list(serializer_class.setup_eager_loading(repairs))
+        if search and not repairs:
+            return Response("NONE")
+        return Response(serializer_class(repairs, many=True).data)
 
@@ -1,6 +1,8 @@
 from rest_framework import serializers
+from django.db.models import Prefetch
 from .models import Transaction,Credit,CreditTransaction
-from repair.serializers import AdminRepairSerializer
+from repair.models import Repair
+from repair.serializers import AdminRepairSerializer, EagerLoadingMixin
 
 class TransactionSerializer(serializers.ModelSerializer):
     transaction_from_name = serializers.SerializerMethodField(read_only=True)
@@ -16,8 +18,12 @@ class TransactionSerializer(serializers.ModelSerializer):
     def get_transaction_to_name(self, obj):
         return obj.transaction_to.user.name  # Adjust if the field is different
 
-class CreditSerializer(serializers.ModelSerializer):
+class CreditSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     repair = AdminRepairSerializer(many=True,read_only=True)
+    prefetch_related_fields = (
+        'transaction',
+        Prefetch('repair', queryset=AdminRepairSerializer.setup_eager_loading(Repair.objects.all())),
+    )
     class Meta:
         model = Credit
         fields = '__all__'
@@ -1,3 +1,58 @@
+import json
+from datetime import date
+
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from enterprise.models import Enterprise, Person
+from userauth.models import User
+
+from .models import Transaction
+
+
+class SearchTransactionExportTests(TestCase):
+    """
+    Exports of the transaction search. Their memory use against the JSON
+    listing is measured by `manage.py benchmark_export`.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.enterprise = Enterprise.objects.create(name='Shop')
+        cls.admin_user = User.objects.create_user('admin@example.com', 'Admin', 'pw')
+        cls.admin = Person.objects.create(user=cls.admin_user, enterprise=cls.enterprise, role='Admin', due=0, technician_profit=0)
+        cls.staff_user = User.objects.create_user('staff@example.com', 'Staff', 'pw')
+        Person.objects.create(user=cls.staff_user, enterprise=cls.enterprise, role='Staff', due=0, technician_profit=0)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_non_admin_export_is_a_json_403(self):
+        response = self.client_for(self.staff_user).get('/transactions/search', {'format': 'csv'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json(), {'detail': 'Not Authorized'})
+
+    def test_admin_export_streams_csv(self):
+        Transaction.objects.create(date=date(2024, 1, 1), enterprise=self.enterprise, transaction_to=self.admin, desc='Rent', amount=500)
+        response = self.client_for(self.admin_user).get('/transactions/search', {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, ['id,date,transaction_from,transaction_to,desc,amount', f'{Transaction.objects.get().pk},2024-01-01,,Admin,Rent,500'])
 
-# Create your tests here.
+    def test_ndjson_export_is_scoped_to_the_enterprise(self):
+        other = Enterprise.objects.create(name='Other shop')
+        Transaction.objects.create(date=date(2024, 1, 2), enterprise=other, desc='Elsewhere', amount=1)
+        payout = Transaction.objects.create(
+            date=date(2024, 1, 3), enterprise=self.enterprise, transaction_from=self.admin, transaction_to=self.admin, desc='Payout', amount=250,
+        )
+        response = self.client_for(self.admin_user).get('/transactions/search', {'format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="transactions.ndjson"')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(rows, [{
+            'id': payout.pk, 'date': '2024-01-03', 'transaction_from': 'Admin', 'transaction_to': 'Admin', 'desc': 'Payout', 'amount': 250,
+        }])
@@ -7,6 +7,7 @@ from repair.permissions import check_status
 from django.utils.dateparse import parse_date
 from .serializers import TransactionSerializer
 from enterprise.models import Person,Enterprise
+from enterprise.dues import post_due
 from userauth.models import User
 from rest_framework import status
 from transactions.models import Credit,CreditTransaction
@@ -15,6 +16,8 @@ from repair.serializers import AdminRepairSerializer
 from .serializers import CreditSerializer,CreditTransactionSerializer
 from django.db import transaction
 from rest_framework.pagination import PageNumberPagination
+from django.db.models import Q
+from repair.export import EXPORT_RENDERER_CLASSES, export_forbidden, export_format, stream_export
 
 
 # Create your views here.
@@ -24,10 +27,10 @@ class TransactionView(APIView):
 
     def get(self,request):
         user = request.user
-        enterprise = user.person.enterprise
+        enterprise = request.tenant.enterprise
         transactions = Transaction.objects.filter(enterprise=enterprise)
         transactions = transactions.order_by('-id')
-        status = check_status(user)
+        status = request.tenant.role
         if status == "Admin":
             paginator = PageNumberPagination()
             paginator.page_size = 50  # Set the page size here
@@ -35,7 +38,7 @@ class TransactionView(APIView):
             serializer = TransactionSerializer(paginated_transactions, many=True)
             return paginator.get_paginated_response(serializer.data)
         elif status == "Technician":
-            transactions = transactions.filter(transaction_to=user.person)
+            transactions = transactions.filter(transaction_to=request.tenant.person)
             paginator = PageNumberPagination()
             paginator.page_size = 50
             paginated_transactions = paginator.paginate_queryset(transactions, request)
@@ -52,23 +55,16 @@ class TransactionView(APIView):
         from_id = request.data.get('transaction_from')
         to_id = request.data.get('transaction_to')
         amount = request.data.get('amount')
-        sender = User.objects.get(id = from_id)
-        sender = sender.person
-        receiver = User.objects.get(id = to_id)
-        receiver = receiver.person
-        enterprise = user.person.enterprise
+        sender = Person.objects.select_related('user').get(user_id = from_id)
+        receiver = Person.objects.get(user_id = to_id)
+        enterprise = request.tenant.enterprise
         data["enterprise"] = enterprise.id
-        if check_status(sender) == 'Admin':
+        if check_status(sender.user) == 'Admin':
             serializer = TransactionSerializer(data = data)
             if serializer.is_valid(raise_exception=True):
-                serializer.save()
+                payout = serializer.save()
             if amount:
-                if receiver.due:
-                    receiver.due = receiver.due - amount
-                    print(receiver.due)
-                else:
-                    receiver.due = -(amount)
-                receiver.save()
+                post_due(receiver.pk, -int(amount), 'payout', payout=payout)
                 return Response(serializer.data, status=status.HTTP_200_OK)
             else:
                 return Response({"msg":"Not ok"},)
@@ -84,9 +80,24 @@ class TransactionView(APIView):
 
 
 class SearchTransactionView(APIView):
+    renderer_classes = EXPORT_RENDERER_CLASSES
+    export_columns = {
+        'id': 'id',
+        'date': 'date',
+        'transaction_from': 'transaction_from__user__name',
+        'transaction_to': 'transaction_to__user__name',
+        'desc': 'desc',
+        'amount': 'amount',
+    }
+
     def get(self,request):
         user = request.user
-        enterprise= user.person.enterprise
+        enterprise= request.tenant.enterprise
+        status = request.tenant.role
+        fmt = export_format(request)
+        if status != "Admin":
+            return export_forbidden() if fmt else Response("Not Authorized")
+
         search = request.GET.get('q')
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
@@ -101,20 +112,22 @@ class SearchTransactionView(APIView):
             if len(search)>40:
                 transactions=Transaction.objects.none()
             else:
-                transaction_from_name= transactions.filter(transaction_from__user__name__icontains=search)
-                transaction_to_name= transactions.filter(transaction_to__user__name__icontains=search)#__name is used to address a particular name field of the foreign key so __sth__name means the foreign key has a foreign key sth that has the field name
-                transaction_desc = transactions.filter(desc__icontains=search)
-                transactions = transaction_from_name.union(transaction_to_name,transaction_desc)
-            if not transactions:
-                return Response("NONE")
-        status = check_status(user)
+                #__name is used to address a particular name field of the foreign key so __sth__name means the foreign key has a foreign key sth that has the field name
+                transactions = transactions.filter(
+                    Q(transaction_from__user__name__icontains=search)
+                    | Q(transaction_to__user__name__icontains=search)
+                    | Q(desc__icontains=search)
+                )
         transactions = transactions.order_by('-id')
 
-        if status == "Admin":
-            serializer = TransactionSerializer(transactions,many=True)
-            return Response(serializer.data)
-        else:
-            return Response("Not Authorized")
+        if fmt:
+            return stream_export(transactions, self.export_columns, fmt, 'transactions')
+        if search and not transactions.exists():
+            return Response("NONE")
+
+        transactions = transactions.select_related('transaction_from__user', 'transaction_to__user')
+        serializer = TransactionSerializer(transactions,many=True)
+        return Response(serializer.data)
 
 class CreditView(APIView):
     permission_classes = [IsAuthenticated]
@@ -122,8 +135,8 @@ class CreditView(APIView):
 
     def get(self,request,pk=None):
         user = request.user
-        enterprise = user.person.enterprise
-        status = check_status(user)
+        enterprise = request.tenant.enterprise
+        status = request.tenant.role
 
         if status == "Admin":
             credits = Credit.objects.filter(enterprise=enterprise)
@@ -150,8 +163,8 @@ class CreditView(APIView):
 
     def post(self,request):
         user = request.user
-        enterprise = user.person.enterprise
-        status = check_status(user)
+        enterprise = request.tenant.enterprise
+        status = request.tenant.role
         if status == "Admin":
             data = request.data
             data["enterprise"] = enterprise.id
@@ -162,8 +175,8 @@ class CreditView(APIView):
 
     def delete(self,request):
         user = request.user
-        enterprise= user.person.enterprise
-        user_status = check_status(user)
+        enterprise= request.tenant.enterprise
+        user_status = request.tenant.role
         if user_status == "Admin":
             credit_id = request.data.get('credit_id',None)
             credit = Credit.objects.get(id = credit_id,enterprise=enterprise)
@@ -174,25 +187,35 @@ class CreditView(APIView):
 
 class CreditTransactionView(APIView):
     permission_classes = [IsAuthenticated]
+    renderer_classes = EXPORT_RENDERER_CLASSES
+    export_columns = {
+        'id': 'id',
+        'date': 'date',
+        'creditor': 'transaction_from__name',
+        'repair_id': 'repair__repair_id',
+        'desc': 'desc',
+        'amount': 'amount',
+    }
 
     def get(self,request):
         user = request.user
-        enterprise=user.person.enterprise
+        enterprise=request.tenant.enterprise
         creditor = request.GET.get('creditor')
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
-        status = check_status(user)
+        status = request.tenant.role
         if start_date and end_date:
             start_date = parse_date(start_date)
             end_date = parse_date(end_date)
-            print("HERERERE")
         if status == "Admin":
             credit_transactions = CreditTransaction.objects.filter(enterprise=enterprise)
             if creditor:
                 credit_transactions = credit_transactions.filter(transaction_from=creditor)
             if start_date and end_date:
                 credit_transactions = credit_transactions.filter(date__range=(start_date, end_date))
-                print("POPOPOPP",credit_transactions)
+            fmt = export_format(request)
+            if fmt:
+                return stream_export(credit_transactions.order_by('-date', '-id'), self.export_columns, fmt, 'credit-transactions')
             serializer=CreditTransactionSerializer(credit_transactions,many=True)
             return Response(serializer.data)
 
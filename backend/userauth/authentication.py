@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+from django.core.exceptions import ObjectDoesNotExist
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+class TenantContext:
+    """
+    The enterprise and role of the authenticated user, resolved once per request
+    so views don't have to go back to the Person and Enterprise tables.
+    """
+
+    def __init__(self, person):
+        self.person = person
+        self.enterprise = person.enterprise if person else None
+        self.enterprise_id = person.enterprise_id if person else None
+        self.role = person.role if person else None
+
+
+def get_tenant(user):
+    tenant = getattr(user, '_tenant', None)
+    if tenant is None:
+        try:
+            person = user.person
+        except (AttributeError, ObjectDoesNotExist):
+            person = None
+        tenant = TenantContext(person)
+        user._tenant = tenant
+    return tenant
+
+
+class TenantJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that loads the user together with its Person and
+    Enterprise in a single query, so `request.tenant` (see
+    userauth.middleware.TenantMiddleware) costs nothing extra. Only the user
+    lookup changes; token, revocation and is_active checks stay simplejwt's.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # JWTAuthentication.get_user reads `user_model.objects` and `user_model.DoesNotExist`
+        self.user_model = SimpleNamespace(
+            objects=self.user_model.objects.select_related('person__enterprise'),
+            DoesNotExist=self.user_model.DoesNotExist,
+        )
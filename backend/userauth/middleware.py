@@ -0,0 +1,20 @@
+from django.utils.functional import SimpleLazyObject
+
+from .authentication import get_tenant
+
+
+class TenantMiddleware:
+    """
+    Exposes `request.tenant` on every request, resolved from `request.user` the
+    first time a view reads it. DRF requests proxy unknown attributes to the
+    underlying request, whose user DRF sets once authentication has run, so
+    this works with any authentication class (including force_authenticate
+    in tests).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.tenant = SimpleLazyObject(lambda: get_tenant(request.user))
+        return self.get_response(request)
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 import uuid
 from enterprise.models import Enterprise
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser,PermissionsMixin
@@ -62,6 +63,13 @@ class User(AbstractBaseUser,PermissionsMixin):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["name",]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'name' in update_fields:
+            # Names show up in cached analytics, which are keyed on the people version
+            Enterprise.objects.filter(person__user=self).update(people_version=F('people_version') + 1)
+
     def __str__(self):
         return self.email
 
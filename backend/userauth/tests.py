@@ -1,3 +1,55 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from enterprise.models import Enterprise, Person
+from userauth.models import User
+
+
+class TenantContextTests(TestCase):
+    """
+    The tenant (Person, Enterprise, role) is loaded together with the user, so
+    each endpoint pays one query for authentication and tenant together.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.enterprise = Enterprise.objects.create(name='Shop')
+        cls.admin = User.objects.create_user('admin@example.com', 'Admin', 'pw')
+        Person.objects.create(user=cls.admin, enterprise=cls.enterprise, role='Admin', due=0, technician_profit=0)
+
+    def jwt_client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(user).access_token))
+        return client
+
+    def test_endpoint_query_counts(self):
+        client = self.jwt_client(self.admin)
+        # One query authenticates and loads the tenant; the rest is the endpoint's own work
+        endpoints = {
+            '/repair/stats/': 2,
+            '/repair/?stat=1': 2,
+            '/enterprise/techs/': 2,
+            '/enterprise/persons/': 2,
+            '/enterprise/outside/': 2,
+            '/transactions/': 2,
+            '/inventory/category/': 2,
+        }
+        for url, queries in endpoints.items():
+            with self.subTest(url=url), self.assertNumQueries(queries):
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_tenant_resolved_without_jwt_authentication(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/repair/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'pending': 0, 'unrepairable': 0, 'outside': 0})
+
+    def test_jwt_keeps_simplejwt_user_checks(self):
+        client = self.jwt_client(self.admin)
+        User.objects.filter(pk=self.admin.pk).update(is_active=False)
+        response = client.get('/repair/stats/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'user_inactive')